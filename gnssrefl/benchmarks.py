@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks for the reflectometry hot paths, on synthetic data
+
+a day of SNR data (and a RINEX file with an sp3 file for rinex2snr) is made
+for a made up station from circular satellite orbits and a simple
+interference model for a horizontal reflector. everything is written to a
+scratch REFL_CODE directory, so nothing of yours is touched.
+
+the timings are saved in a json file, and compared with the ones already
+in that file, so you can tell whether a change made things faster or slower:
+
+python -m gnssrefl.benchmarks -baseline mybaseline.json -update T
+
+there is also a check that the command line tools start quickly, i.e. that
+importing each console script of setup.py stays under a time budget and does
+not pull in matplotlib, scipy, astropy, requests or wget:
+
+python -m gnssrefl.benchmarks -imports T -budget 0.5
+
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from pathlib import Path
+
+import numpy as np
+
+# offset added to the satellite number, number of satellites, orbit radius (m),
+# orbit period (sec), inclination (deg) and number of orbit planes
+CONSTELLATIONS = {'G': (0, 32, 26559.7e3, 43082.0, 55.0, 6),
+                  'R': (100, 24, 25508.2e3, 40544.0, 64.8, 3),
+                  'E': (200, 24, 29599.8e3, 50682.0, 56.0, 3),
+                  'C': (300, 24, 27906.1e3, 46404.0, 55.0, 3)}
+
+# SNR file columns 5 to 10 (s6,s1,s2,s5,s7,s8) and their frequency codes
+SNR_COLUMNS = [6, 1, 2, 5, 7, 8]
+
+# modules that the console scripts should only import when they are used
+HEAVY_MODULES = ['matplotlib', 'scipy', 'astropy', 'requests', 'wget']
+
+ALL_BENCHMARKS = ['read_one_snr', 'window_data', 'strip_compute', 'gnssir_guts',
+                  'rnx2snr', 'snr2spline', 'phase_tracks', 'subdaily_spline']
+
+
+def satellite_orbits(constel, t, doy=1):
+    """
+    Earth fixed satellite positions from circular orbits
+
+    Parameters
+    ----------
+    constel : string
+        constellations, e.g. 'GRE'
+    t : numpy array
+        seconds of the day
+    doy : integer, optional
+        day of year, changes where the satellites are at the start of the day
+
+    Returns
+    -------
+    sats : numpy array of integers
+        satellite numbers (100, 200, 300 added for glonass, galileo, beidou)
+    xyz : numpy array
+        positions (meters), one satellite per row, shape (nsat, len(t), 3)
+    """
+    omegaE = 7.2921151467e-5
+    sats = []; xyz = []
+    theta = omegaE*t + 2*np.pi*doy/365.25
+    for c in constel:
+        addon, nsat, r, period, inc, nplanes = CONSTELLATIONS[c]
+        inc = np.radians(inc)
+        nslots = int(np.ceil(nsat/nplanes))
+        for i in range(nsat):
+            p = i % nplanes; k = i // nplanes
+            node = 2*np.pi*p/nplanes
+            u = 2*np.pi*(k/nslots + p/(nplanes*nslots) + doy*86400/period) + 2*np.pi*t/period
+            x = r*(np.cos(u)*np.cos(node) - np.sin(u)*np.cos(inc)*np.sin(node))
+            y = r*(np.cos(u)*np.sin(node) + np.sin(u)*np.cos(inc)*np.cos(node))
+            z = r*np.sin(u)*np.sin(inc)
+            # rotate into the Earth fixed frame
+            xyz.append(np.vstack((x*np.cos(theta) + y*np.sin(theta),
+                -x*np.sin(theta) + y*np.cos(theta), z)).T)
+            sats.append(addon + i + 1)
+    return np.array(sats), np.array(xyz)
+
+
+def synthetic_snr(sats, ele, rh=2.0, noise=0.5, seed=0):
+    """
+    SNR data (dB-Hz) for a horizontal reflector rh meters below the antenna:
+    direct signal plus a reflection that gets weaker with elevation angle
+
+    Parameters
+    ----------
+    sats : numpy array
+        satellite number of each observation
+    ele : numpy array
+        elevation angles (degrees)
+    rh : float, optional
+        reflector height (meters). default is 2
+    noise : float, optional
+        standard deviation of the SNR noise (dB-Hz). default is 0.5
+    seed : integer, optional
+        random number seed
+
+    Returns
+    -------
+    snr : numpy array
+        one row per observation, columns s6,s1,s2,s5,s7,s8 as in the SNR file.
+        zero where the satellite does not have that frequency
+    """
+    import gnssrefl.gps as g
+    rng = np.random.default_rng(seed)
+    sinE = np.sin(np.radians(ele))
+    direct = 10**((30 + 20*sinE)/20)
+    reflect = 0.4*direct*np.exp(-4*sinE*sinE)
+    snr = np.zeros((len(sats), len(SNR_COLUMNS)))
+    for satNu in np.unique(sats):
+        m = sats == satNu
+        addon = 100*int(satNu // 100)
+        phase0 = rng.uniform(0, 2*np.pi)
+        for j, code in enumerate(SNR_COLUMNS):
+            f = code + addon
+            if (f == 6) or (f == 7) or (f == 8):
+                continue
+            cf = g.arc_scaleF(f, int(satNu))
+            if cf == 0:
+                continue
+            psi = 2*np.pi*rh*sinE[m]/cf + phase0
+            power = direct[m]**2 + reflect[m]**2 + 2*direct[m]*reflect[m]*np.cos(psi)
+            snr[m, j] = 10*np.log10(power) + noise*rng.standard_normal(np.sum(m))
+    return snr
+
+
+def synthetic_day(station_llh, constel, rate, doy, emin=0, emax=30, rh=2.0, noise=0.5):
+    """
+    one day of observations, as they would be in a SNR file
+
+    Parameters
+    ----------
+    station_llh : list of floats
+        latitude, longitude (degrees) and height (meters)
+    constel : string
+        constellations, e.g. 'GRE'
+    rate : integer
+        sampling interval (seconds)
+    doy : integer
+        day of year
+    emin : float, optional
+        minimum elevation angle (degrees). default is 0
+    emax : float, optional
+        maximum elevation angle (degrees). default is 30
+    rh : float, optional
+        reflector height (meters). default is 2
+    noise : float, optional
+        SNR noise (dB-Hz). default is 0.5
+
+    Returns
+    -------
+    snrdata : numpy array
+        rows and columns of a SNR file
+    recv : numpy array
+        station Cartesian coordinates (meters)
+    sats : numpy array
+        satellite numbers
+    xyz : numpy array
+        satellite positions, see satellite_orbits
+    t : numpy array
+        seconds of the day
+    """
+    import gnssrefl.gps as g
+    lat, lon, ht = station_llh
+    recv = np.array(g.llh2xyz(lat, lon, ht))
+    up, East, North = g.up(np.radians(lat), np.radians(lon))
+    t = np.arange(0, 86400, rate, dtype=float)
+    sats, xyz = satellite_orbits(constel, t, doy)
+    rows = []
+    for i, satNu in enumerate(sats):
+        ele, azi = g.elev_azim_angles(up, East, North, xyz[i] - recv)
+        m = (ele > emin) & (ele <= emax)
+        rows.append(np.vstack((np.full(np.sum(m), satNu), ele[m], azi[m], t[m])).T)
+    obs = np.vstack(rows)
+    snr = synthetic_snr(obs[:,0], obs[:,1], rh, noise)
+    snrdata = np.hstack((obs, np.zeros((len(obs), 1)), snr))
+    return snrdata, recv, sats, xyz, t
+
+
+def write_snr_file(snrfile, snrdata):
+    """
+    writes SNR data in the format used by rinex2snr
+    """
+    np.savetxt(snrfile, snrdata, fmt='%3.0f %10.4f %10.4f %10.0f %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f ')
+
+
+def write_sp3_file(sp3file, year, month, day, doy, constel, interval=900):
+    """
+    writes the synthetic orbits (see satellite_orbits) every interval seconds,
+    up to midnight at the end of the day, as an sp3 file
+    """
+    cons = {0: 'G', 100: 'R', 200: 'E', 300: 'C'}
+    tsp3 = np.arange(0, 86400 + interval, interval, dtype=float)
+    sats, xyz = satellite_orbits(constel, tsp3, doy)
+    t0 = datetime.datetime(year, month, day)
+    with open(sp3file, 'w') as f:
+        f.write('#cP{0:4d} {1:2d} {2:2d}  0  0  0.00000000 {3:7d} ORBIT IGS14 HLM  SYN\n'.format(year, month, day, len(tsp3)))
+        f.write('/* synthetic orbits made by gnssrefl.benchmarks\n')
+        for k in range(len(tsp3)):
+            dt = t0 + datetime.timedelta(seconds=tsp3[k])
+            f.write('*  {0:4d} {1:2d} {2:2d} {3:2d} {4:2d} {5:11.8f}\n'.format(dt.year, dt.month, dt.day, dt.hour, dt.minute, 0.0))
+            for i, satNu in enumerate(sats):
+                pos = xyz[i, k]/1000
+                f.write('P{0:1s}{1:02d}{2:14.6f}{3:14.6f}{4:14.6f}{5:14.6f}\n'.format(cons[100*(satNu // 100)],
+                    satNu % 100, pos[0], pos[1], pos[2], 0.0))
+        f.write('EOF\n')
+
+
+def write_rinex_file(obsfile, year, month, day, recv, sats, ele, t, rh=2.0, noise=0.5):
+    """
+    writes a RINEX 2.11 file with S1, S2 and S5 data for the satellites above the horizon
+
+    Parameters
+    ----------
+    obsfile : string
+        name of the RINEX file
+    year, month, day : integers
+        date
+    recv : numpy array
+        station Cartesian coordinates (meters)
+    sats : numpy array
+        satellite numbers
+    ele : numpy array
+        elevation angles (degrees), one row per satellite and one column per epoch
+    t : numpy array
+        seconds of the day
+    rh : float, optional
+        reflector height (meters)
+    noise : float, optional
+        SNR noise (dB-Hz)
+    """
+    cons = {0: 'G', 100: 'R', 200: 'E', 300: 'C'}
+    nsat, nt = ele.shape
+    satall = np.repeat(sats, nt)
+    snr = synthetic_snr(satall, np.ravel(ele), rh, noise).reshape(nsat, nt, len(SNR_COLUMNS))
+    # S1, S2, S5 are columns 1,2,3
+    snr = snr[:, :, 1:4]
+    names = ['{0:1s}{1:02d}'.format(cons[100*(s // 100)], s % 100) for s in sats]
+
+    def hline(text, label):
+        return '{0:60s}{1:20s}\n'.format(text, label)
+
+    with open(obsfile, 'w') as f:
+        f.write(hline('     2.11           OBSERVATION DATA    M (MIXED)', 'RINEX VERSION / TYPE'))
+        f.write(hline('gnssrefl.benchmarks', 'PGM / RUN BY / DATE'))
+        f.write(hline('BNCH', 'MARKER NAME'))
+        f.write(hline('{0:14.4f}{1:14.4f}{2:14.4f}'.format(recv[0], recv[1], recv[2]), 'APPROX POSITION XYZ'))
+        f.write(hline('     3    S1    S2    S5', '# / TYPES OF OBSERV'))
+        f.write(hline('{0:10.3f}'.format(t[1] - t[0]), 'INTERVAL'))
+        f.write(hline('  {0:4d}    {1:2d}    {2:2d}     0     0    0.0000000     GPS'.format(year, month, day), 'TIME OF FIRST OBS'))
+        f.write(hline('', 'END OF HEADER'))
+        for k in range(nt):
+            up = np.nonzero(ele[:, k] > 0)[0]
+            if len(up) == 0:
+                continue
+            hour = int(t[k] // 3600); minute = int((t[k] % 3600) // 60); sec = t[k] % 60
+            epoch = ' {0:02d} {1:2d} {2:2d} {3:2d} {4:2d}{5:11.7f}  0{6:3d}'.format(year % 100, month, day, hour, minute, sec, len(up))
+            satnames = [names[i] for i in up]
+            lines = [epoch + ''.join(satnames[0:12])]
+            for j in range(12, len(satnames), 12):
+                lines.append(32*' ' + ''.join(satnames[j:j+12]))
+            for i in up:
+                lines.append(''.join(('{0:14.3f}  '.format(v) if v > 0 else 16*' ') for v in snr[i, k]).rstrip())
+            f.write('\n'.join(lines) + '\n')
+
+
+def time_it(func, repeat):
+    """
+    runs func repeat times, with the screen output thrown away
+
+    Returns
+    -------
+    times : list of floats
+        wall time (seconds) of each run
+    """
+    times = []
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+    return times
+
+
+def run_benchmarks(workdir, rate=30, constel='GRE', rh=2.0, noise=0.5, repeat=3, only=None):
+    """
+    makes the synthetic data in workdir and times the hot paths
+
+    Parameters
+    ----------
+    workdir : string
+        scratch directory, used as REFL_CODE and ORBITS
+    rate : integer, optional
+        sampling interval of the synthetic data (seconds). default is 30
+    constel : string, optional
+        constellations. default is 'GRE'
+    rh : float, optional
+        reflector height (meters). default is 2
+    noise : float, optional
+        SNR noise (dB-Hz). default is 0.5
+    repeat : integer, optional
+        number of times each benchmark is run. default is 3
+    only : list of strings, optional
+        names of the benchmarks to run. default is all of them
+
+    Returns
+    -------
+    results : dictionary
+        for each benchmark, the minimum and median time (seconds), or the error
+    """
+    # these must be set before the gnssrefl modules that read them are imported
+    os.environ['REFL_CODE'] = workdir
+    os.environ['ORBITS'] = workdir
+    os.environ.setdefault('EXE', workdir)
+    os.environ['MPLBACKEND'] = 'Agg'
+    os.chdir(workdir)
+
+    import gnssrefl.gps as g
+    import gnssrefl.gnssir as guts
+    import gnssrefl.make_json_input as mj
+    import gnssrefl.phase_functions as phase
+    import gnssrefl.read_snr_files as snr
+    import gnssrefl.rinex2snr as r2s
+    import gnssrefl.spline_functions as spline
+    import gnssrefl.subdaily as subdaily
+    import gnssrefl.utils as utils
+    # FileManagement keeps the REFL_CODE there was when utils was first imported
+    utils.FileManagement.xdir = Path(workdir)
+
+    if only is None:
+        only = ALL_BENCHMARKS
+    station = 'bnch'; year = 2020; doy = 155
+    d = g.doy2ymd(year, doy); month = d.month; day = d.day
+    llh = [40.0, -105.0, 1600.0]
+
+    print('Making a synthetic SNR file: sampling', rate, 's, constellations', constel)
+    snrdata, recv, sats, xyz, t = synthetic_day(llh, constel, rate, doy, 0, 30, rh, noise)
+    for dname in [str(year), str(year) + '/snr', str(year) + '/snr/' + station, 'input', 'Files',
+                  str(year) + '/phase', str(year) + '/phase/' + station, 'logs']:
+        os.makedirs(os.path.join(workdir, dname), exist_ok=True)
+    obsfile, obsfileCmp, snre = g.define_and_xz_snr(station, year, doy, 66)
+    write_snr_file(obsfile, snrdata)
+    print('Number of observations', len(snrdata))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        mj.make_json(station, llh[0], llh[1], llh[2], e1=5, e2=25, h1=0.5, h2=8, refraction=False)
+    lsp = guts.read_json_file(station, '')
+    lsp.update({'plt_screen': False, 'nooverwrite': False, 'mmdd': False, 'gzip': False,
+                'fastLSP': False, 'stats': None, 'wantCompression': False, 'screenstats': False})
+
+    sat, ele, azi, tt, edot, s1, s2, s5, s6, s7, s8, snrE = snr.read_one_snr(obsfile, 1)
+    azval = [0, 90, 90, 180, 180, 270, 270, 360]
+    arcindex = g.make_arc_index(sat, ele, azi, tt)
+    satlist = [int(s) for s in np.unique(sat) if s < 100]
+
+    def windows():
+        out = []
+        for satNu in satlist:
+            for a in range(0, len(azval), 2):
+                w = g.window_data(s1, s2, s5, s6, s7, s8, sat, ele, azi, tt, edot, 1, azval[a], azval[a+1],
+                                  5, 25, satNu, 4, [5, 30], False, arcindex)
+                if w[2] > 20:
+                    out.append((satNu, azval[a], azval[a+1], w))
+        return out
+
+    arcs = windows()
+
+    def strips():
+        for satNu, az1, az2, w in arcs:
+            g.strip_compute(w[0], w[1], w[3], 8, 0.005, 4, 0.5)
+
+    # apriori tracks for phase, one per arc found above
+    tracks = [[k, rh, satNu, w[5], 100, az1, az2] for k, (satNu, az1, az2, w) in enumerate(arcs)]
+    for fname in [station + '_phaseRH.txt', station + '_phaseRH_L1.txt']:
+        np.savetxt(os.path.join(workdir, 'input', fname), tracks, fmt='%2.0f %6.3f %4.0f %7.2f %5.0f %4.0f %4.0f',
+                   header='Track RefH SatNu MeanAz Nval Azimuths', comments='% ')
+
+    def rinex():
+        rinexfile = station + '{0:03d}0.{1:02d}o'.format(doy, year % 100)
+        sp3file = 'syn{0:03d}.{1:4d}.sp3'.format(doy, year)
+        if not os.path.isfile(rinexfile):
+            up, East, North = g.up(np.radians(llh[0]), np.radians(llh[1]))
+            allele = np.array([g.elev_azim_angles(up, East, North, xyz[i] - recv)[0] for i in range(len(sats))])
+            write_rinex_file(rinexfile, year, month, day, recv, sats, allele, t, rh, noise)
+            write_sp3_file(sp3file, year, month, day, doy, constel)
+        with open('logs/rnx2snr.txt', 'w') as log:
+            r2s.rnx2snr(rinexfile, sp3file, 'bnch.snr66', 66, year, month, day, 0, log)
+
+    # a year of RH with a semidiurnal tide, 120 a day, for the subdaily spline fit (8 knots a day)
+    rng = np.random.default_rng(0)
+    th = np.sort(rng.uniform(0, 365, 365*120))
+    hh = rh + 0.5*np.sin(2*np.pi*th/0.5175) + 0.05*rng.standard_normal(len(th))
+    knots = np.linspace(th[0] + 0.01, th[-1] - 0.01, 365*8)
+
+    cases = {'read_one_snr': lambda: snr.read_one_snr(obsfile, 1),
+             'window_data': windows,
+             'strip_compute': strips,
+             'gnssir_guts': lambda: guts.gnssir_guts(station, year, doy, 66, '', lsp),
+             'rnx2snr': rinex,
+             'snr2spline': lambda: spline.snr2spline(station, year, doy, [0, 360], [5, 25], [0.5, 8], 0.005, 7200,
+                 snrfit=False, signal='L1', screenstats=False, outlier_limit=0.5, satconsts=['G'],
+                 pktnlim=4, tempres=1, risky=True, no_dots=True, snr_ending=66),
+             'phase_tracks': lambda: phase.phase_tracks(station, year, doy, 66, [1], 5, 30, [5, 30],
+                 False, False, True, False),
+             'subdaily_spline': lambda: subdaily.lsq_spline(th, hh, knots, outlier=0.2)}
+
+    results = {}
+    for name in ALL_BENCHMARKS:
+        if name not in only:
+            continue
+        try:
+            times = time_it(cases[name], repeat)
+            results[name] = {'min': min(times), 'median': float(np.median(times))}
+        except (Exception, SystemExit):
+            results[name] = {'error': traceback.format_exc(limit=3).splitlines()[-1]}
+        print('{0:15s} {1}'.format(name, results[name]))
+    return results
+
+
+def compare(results, baseline):
+    """
+    prints the timings next to the ones in a baseline
+    """
+    print('{0:15s} {1:>10s} {2:>10s} {3:>8s}'.format('benchmark', 'now (s)', 'base (s)', 'ratio'))
+    base = baseline.get('results', {})
+    for name, r in results.items():
+        if 'min' not in r:
+            print('{0:15s} {1:>10s}'.format(name, 'failed'))
+            continue
+        if (name in base) and ('min' in base[name]):
+            b = base[name]['min']
+            print('{0:15s} {1:10.3f} {2:10.3f} {3:8.2f}'.format(name, r['min'], b, r['min']/b))
+        else:
+            print('{0:15s} {1:10.3f} {2:>10s}'.format(name, r['min'], '-'))
+
+
+def console_modules():
+    """
+    returns the modules of the gnssrefl console scripts, from the
+    installed package or else from setup.py
+    """
+    from importlib import metadata
+    try:
+        eps = metadata.distribution('gnssrefl').entry_points
+        mods = [ep.value.split(':')[0] for ep in eps if ep.group == 'console_scripts']
+    except metadata.PackageNotFoundError:
+        mods = []
+    if not mods:
+        setup = Path(__file__).resolve().parent.parent / 'setup.py'
+        mods = re.findall(r'=\s*(gnssrefl\.\w+):main', setup.read_text())
+    return sorted(set(mods))
+
+
+def import_times(budget=0.5, repeat=3):
+    """
+    imports each console script module in a new python and checks the time
+    it takes and that none of the HEAVY_MODULES came with it
+
+    Parameters
+    ----------
+    budget : float, optional
+        allowed import time (seconds). default is 0.5
+    repeat : integer, optional
+        number of imports of each module, the fastest one is used. default is 3
+
+    Returns
+    -------
+    ok : boolean
+        whether all the modules passed
+    """
+    code = ('import json, sys, time; t = time.perf_counter(); import {0}; '
+            'dt = time.perf_counter() - t; '
+            'print(json.dumps([dt, [m for m in {1} if m in sys.modules]]))')
+    env = dict(os.environ)
+    # utils needs REFL_CODE when it is imported
+    for v in ['REFL_CODE', 'ORBITS', 'EXE']:
+        env.setdefault(v, tempfile.gettempdir())
+    ok = True
+    print('{0:30s} {1:>8s}  {2}'.format('module', 'time (s)', 'heavy imports'))
+    for mod in console_modules():
+        times = []
+        for i in range(repeat):
+            p = subprocess.run([sys.executable, '-c', code.format(mod, HEAVY_MODULES)],
+                               capture_output=True, text=True, env=env)
+            if p.returncode != 0:
+                break
+            dt, heavy = json.loads(p.stdout.strip().split('\n')[-1])
+            times.append(dt)
+        if not times:
+            print('{0:30s} {1:>8s}'.format(mod, 'failed'))
+            print(p.stderr.strip().split('\n')[-1])
+            ok = False
+            continue
+        passed = (min(times) <= budget) and not heavy
+        ok = ok and passed
+        print('{0:30s} {1:8.3f}  {2} {3}'.format(mod, min(times), ' '.join(heavy), '' if passed else '<<< FAIL'))
+    if ok:
+        print('All console scripts import within', budget, 's')
+    else:
+        print('Some console scripts are too slow to import or import heavy modules')
+    return ok
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-baseline", default='gnssrefl_benchmarks.json', type=str, help="json file with the baseline timings")
+    parser.add_argument("-update", default=None, type=str, help="save these timings as the baseline (True or False)")
+    parser.add_argument("-rate", default=None, type=int, help="sampling interval of the synthetic data, seconds (default 30)")
+    parser.add_argument("-constel", default=None, type=str, help="constellations, default is GRE")
+    parser.add_argument("-rh", default=None, type=float, help="reflector height, meters (default 2)")
+    parser.add_argument("-noise", default=None, type=float, help="SNR noise, dB-Hz (default 0.5)")
+    parser.add_argument("-repeat", default=None, type=int, help="number of runs of each benchmark (default 3)")
+    parser.add_argument("-only", default=None, nargs='*', type=str, help="benchmarks to run: " + ' '.join(ALL_BENCHMARKS))
+    parser.add_argument("-keep", default=None, type=str, help="keep the scratch directory (True or False)")
+    parser.add_argument("-imports", default=None, type=str, help="only check the import time of the console scripts (True or False)")
+    parser.add_argument("-budget", default=None, type=float, help="allowed import time of a console script, seconds (default 0.5)")
+
+    args = parser.parse_args().__dict__
+
+    # utils needs REFL_CODE when it is imported. the benchmarks use their own REFL_CODE later
+    import gnssrefl.gps as g
+    g.check_environ_variables()
+    from gnssrefl.utils import str2bool
+    # convert all expected boolean inputs from strings to booleans
+    boolean_args = ['update', 'keep', 'imports']
+    args = str2bool(args, boolean_args)
+
+    # only return a dictionary of arguments that were added from the user - all other defaults will be set in code below
+    return {key: value for key, value in args.items() if value is not None}
+
+
+def benchmarks(baseline: str = 'gnssrefl_benchmarks.json', update: bool = False, rate: int = 30, constel: str = 'GRE',
+               rh: float = 2.0, noise: float = 0.5, repeat: int = 3, only: list = None, keep: bool = False,
+               imports: bool = False, budget: float = 0.5):
+    """
+    times the reflectometry hot paths on synthetic data and compares them with a baseline
+
+    Parameters
+    ----------
+    baseline : string, optional
+        json file with the baseline timings. default is gnssrefl_benchmarks.json
+    update : boolean, optional
+        write these timings to the baseline file. it is also written if it does not exist.
+        default is False
+    rate : integer, optional
+        sampling interval of the synthetic data (seconds). default is 30
+    constel : string, optional
+        constellations of the synthetic data. default is GRE
+    rh : float, optional
+        reflector height (meters). default is 2
+    noise : float, optional
+        SNR noise (dB-Hz). default is 0.5
+    repeat : integer, optional
+        number of runs of each benchmark, the fastest one is compared. default is 3
+    only : list of strings, optional
+        benchmarks to run. default is all of them
+    keep : boolean, optional
+        keep the scratch directory. default is False
+    imports : boolean, optional
+        only check that the console scripts import within budget, and exit
+        with status 1 if they do not. default is False
+    budget : float, optional
+        allowed import time of a console script (seconds). default is 0.5
+    """
+    if imports:
+        if not import_times(budget, repeat):
+            sys.exit(1)
+        return
+
+    baseline = os.path.abspath(baseline)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='gnssrefl_bench_')
+    try:
+        results = run_benchmarks(workdir, rate, constel, rh, noise, repeat, only)
+    finally:
+        os.chdir(cwd)
+        if keep:
+            print('Scratch directory:', workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = {'config': {'rate': rate, 'constel': constel, 'rh': rh, 'noise': noise, 'repeat': repeat},
+           'python': platform.python_version(), 'numpy': np.__version__,
+           'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d %H:%M'),
+           'results': results}
+
+    if os.path.isfile(baseline):
+        with open(baseline) as f:
+            base = json.load(f)
+        if base.get('config') != out['config']:
+            print('The baseline was made with different synthetic data:', base.get('config'))
+        compare(results, base)
+    else:
+        update = True
+    if update:
+        with open(baseline, 'w') as f:
+            json.dump(out, f, indent=4)
+        print('Timings written to', baseline)
+
+
+def main():
+    args = parse_arguments()
+    benchmarks(**args)
+
+
+if __name__ == "__main__":
+    main()
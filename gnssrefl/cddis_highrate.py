@@ -1,6 +1,8 @@
 import gnssrefl.gps as g
+import gnssrefl.hatanaka as hatanaka
 import sys
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 import subprocess
 import os 
 import time
@@ -16,13 +18,15 @@ def cddis_highrate(station, year, month, day,stream,dec_rate):
     ??? does not appear to have Rinex 2 files anymore ???
     ??? goes they switched in 2020 .... ???
     added dec rate to make the code a tiny bit faster
+    RINEX 3 files are Hatanaka decompressed and merged in python (see merge_rinex3),
+    so CRX2RNX and gfzrnx are not needed for them. RINEX 2 files are gunzipped and
+    Hatanaka decompressed in python too (see rinex2_15min); gfzrnx merges them
     """
     fexist  = False
     if len(station) == 4:
         version = 2
     else:
         version = 3
-    crnxpath = g.hatanaka_version()
     gfzpath = g.gfz_version()
     alpha='abcdefghijklmnopqrstuvwxyz'
     # if doy is input
@@ -32,9 +36,9 @@ def cddis_highrate(station, year, month, day,stream,dec_rate):
         month = d.month; day = d.day
     doy,cdoy,cyyyy,cyy = g.ymd2doy(year,month,day); 
 
-    if not os.path.isfile(gfzpath):
+    if (version == 2) and (not os.path.isfile(gfzpath)):
         print('You need to install gfzrnx to use high-rate RINEX data in my code.')
-        return
+        return '', fexist
 
     gns = 'https://cddis.nasa.gov/archive/gnss/data/highrate/' 
     gns = gns + cyyyy + '/'+ cdoy + '/' +cyy + 'd/'
@@ -45,6 +49,7 @@ def cddis_highrate(station, year, month, day,stream,dec_rate):
     print('WARNING: Please help modify this code / submit a pull request. ')
     print('WARNING: Get yourself a cup of coffeee. Downloading 96 files takes a long time.')
     fileF = 0
+    v3files = [] # RINEX 3 files to be merged, in time order
     streamID  = '_' + stream + '_'
     s1 = time.time()
     for h in range(0,24):
@@ -54,49 +59,45 @@ def cddis_highrate(station, year, month, day,stream,dec_rate):
         for e in ['00', '15', '30', '45']:
             if version == 2:
                 oname = station + cdoy + alpha[h] + e + '.' + cyy + 'o'; 
-                file_name, crnx_name, file_name2, crnx_name2, exe1, exe2 = variableArchives(station,year,doy,cyyyy,cyy,cdoy,alpha[h],e) 
+                file_name, file_name2 = variableArchives(station,year,doy,cyyyy,cyy,cdoy,alpha[h],e) 
             else:
                 file_name = station.upper() + streamID + cyyyy + cdoy + ch + e + '_15M_01S_MO.crx.gz'
-                crnx_name = file_name[:-3] 
                 oname = station.upper() + streamID + cyyyy + cdoy + ch + e + '_15M_01S_MO.rnx' # do we need this?
 
             new_way_dir = '/gnss/data/highrate/' + cyyyy + '/' + cdoy + '/' + cyy + 'd/' + ch + '/'
             if os.path.isfile(oname):
                 print('Found it:', new_way_dir,file_name)
                 fileF = fileF + 1
+                v3files.append(oname)
             elif os.path.isfile(file_name):
                 print('Found gzip/hatanaka file:', new_way_dir,file_name)
-                subprocess.call(['gunzip',file_name])
-                subprocess.call([crnxpath, crnx_name])
-                subprocess.call(['rm',crnx_name])
+                if (version == 3):
+                    # decompressed on the fly when the files are merged
+                    v3files.append(file_name)
+                else:
+                    rinex2_15min(file_name, oname)
                 fileF = fileF + 1
             else:
                 print('Looking for:', new_way_dir,file_name)
                 try:
                     #g.cddis_download(file_name,new_way_dir)
                     g.cddis_download_2022B(file_name,new_way_dir)
-                    if (version == 3):
-                        if os.path.isfile(file_name): 
-                            subprocess.call(['gunzip',file_name])
-                            subprocess.call([crnxpath, crnx_name])
-                            subprocess.call(['rm',crnx_name])
                     if (version == 2):
                         if os.path.isfile(file_name):
-                            subprocess.call([exe1,file_name])
-                            subprocess.call([crnxpath, crnx_name])
-                            subprocess.call(['rm',crnx_name])
+                            rinex2_15min(file_name, oname)
                         else:
                             g.cddis_download_2022B(file_name2,new_way_dir)
                             #g.cddis_download(file_name2,new_way_dir)
-                            subprocess.call([exe2,file_name2])
-                            subprocess.call([crnxpath, crnx_name2])
-                            subprocess.call(['rm',crnx_name2])
+                            rinex2_15min(file_name2, oname)
                 except:
                     print('Failure using cddis_download_2022B')
                     subprocess.call(['rm','-f',file_name])
 
                 if os.path.isfile(oname):
                     fileF = fileF + 1
+                elif (version == 3) and os.path.isfile(file_name):
+                    v3files.append(file_name)
+                    fileF = fileF + 1
     if version == 2:
         searchpath = station + cdoy + '*.' + cyy + 'o'
         rinexname = station + cdoy + '0.' + cyy + 'o'
@@ -108,6 +109,21 @@ def cddis_highrate(station, year, month, day,stream,dec_rate):
 
     s2=time.time()
     print('That download experience took ', int(s2-s1), ' seconds.')
+    if (fileF > 0) and (version == 3):
+        print('Attempt to merge the 15 minute files and move to ', rinexname)
+        if merge_rinex3(v3files, tmpname, dec_rate):
+            for filename in v3files:
+                subprocess.call(['rm','-f',filename])
+            subprocess.call(['mv',tmpname,rinexname])
+            print('File created ', rinexname)
+            fexist = True
+            s2=time.time()
+            print('That experience took ', int(s2-s1), ' seconds.')
+            return rinexname,  fexist
+        if not os.path.isfile(gfzpath):
+            print('You need to install gfzrnx to merge these high-rate RINEX files.')
+            return rinexname,  fexist
+
     print('Attempt to merge the 15 minute files using gfzrnx and move to ', rinexname)
     if (fileF > 0): # files exist
         if (dec_rate == 1):
@@ -147,27 +163,46 @@ def variableArchives(station,year,doy,cyyyy,cyy, cdoy,chh,cmm):
     T0 = 2020 + 335/365.25
     if ((year+doy/365.25) <= T0):
         file_name = station + cdoy + chh + cmm + '.' + cyy + 'd.Z'
-        crnx_name = file_name[:-2]
         file_name2 = station + cdoy + chh + cmm + '.' + cyy + 'd.gz'
-        crnx_name2 = file_name2[:-3]
-        exe1 = 'uncompress'
-        exe2 = 'gunzip'
     else:
         file_name = station + cdoy +  chh + cmm + '.' + cyy + 'd.gz'
-        crnx_name = file_name[:-3]
         file_name2 = station + cdoy + chh + cmm + '.' + cyy + 'd.Z'
-        crnx_name2 = file_name2[:-2]
-        exe2 = 'uncompress'
-        exe1 = 'gunzip'
 
-    return file_name, crnx_name, file_name2, crnx_name2, exe1, exe2
+    return file_name, file_name2
+
+
+def rinex2_15min(file_name, oname):
+    """
+    makes the RINEX 2 file oname from a 15 minute Hatanaka file that is gzipped (.gz)
+    or unix compressed (.Z). gzip and Hatanaka compression are removed in python
+    (see gps.uncompress_rinex); only the .Z files still need uncompress
+
+    parameters
+    -------------
+    file_name : string
+        name of the compressed file, which is removed
+    oname : string
+        name of the RINEX 2 file
+
+    returns
+    ----------
+    boolean
+        whether oname was written
+    """
+    if file_name.endswith('.Z'):
+        subprocess.call(['uncompress', file_name])
+        file_name = file_name[:-2]
+    if not os.path.isfile(file_name):
+        return False
+    return g.uncompress_rinex(file_name, oname)
 
 
 
 def bkg_highrate(station, year, month, day,stream,dec_rate):
     """
     picks up a highrate RINEX 3 file from BKG, merges and decimates it.
-    requires gfzrnx
+    the Hatanaka files are decompressed and merged in python (see merge_rinex3).
+    gfzrnx is only needed if the 15 minute files do not have the same observables
 
     parameters
     -------------
@@ -190,7 +225,6 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
     """
     fexist  = False
     version = 3
-    crnxpath = g.hatanaka_version()
     gexe = g.gfz_version()
     alpha='abcdefghijklmnopqrstuvwxyz'
     # if doy is input
@@ -200,12 +234,6 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
         month = d.month; day = d.day
     doy,cdoy,cyyyy,cyy = g.ymd2doy(year,month,day); 
 
-    if not os.path.isfile(crnxpath):
-        g.hatanaka_warning(); return
-
-    if not os.path.isfile(gexe):
-        print('You need to install gfzrnx to use high-rate RINEX data in my code.')
-        return '', fexist
 
 #    https://igs.bkg.bund.de/root_ftp/EUREF/highrate/2022/233/a/VLIS00NLD_R_20222330000_15M_01S_MO.crx.gz
     gns = 'https://igs.bkg.bund.de/root_ftp/EUREF/highrate/'
@@ -215,6 +243,7 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
     s1=time.time()
     print('WARNING: Get yourself a cup of coffeee. Downloading 96 files takes a long time.')
     fileF = 0
+    v3files = [] # files to be merged, in time order
     streamID  = '_' + stream + '_'
     s1 = time.time()
     for h in range(0,24):
@@ -223,23 +252,26 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
         print('Hour: ', ch)
         for e in ['00', '15', '30', '45']:
             file_name = station.upper() + streamID + cyyyy + cdoy + ch + e + '_15M_01S_MO.crx.gz'
-            crnx_name = file_name[:-3] 
             oname = file_name[:-6] + 'rnx'
 
             dirname = gns + '/' + alpha[h] + '/'
             if os.path.isfile(oname):
                 fileF = fileF + 1
+                v3files.append(oname)
                 print('already have ', oname)
+            elif os.path.isfile(file_name):
+                fileF = fileF + 1
+                v3files.append(file_name)
+                print('already have ', file_name)
             else:
                 try:
+                    # gzip and hatanaka compression are removed when the files are merged
                     wget.download(dirname+file_name,file_name)
-                    subprocess.call(['gunzip',file_name]) # unzip
-                    subprocess.call([crnxpath, crnx_name]) # hatanaka
-                    subprocess.call(['rm',crnx_name]) # remove old file
                 except:
                     okok = 1
-                if os.path.isfile(oname):
-                    print('have downloaded ', oname)
+                if os.path.isfile(file_name):
+                    print('have downloaded ', file_name)
+                    v3files.append(file_name)
                     fileF = fileF + 1
 
     searchP = station.upper() + streamID + cyyyy + cdoy + '*15M*MO.rnx'
@@ -251,10 +283,18 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
     file_name24 = ''
 
     if (fileF > 0):
-        subprocess.call([gexe,'-finp', searchP, '-fout', outfile, '-vo','3', '-smp', crate, '-f','-q'])
         file_name24 = station.upper() + streamID + cyyyy + cdoy + '0000_01D_' + crate + 'S_MO.rnx'
-        subprocess.call(['mv',outfile, file_name24]) # remove old file
-        fexist = True
+        if merge_rinex3(v3files, outfile, dec_rate):
+            for filename in v3files:
+                subprocess.call(['rm','-f',filename])
+            subprocess.call(['mv',outfile, file_name24])
+            fexist = True
+        elif os.path.isfile(gexe):
+            subprocess.call([gexe,'-finp', searchP, '-fout', outfile, '-vo','3', '-smp', crate, '-f','-q'])
+            subprocess.call(['mv',outfile, file_name24]) # remove old file
+            fexist = True
+        else:
+            print('You need to install gfzrnx to merge these high-rate RINEX files.')
 
     s2=time.time()
     print('That download and merging experience took ', int(s2-s1), ' seconds.')
@@ -264,3 +304,87 @@ def bkg_highrate(station, year, month, day,stream,dec_rate):
     if fexist:
         subprocess.call(cm,shell=True)
     return file_name24,  fexist
+
+
+def merge_rinex3(filelist, rinexname, dec_rate):
+    """
+    merges RINEX 3 files (e.g. 15 minute high-rate files) into a single file.
+    gzip and Hatanaka compression are removed in memory, so no CRX2RNX, gunzip
+    or intermediate files are needed.  The header of the first file is used.
+
+    If the files do not all have the same observables, nothing is merged - 
+    the files are written out uncompressed (*.rnx) so gfzrnx can be used instead.
+
+    parameters
+    -------------
+    filelist : list of strings
+        RINEX 3 filenames (rnx, rnx.gz, crx or crx.gz) in time order
+
+    rinexname : string
+        name of the merged RINEX 3 file
+
+    dec_rate : integer
+        decimation in seconds. 0 or 1 means no decimation
+
+    returns
+    ----------
+    merged : boolean
+        whether the merged file was written
+
+    """
+    headers = [obs_type_header(filename) for filename in filelist]
+    if any(header != headers[0] for header in headers):
+        print('The files do not all have the same observables. They will be uncompressed instead.')
+        for filename in filelist:
+            oname = filename.replace('.crx', '.rnx').replace('.gz', '')
+            if oname != filename:
+                with open(oname, 'w') as fout:
+                    fout.writelines(hatanaka.open_rinex(filename))
+                subprocess.call(['rm','-f',filename])
+        return False
+
+    decimate = (dec_rate > 1)
+    with open(rinexname, 'w') as fout:
+        for i, filename in enumerate(filelist):
+            lines = hatanaka.open_rinex(filename)
+            for line in lines:
+                label = line[60:80].strip()
+                if 'END OF HEADER' in label:
+                    if i == 0:
+                        fout.write(line)
+                    break
+                # the first/last times and the interval are not right for the merged file
+                if (i == 0) and (label != 'TIME OF LAST OBS') and not (decimate and label == 'INTERVAL'):
+                    fout.write(line)
+            keep = True
+            for line in lines:
+                if line[0] == '>' and line[31] in '016':
+                    sod = 3600*int(line[13:15]) + 60*int(line[16:18]) + float(line[19:30])
+                    keep = (not decimate) or (int(round(sod)) % dec_rate == 0)
+                elif line[0] == '>':
+                    keep = True # event records are kept
+                if keep:
+                    fout.write(line)
+
+    return True
+
+
+def obs_type_header(filename):
+    """
+    returns the SYS / # / OBS TYPES header lines of a (compressed) RINEX 3 file as a list
+
+    parameters
+    -------------
+    filename : string
+        RINEX 3 filename (rnx, rnx.gz, crx or crx.gz)
+
+    """
+    obstypes = []
+    lines = hatanaka.open_rinex(filename)
+    for line in lines:
+        if 'SYS / # / OBS TYPES' in line:
+            obstypes.append(line[:60])
+        if 'END OF HEADER' in line:
+            break
+    lines.close()
+    return obstypes
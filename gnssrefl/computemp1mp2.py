@@ -5,13 +5,14 @@ kristine larson
 2020sep03 - modified environment variable requirement
 """
 import argparse
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
 import subprocess
 import sys
 import time
-import wget
+wget = lazy_import('wget')
 
 import gnssrefl.gps as g
 
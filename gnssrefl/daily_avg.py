@@ -2,17 +2,20 @@
 # 2022 june 16
 import argparse
 import datetime
-import matplotlib.pyplot as plt
+import io
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
+mdates = lazy_import('matplotlib.dates')
 import numpy as np
 import os
 import sys
-import warnings
 import time
 
 from datetime import date
 
 # my code
 import gnssrefl.gps as g
+import gnssrefl.results_store as store
 #
 
 def fbias_daily_avg(station):
@@ -95,10 +98,10 @@ def fbias_daily_avg(station):
 
 
 
-def readin_plot_daily(station,extension,year1,year2,fr,alldatafile,csvformat,howBig,ReqTracks,azim1=0,azim2=360):
+def readin_plot_daily(station,extension,year1,year2,fr,alldatafile,csvformat,howBig,ReqTracks,azim1=0,azim2=360,incremental=False):
     """
     worker code for daily_avg_cl.py
-    reads in daily files
+    reads in the daily results (via the results store, see results_store.py)
 
     parameters
     ----------
@@ -135,6 +138,10 @@ def readin_plot_daily(station,extension,year1,year2,fr,alldatafile,csvformat,how
     azim2 : integer
         maximum azimuth, degrees
 
+    incremental : boolean, optional
+        keep the statistics of each day and only compute them again for days whose
+        result file changed (see cached_day_summaries). default is False
+
     returns
     ---------
     tv : numpy array
@@ -158,123 +165,60 @@ def readin_plot_daily(station,extension,year1,year2,fr,alldatafile,csvformat,how
 # [yr, doy, meanRHtoday, len(rh), d.month, d.day, stdRHtoday]
 # 2021 november 8, added amplitude, so now 8 columns
 # 2022 september 4, added azimuth limits
-    tv = np.empty(shape=[0, 8])
-    tvall = np.empty(shape=[0, 7])
+    tv = []
     ngps = []; nglo = [] ; ngal = []; nbei = []
-    obstimes = []; medRH = []; meanRH = [] ; alltimes = []; meanAmp = []
+    obstimes = []; medRH = []; meanRH = [] ; meanAmp = []
+    # times (matplotlib date numbers) and RH of all the retrievals used, for the plot
+    alltimes = []; allgood = []
     fig,ax=plt.subplots()
-    year_list = np.arange(year1, year2+1, 1)
-    NumFiles = 0
     s1 = time.time()
-    for yr in year_list:
-        direc = xdir + '/' + str(yr) + '/results/' + station + '/' + extension + '/'
-        if os.path.isdir(direc):
-            all_files = os.listdir(direc)
-            #print('Number of files in ', yr, len(all_files))
-            for f in all_files:
-                fname = direc + f
-                L = len(f)
-        # file names must have 7 characters in them ... 
-                if (L == 7):
-                    NumFiles +=  1
-        # check that it is a file and not a directory and that it has something/anything in it
-                    try:
-                        # trying to turn off the annoying empty file warnings
-                        with warnings.catch_warnings():
-                            warnings.simplefilter("ignore")
-                            a = np.loadtxt(fname,skiprows=3,comments='%')
-                        nr,nc=a.shape
-                        if (nr > 0):
-                            # add the new azimuth constraint here ... 2022sep04
-                            www = (a[:,5] > azim1 ) & (a[:,5] < azim2 )
-                            a = a[www,:]
-
-                            y = a[:,0] +a[:,1]/365.25; rh = a[:,2] ; 
-                            frequency = a[:,10]; azimuth = a[:,5]; sat = a[:,3]; amplitude=a[:,6]
-                            # added utc to the all RH file
-                            utcTime = a[:,4]; 
-                            yr = int(a[0,0]); doy = int(a[0,1])
-                            d = datetime.date(yr,1,1) + datetime.timedelta(doy-1)
-                            peak2noise = a[:,13]
-
-                            medv = np.median(rh)
-                            # 0 means use all frequencies.  otherwise, you can specify 
-                            if fr == 0:
-                                cc = (rh < (medv+howBig))  & (rh > (medv-howBig))
-                            else:
-                                cc = (rh < (medv+howBig))  & (rh > (medv-howBig)) & (frequency == fr)
-                            good =rh[cc]; goodT =y[cc]; goodAmp = amplitude[cc]
-                            gazim = azimuth[cc]; gsat = sat[cc]; gamp = amplitude[cc]; gpeak2noise = peak2noise[cc]
-                            gfreq = frequency[cc]
-                            # added 21may14
-                            gutcTime = utcTime[cc]
-                            
-                            NG = len(good)
-                            # tvall no longer being used as a variable but still sending it to the function.
-                            # unfortunately the info is not sorted - because of the way the directory listing works....
-                            tvall = write_out_all(allrh, csvformat, NG, yr, doy, d, good, gazim, gfreq, gsat,gamp,gpeak2noise,gutcTime,tvall)
-
+    if incremental:
+        summaries, NumFiles = cached_day_summaries(station, extension, year1, year2, fr, howBig, csvformat, azim1, azim2)
+    else:
+        # all the results of these years, from the results store rather than the daily files
+        alla, NumFiles = store.read_results(station, extension, year1, year2)
+        # add the new azimuth constraint here ... 2022sep04
+        www = (alla[:,5] > azim1 ) & (alla[:,5] < azim2 )
+        summaries = day_summaries(alla[www,:], fr, howBig, csvformat)
+
+    for (yr, doy) in sorted(summaries):
+        day = summaries[(yr, doy)]
+        # no retrievals in the azimuth limits
+        if day is None:
+            continue
+        allrh.write(day['allrh'])
         # only save if there are some minimal number of values
-                            if (len(good) >= ReqTracks):
-                                rh = good
-                                # this is the plot with all the data -not the daily average
-                                alltimes = []
-
-                                # put in the real time (as opposed to just year,month day)
-                                #filler = datetime.datetime(year=yr, month=d.month, day=d.day, hour = hrr, minute=mm, second = ss)
-                                for w in range(0,len(good)):
-                                    hrr = int(np.floor(gutcTime[w])) # 
-                                    mm = int(60*(gutcTime[w] - hrr )); ss = 0
-                                    filler = datetime.datetime(year=yr, month=d.month, day=d.day, hour = hrr, minute=mm, second = ss)
-                                    alltimes.append(filler)
-                                # 
-                                ax.plot(alltimes,good,'b.')
-
-                                # this are stats for the daily averages - is this slowing it down? - apparently not
-                                # turned off for now
-                                if True:
-                                    ijk = (gsat  < 100); 
-                                    ngps = np.append(ngps, len(gsat[ijk]))
-
-                                    ijk = (gsat  > 300);  # beidou
-                                    nbei = np.append(nbei, len(gsat[ijk]))
-   
-                                    ijk = (gsat > 100) * (gsat < 200);  # glonass
-                                    nglo = np.append(nglo, len(gsat[ijk]))
-
-                                    ijk = (gsat > 200) * (gsat < 300); # galileo
-                                    ngal = np.append(ngal, len(gsat[ijk]))
-
-                                obstimes.append(datetime.datetime(year=yr, month=d.month, day=d.day, hour=12, minute=0, second=0))
-                                # ???
-                                medRH.append(medv)
-                                #medRH =np.append(medRH, medv)
-            # store the meanRH after the outliers are removed using simple median filter
-                                meanRHtoday = np.mean(good)
-
-                                stdRHtoday = np.std(good)
-                                #meanRH =np.append(meanRH, meanRHtoday)
-                                #
-                                # july 7, 2022
-                                #
-                                meanRH.append(meanRHtoday)
-                                # added amplitude 2021 Nov 8 
-                                #meanAmp = np.append(meanAmp, np.mean(goodAmp))
-                                meanAmp.append(np.mean(goodAmp))
+        if (day['n'] >= ReqTracks):
+            d = datetime.date(yr,1,1) + datetime.timedelta(doy-1)
+            # this is the plot with all the data -not the daily average
+            # put in the real time (as opposed to just year,month day), to the minute
+            hrr = np.floor(day['utc'])
+            mm = (60*(day['utc'] - hrr)).astype(int)
+            alltimes.append(mdates.date2num(datetime.datetime(year=yr, month=d.month, day=d.day)) + (hrr*60 + mm)/1440)
+            allgood.append(day['rh'])
+
+            ngps.append(day['ngps']); nglo.append(day['nglo']); ngal.append(day['ngal']); nbei.append(day['nbei'])
+
+            obstimes.append(datetime.datetime(year=yr, month=d.month, day=d.day, hour=12, minute=0, second=0))
+            medRH.append(day['medv'])
+            # the meanRH after the outliers are removed using simple median filter
+            meanRH.append(day['mean'])
+            # added amplitude 2021 Nov 8 
+            meanAmp.append(day['amp'])
             # add month and day just cause some people like that instead of doy
             # added standard deviation feb14, 2020
-                                # updated this to include mean amplitude 2021 november 8
-                                newl = [yr, doy, meanRHtoday, len(rh), d.month, d.day, stdRHtoday, np.mean(goodAmp)]
-
-                                tv = np.append(tv, [newl],axis=0)
-                                k += 1
-                            else:
-                                #print('not enough retrievals on ', yr, d.month, d.day, len(good))
-                                NotEnough = NotEnough + 1
-                    except:
-                        okok = 1;
+            # updated this to include mean amplitude 2021 november 8
+            tv.append([yr, doy, day['mean'], day['n'], d.month, d.day, day['std'], day['amp']])
         else:
-            abc = 0; # dummy line
+            #print('not enough retrievals on ', yr, d.month, d.day, len(good))
+            NotEnough = NotEnough + 1
+
+    tv = np.array(tv, dtype=float).reshape(-1, 8)
+    ngps = np.array(ngps, dtype=float); nglo = np.array(nglo, dtype=float)
+    ngal = np.array(ngal, dtype=float); nbei = np.array(nbei, dtype=float)
+    if len(alltimes) > 0:
+        ax.plot(np.concatenate(alltimes), np.concatenate(allgood), 'b.')
+        ax.xaxis_date()
     #meanRH = np.asarray(meanRH)
     s2 = time.time()
 
@@ -313,6 +257,221 @@ def readin_plot_daily(station,extension,year1,year2,fr,alldatafile,csvformat,how
 
     return tv, obstimes
 
+def daily_stats(a, howBig, fr=0):
+    """
+    applies the median filter to the RH retrievals of every day and computes the daily
+    statistics, for all the days at once. the results are sorted by year and doy once,
+    and each statistic is then computed for all the days with one numpy call
+
+    parameters
+    ----------
+    a : numpy array
+        results as in the gnssir daily files (year, doy, RH, sat, UTC, azimuth, amplitude, ...),
+        in any order
+    howBig : float
+        how far in meters can a RH be from the median for that day
+    fr : integer, optional
+        0 for all frequencies (default).  otherwise, only RH for this frequency are kept.
+        the median is that of all frequencies either way
+
+    returns
+    -------
+    stats : dictionary of numpy arrays, one value per day
+        year, doy, medv (median RH), n (number of RH kept), mean, std (of the RH kept, meters),
+        amp (mean amplitude of the RH kept), ngps, nglo, ngal, nbei (number kept per constellation).
+        mean, std and amp are nan for days where nothing is kept
+    order : numpy array of integers
+        indices that sort a by year and doy (the order within a day is kept)
+    keep : numpy array of booleans
+        for the sorted results, a[order], whether the RH is kept
+    """
+    key = a[:,0]*1000 + a[:,1]
+    order = np.argsort(key, kind='stable')
+    s = a[order]; key = key[order]
+    if len(s) == 0:
+        starts = np.zeros(0, dtype=int)
+    else:
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    counts = np.diff(np.r_[starts, len(s)])
+    ndays = len(starts)
+    dayidx = np.repeat(np.arange(ndays), counts)
+    rh = s[:,2]
+
+    # median of each day, from the RH sorted within each day
+    v = rh[np.lexsort((rh, key))]
+    medv = (v[starts + (counts-1)//2] + v[starts + counts//2])/2
+    m = medv[dayidx]
+    keep = (rh < (m+howBig)) & (rh > (m-howBig))
+    # 0 means use all frequencies.  otherwise, you can specify 
+    if fr != 0:
+        keep = keep & (s[:,10] == fr)
+
+    kday = dayidx[keep]
+    n = np.bincount(kday, minlength=ndays)
+    # first kept value of each day that has any
+    some = n > 0
+    kstarts = (np.cumsum(n) - n)[some]
+
+    def daymean(x):
+        out = np.full(ndays, np.nan)
+        if len(x) > 0:
+            out[some] = np.add.reduceat(x, kstarts)/n[some]
+        return out
+
+    good = rh[keep]
+    mean = daymean(good)
+    dev = good - mean[kday]
+    std = np.sqrt(daymean(dev*dev))
+    amp = daymean(s[keep,6])
+
+    gsat = s[keep,3]
+    stats = {'year': s[starts,0].astype(int), 'doy': s[starts,1].astype(int), 'medv': medv,
+             'n': n, 'mean': mean, 'std': std, 'amp': amp,
+             'ngps': np.bincount(kday, weights=(gsat < 100), minlength=ndays).astype(int),
+             'nbei': np.bincount(kday, weights=(gsat > 300), minlength=ndays).astype(int),
+             'nglo': np.bincount(kday, weights=(gsat > 100) & (gsat < 200), minlength=ndays).astype(int),
+             'ngal': np.bincount(kday, weights=(gsat > 200) & (gsat < 300), minlength=ndays).astype(int)}
+    return stats, order, keep
+
+
+def daily_tv(a, howBig, ReqTracks, fr=0):
+    """
+    daily average RH of a set of results, for the days with enough RH
+    after the median filter (see daily_stats)
+
+    parameters
+    ----------
+    a : numpy array
+        results as in the gnssir daily files, in any order
+    howBig : float
+        how far in meters can a RH be from the median for that day
+    ReqTracks : integer
+        is the number of retrievals required per day
+    fr : integer, optional
+        0 for all frequencies (default).  otherwise, only this frequency is used
+
+    returns
+    -------
+    tv : numpy array
+        [year, doy, meanRHtoday, number of RH, month, day, stdRH, averageAmplitude],
+        one row per day, sorted by year and doy
+    """
+    stats, order, keep = daily_stats(a, howBig, fr)
+    ok = stats['n'] >= ReqTracks
+    month, day = month_day(stats['year'][ok], stats['doy'][ok])
+    return np.column_stack((stats['year'][ok], stats['doy'][ok], stats['mean'][ok], stats['n'][ok],
+                            month, day, stats['std'][ok], stats['amp'][ok])).astype(float)
+
+
+def month_day(year, doy):
+    """
+    returns month and day of month for arrays of year and day of year
+    """
+    dates = (np.asarray(year) - 1970).astype('datetime64[Y]').astype('datetime64[D]') + (np.asarray(doy) - 1).astype(int)
+    months = dates.astype('datetime64[M]')
+    return months.astype(int) % 12 + 1, (dates - months.astype('datetime64[D]')).astype(int) + 1
+
+
+def day_summaries(a, fr, howBig, csvformat):
+    """
+    applies the median filter to the RH retrievals of each day and computes the daily
+    statistics (see daily_stats)
+
+    parameters
+    ----------
+    a : numpy array
+        results as in the gnssir daily files
+    fr : integer
+        0 for all frequencies.  otherwise, only this frequency is used
+    howBig : float
+        how far in meters can a RH be from the median for that day
+    csvformat : boolean
+        whether the lines for the file with all the retrievals are in csv format
+
+    returns
+    -------
+    summaries : dictionary
+        (year, doy) keys. the values are dictionaries with medv (median RH of the day),
+        n (number of RH kept), mean, std (of the RH kept, meters), amp (mean amplitude),
+        ngps, nglo, ngal, nbei (number kept per constellation), allrh (lines for the
+        file with all the retrievals), utc and rh (times and RH kept)
+    """
+    stats, order, keep = daily_stats(a, howBig, fr)
+    kept = a[order][keep]
+    ends = np.cumsum(stats['n'])
+    month, day = month_day(stats['year'], stats['doy'])
+    summaries = {}
+    for i in range(len(ends)):
+        yr = int(stats['year'][i]); doy = int(stats['doy'][i])
+        b = kept[ends[i]-stats['n'][i]:ends[i]]
+        buf = io.StringIO()
+        d = datetime.date(yr, int(month[i]), int(day[i]))
+        write_out_all(buf, csvformat, len(b), yr, doy, d, b[:,2], b[:,5], b[:,10], b[:,3], b[:,6], b[:,13], b[:,4], None)
+        summaries[(yr, doy)] = {'medv': stats['medv'][i], 'n': int(stats['n'][i]), 'mean': stats['mean'][i],
+                                'std': stats['std'][i], 'amp': stats['amp'][i],
+                                'ngps': stats['ngps'][i], 'nglo': stats['nglo'][i],
+                                'ngal': stats['ngal'][i], 'nbei': stats['nbei'][i],
+                                'allrh': buf.getvalue(), 'utc': b[:,4], 'rh': b[:,2]}
+    return summaries
+
+
+def cached_day_summaries(station, extension, year1, year2, fr, howBig, csvformat, azim1, azim2):
+    """
+    returns the daily statistics of each day (see day_summaries), using the summaries kept in the results store
+    from the last run. only the days whose result file changed since, or that are new,
+    are computed again, so a daily run takes time in proportion to the new days rather
+    than to the length of the record. the summaries are kept for one set of inputs,
+    so changing e.g. the median filter starts again
+
+    parameters
+    ----------
+    station : str
+        station name, 4 ch, lowercase
+    extension : str
+        folder extension - usually ''
+    year1 : integer
+        first year
+    year2 : integer
+        last year
+    fr : integer
+        0 for all frequencies.  otherwise, only this frequency is used
+    howBig : float
+        how far in meters can a RH be from the median for that day
+    csvformat : boolean
+        whether the lines for the file with all the retrievals are in csv format
+    azim1 : integer
+        minimum azimuth, degrees
+    azim2 : integer
+        maximum azimuth, degrees
+
+    returns
+    -------
+    summaries : dictionary
+        (year, doy) keys and day_summaries values (None for days without retrievals in the azimuth limits)
+    ndays : integer
+        number of days with a result file
+    """
+    name = 'daily_avg fr={0} howBig={1} csv={2} azim={3},{4}'.format(fr, howBig, csvformat, azim1, azim2)
+    store.sync(station, extension, year1, year2)
+    versions = store.day_versions(station, extension, year1, year2)
+    cached = store.read_summaries(station, name, extension, year1, year2)
+
+    todo = [k for k in versions if (k not in cached) or (cached[k][0:2] != versions[k])]
+    gone = [k for k in cached if k not in versions]
+    new = {}
+    if len(todo) > 0:
+        a = store.read_days(station, extension, todo)
+        www = (a[:,5] > azim1 ) & (a[:,5] < azim2 )
+        new = day_summaries(a[www,:], fr, howBig, csvformat)
+    print('Days with new or changed results: ', len(todo), ' days taken from the last run: ', len(versions) - len(todo))
+    store.write_summaries(station, name, extension, {k: versions[k] + (new.get(k),) for k in todo}, gone)
+
+    summaries = {k: v[2] for k, v in cached.items() if k in versions}
+    for k in todo:
+        summaries[k] = new.get(k)
+    return summaries, len(versions)
+
+
 def daily_avg_stat_plots(obstimes,meanRH,meanAmp, station,txtdir,tv,ngps,nglo,ngal,nbei):
     """
     make some plots of results - moved here to make it cleaner
@@ -459,18 +618,15 @@ def write_out_all(allrh, csvformat, NG, yr, doy, d, good, gazim, gfreq, gsat,gam
     """
     if (NG > 0):
         # don't really need MM and DD, but ...
+        # all the lines of the day are formatted with one % operation, which is much faster
+        # than one format call per line (same output as the format() version it replaced)
         if csvformat:
-            for ijk in range(0,NG):
-                biggerline = [yr, doy, good[ijk],d.month, d.day, gazim[ijk], gfreq[ijk]]
-                #tvall = np.append(tvall, [biggerline],axis=0)
-                allrh.write(" {0:4.0f},  {1:3.0f},{2:7.3f}, {3:2.0f}, {4:2.0f},{5:6.1f},{6:4.0f},{7:4.0f},{8:6.2f},{9:6.2f},{10:6.2f}\n".format(yr, doy, good[ijk],d.month, d.day, gazim[ijk], gfreq[ijk], gsat[ijk],gamp[ijk],gpeak2noise[ijk], gutcTime[ijk]))
+            line = " %4.0f,  %3.0f,%7.3f, %2.0f, %2.0f,%6.1f,%4.0f,%4.0f,%6.2f,%6.2f,%6.2f\n"
         else:
-            for ijk in range(0,NG):
-                biggerline = [yr, doy, good[ijk],d.month, d.day, gazim[ijk], gfreq[ijk]]
-                #print(biggerline)
-                #tvall = np.append(tvall, [biggerline],axis=0)
-                allrh.write(" {0:4.0f}   {1:3.0f} {2:7.3f} {3:2.0f} {4:2.0f} {5:6.1f} {6:4.0f} {7:4.0f} {8:6.2f} {9:6.2f} {10:6.2f}\n".format(yr, doy, good[ijk],d.month, d.day, gazim[ijk], gfreq[ijk], gsat[ijk],gamp[ijk],gpeak2noise[ijk],gutcTime[ijk]))
-
+            line = " %4.0f   %3.0f %7.3f %2.0f %2.0f %6.1f %4.0f %4.0f %6.2f %6.2f %6.2f\n"
+        x = np.column_stack((np.full(NG, yr), np.full(NG, doy), good, np.full(NG, d.month), np.full(NG, d.day),
+                             gazim, gfreq, gsat, gamp, gpeak2noise, gutcTime))
+        allrh.write((line*NG) % tuple(x.ravel().tolist()))
 
     return tvall
                             #if False:
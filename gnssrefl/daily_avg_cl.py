@@ -1,6 +1,7 @@
 # command line module that calls daily_avg.py
 import argparse
-import matplotlib.pyplot as matplt
+from gnssrefl.lazy import lazy_import
+matplt = lazy_import('matplotlib.pyplot')
 import os
 
 # my code
@@ -29,10 +30,11 @@ def parse_arguments():
     parser.add_argument("-csv", default=None, type=str, help="True if you want csv instead of plain text")
     parser.add_argument("-azim1", default=None, type=int, help="minimum azimuth (deg)")
     parser.add_argument("-azim2", default=None, type=int, help="maximum azimuth (deg)")
+    parser.add_argument("-incremental", default=None, type=str, help="only recompute the days whose results changed since the last run (True or False)")
     args = parser.parse_args().__dict__
 
     # convert all expected boolean inputs from strings to booleans
-    boolean_args = ['plt', 'csv']
+    boolean_args = ['plt', 'csv', 'incremental']
     args = str2bool(args, boolean_args)
 
     # only return a dictionary of arguments that were added from the user - all other defaults will be set in code below
@@ -40,7 +42,8 @@ def parse_arguments():
 
 
 def daily_avg(station: str , medfilter: float, ReqTracks: int, txtfile: str = None, plt: bool = True, 
-        extension: str = '', year1: int = 2005, year2: int = 2030, fr: int = 0, csv: bool = False, azim1: int = 0, azim2: int = 360):
+        extension: str = '', year1: int = 2005, year2: int = 2030, fr: int = 0, csv: bool = False, azim1: int = 0, azim2: int = 360,
+        incremental: bool = False):
     """
         Parameters:
         ___________
@@ -103,6 +106,13 @@ def daily_avg(station: str , medfilter: float, ReqTracks: int, txtfile: str = No
 
         azim2 : integer, optional
             maximum azimuth, degrees
+
+        incremental : boolean, optional
+            keep the daily statistics between runs, and only compute them again for the days
+            whose gnssir results are new or changed. meant for operational use, where
+            daily_avg is run every day after gnssir adds a day. the statistics are kept
+            for the last medfilter, fr, csv and azimuth limits used.
+            default is False
     """
     plt2screen = plt # since variable was originally this name 
     # make surer environment variables are set
@@ -122,7 +132,7 @@ def daily_avg(station: str , medfilter: float, ReqTracks: int, txtfile: str = No
     else:
         alldatafile = txtdir + '/' + station + '_allRH.txt' 
 
-    tv, obstimes = da.readin_plot_daily(station, extension, year1, year2, fr, alldatafile, csv, medfilter, ReqTracks,azim1,azim2)
+    tv, obstimes = da.readin_plot_daily(station, extension, year1, year2, fr, alldatafile, csv, medfilter, ReqTracks,azim1,azim2,incremental)
 
     # default is to show the plots
     if plt2screen:
@@ -7,10 +7,11 @@ import argparse
 import datetime
 import numpy as np
 import os
-import requests
+from gnssrefl.lazy import lazy_import
+requests = lazy_import('requests')
 import sys
 import gnssrefl.gps as g
-import matplotlib.pyplot as plt
+plt = lazy_import('matplotlib.pyplot')
 import subprocess
 import urllib
 
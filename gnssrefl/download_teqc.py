@@ -9,7 +9,8 @@ import os
 import subprocess
 import sys
 
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 
 import gnssrefl.gps as g
 import gnssrefl.computemp1mp2 as veg
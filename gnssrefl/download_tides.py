@@ -5,9 +5,10 @@ kristine larson
 """
 import argparse
 import datetime
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import os
-import requests
+requests = lazy_import('requests')
 import sys
 import gnssrefl.gps as g
 
@@ -5,7 +5,8 @@ IGS2014 frame
 author: kristine larson
 """
 import argparse
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 import sys
 import os
 import gnssrefl.gps as g
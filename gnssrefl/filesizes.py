@@ -1,6 +1,7 @@
 import argparse
 import datetime
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
 import sys
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
+import copy
 import datetime
 import json
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
-import scipy.interpolate
-import scipy.signal
 import subprocess
 import sys
 import warnings
@@ -13,6 +13,11 @@ import warnings
 import gnssrefl.gps as g
 import gnssrefl.read_snr_files as snr
 import gnssrefl.refraction as refr
+import gnssrefl.results_store as store
+import gnssrefl.timing as timing
+
+# json instructions already read in this session, see read_json_file
+_json_instructions = {}
 
 def gnssir_guts(station,year,doy, snr_type, extension,lsp):
     """
@@ -36,6 +41,14 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
 
     lsp : dictionary
         REQUIRES DESCRIPTION
+        the optional key stats ('json' or 'table') turns on the stage timing
+        and counters (see timing.StageStats)
+
+    Returns
+    -------
+    status : string
+        'analyzed' if the day was analyzed, 'nodata' if there was no SNR file,
+        or 'skipped' if the results already exist and nooverwrite is set
         
     """
 
@@ -49,6 +62,9 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
     plot_screen = lsp['plt_screen'] 
     onesat = lsp['onesat']; screenstats = lsp['screenstats']
     gzip = lsp['gzip']
+    fastLSP = lsp['fastLSP']
+    statsmode = lsp['stats']
+    st = timing.StageStats(statsmode is not None, station=station, year=year, doy=doy)
     # this had a bug in it.
     #print('Number of azimuths', len(azval))
     for i in range(0,len(azval),2):
@@ -68,7 +84,8 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
    # this defines the minimum number of points in an arc.  This depends entirely on the sampling
    # rate for the receiver, so you should not assume this value is relevant to your case.
     minNumPts = 20
-    p,T,irefr = set_refraction_params(station, dmjd, lsp)
+    with st.stage('refraction'):
+        p,T,irefr = set_refraction_params(station, dmjd, lsp)
 
 # only doing one day at a time for now - but have started defining the needed inputs for using it
     twoDays = False
@@ -81,20 +98,32 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
     #if (lsp['overwriteResults'] == False) & (resultExist == True):
     if (lsp['nooverwrite'] == True) & (resultExist == True):
         allGood = 0
+        status = 'skipped'
         print('>>>>> The result file already exists for this day and you have selected the do not overwrite option')
         #sys.exit()
     else:
         # uncompress here so you should not have to do it in read_snr_multiday ...
-        obsfile, obsfileCmp, snre = g.define_and_xz_snr(station,year,doy,snr_type) 
+        with st.stage('read_snr'):
+            obsfile, obsfileCmp, snre = g.define_and_xz_snr(station,year,doy,snr_type) 
 
-        allGood,sat,ele,azi,t,edot,s1,s2,s5,s6,s7,s8,snrE = snr.read_snr_multiday(obsfile,obsfile2,twoDays)
+            allGood,sat,ele,azi,t,edot,s1,s2,s5,s6,s7,s8,snrE = snr.read_snr_multiday(obsfile,obsfile2,twoDays)
+        status = 'analyzed' if allGood == 1 else 'nodata'
+        if allGood == 1:
+            st.count('files_read'); st.count('rows',len(sat))
         # added gzip option.  first input is xz compression
-        snr.compress_snr_files(lsp['wantCompression'], obsfile, obsfile2,twoDays,gzip) 
+        with st.stage('compress'):
+            snr.compress_snr_files(lsp['wantCompression'], obsfile, obsfile2,twoDays,gzip) 
     if (allGood == 1):
         print('Results will be written to:', fname)
 
-        ele=apply_refraction_corr(lsp,ele,p,T)
+        with st.stage('refraction'):
+            ele=apply_refraction_corr(lsp,ele,p,T)
+        # find the satellite arcs once, rather than for every frequency/satellite/azimuth
+        with st.stage('arc_index'):
+            arcindex = g.make_arc_index(sat,ele,azi,t)
         fout,frej = g.open_outputfile(station,year,doy,extension) 
+        # the results as written, for the results store
+        stored = []
 #  main loop a given list of frequencies
         total_arcs = 0
         ct = 0
@@ -119,55 +148,74 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
                 satlist = onesat
                 if (int(satlist[0]) < 100) and (f > 100):
                     print('wrong satellite name for this frequency')
-            for satNu in satlist:
-                #if screenstats: print('Satellite', satNu)
-                for a in range(naz):
-                    az1 = azval[(a*2)] ; az2 = azval[(a*2 + 1)]
-                    x,y,Nv,cf,UTCtime,avgAzim,avgEdot,Edot2,delT= g.window_data(s1,s2,s5,s6,s7,s8,sat,ele,azi,t,edot,f,az1,az2,e1,e2,satNu,lsp['polyV'],lsp['pele'],screenstats) 
+            # collect the arcs for this frequency, then do all their periodograms at once
+            arcs = []
+            with st.stage('window'):
+                for satNu in satlist:
+                    #if screenstats: print('Satellite', satNu)
+                    for a in range(naz):
+                        az1 = azval[(a*2)] ; az2 = azval[(a*2 + 1)]
+                        x,y,Nv,cf,UTCtime,avgAzim,avgEdot,Edot2,delT= g.window_data(s1,s2,s5,s6,s7,s8,sat,ele,azi,t,edot,f,az1,az2,e1,e2,satNu,lsp['polyV'],lsp['pele'],screenstats,arcindex) 
+                        if Nv > minNumPts:
+                            arcs.append([satNu,x,y,Nv,cf,UTCtime,avgAzim,Edot2,delT])
+            if len(arcs) > 0:
+                found_results = True
+            st.count('arcs_tried',len(arcs))
+            with st.stage('periodogram'):
+                px = g.lsp_grid(minH,maxH,lsp['desiredP'])
+                allAmp, allF, allNoise, allpz = g.lsp_batch([np.sin(arc[1]*np.pi/180)/arc[4] for arc in arcs], [arc[2] for arc in arcs], px, NReg, fast=fastLSP)
+            with st.stage('qc_output'):
+                for k in range(len(arcs)):
+                    satNu,x,y,Nv,cf,UTCtime,avgAzim,Edot2,delT = arcs[k]
                     MJD = g.getMJD(year,month,day, UTCtime)
-                    if Nv > minNumPts:
-                        found_results = True
-                        #print('length of x', len(x))
-                        maxF, maxAmp, eminObs, emaxObs,riseSet,px,pz= g.strip_compute(x,y,cf,maxH,lsp['desiredP'],lsp['polyV'],minH) 
-                        nij =   pz[(px > NReg[0]) & (px < NReg[1])]
-                        Noise = 0
-                        if (len(nij) > 0):
-                            Noise = np.mean(nij)
-                        iAzim = int(avgAzim)
-                        tooclose = False
-                        if abs(maxF - minH) < 0.10: #  peak too close to min value
-                            tooclose = True
-                        # KL added 2022 march 26
-                        if abs(maxF - maxH) < 0.10: #  peak too close to max value
-                            tooclose = True
-                        if (not tooclose) & (delT < lsp['delTmax']) & (eminObs < (e1 + ediff)) & (emaxObs > (e2 - ediff)) & (maxAmp > reqAmp[ct]) & (maxAmp/Noise > PkNoise):
-                            # request from a tide gauge person for Month, Day, Hour, Minute
-                            if lsp['mmdd']:
-                                ctime = g.nicerTime(UTCtime); ctime2 = ctime[0:2] + ' ' + ctime[3:5]
-                                fout.write(" {0:4.0f} {1:3.0f} {2:6.3f} {3:3.0f} {4:6.3f} {5:6.2f} {6:6.2f} {7:6.2f} {8:6.2f} {9:4.0f} {10:3.0f} {11:2.0f} {12:8.5f} {13:6.2f} {14:7.2f} {15:12.6f} {16:1.0f} {17:2.0f} {18:2.0f} {19:5s} \n".format(year,doy,maxF,satNu, UTCtime, avgAzim,maxAmp,eminObs,emaxObs,Nv, f,riseSet, Edot2, maxAmp/Noise, delT, MJD,irefr,month,day,ctime2)) 
-                            else:
-                                fout.write(" {0:4.0f} {1:3.0f} {2:6.3f} {3:3.0f} {4:6.3f} {5:6.2f} {6:6.2f} {7:6.2f} {8:6.2f} {9:4.0f} {10:3.0f} {11:2.0f} {12:8.5f} {13:6.2f} {14:7.2f} {15:12.6f} {16:1.0f} \n".format(year,doy,maxF,satNu, UTCtime, avgAzim,maxAmp,eminObs,emaxObs,Nv, f,riseSet, Edot2, maxAmp/Noise, delT, MJD,irefr)) 
-                            gj +=1
-                            if screenstats:
-                                T = g.nicerTime(UTCtime)
-                                print('SUCCESS Azimuth {0:3.0f} Sat {1:3.0f} RH {2:7.3f} m PkNoise {3:4.1f} Amp {4:4.1f} Fr{5:3.0f} UTC {6:5s} DT {7:3.0f} '.format(iAzim,satNu,maxF,maxAmp/Noise,maxAmp, f,T,round(delT)))
-                            if plot_screen:
-                                failed = False
-                                local_update_plot(x,y,px,pz,ax1,ax2,failed)
+                    maxF = allF[k]; maxAmp = allAmp[k]; Noise = allNoise[k]; pz = allpz[k]
+                    eminObs = min(x); emaxObs = max(x)
+                    if x[0] > x[1]:
+                        riseSet = -1
+                    else:
+                        riseSet = 1
+                    iAzim = int(avgAzim)
+                    tooclose = False
+                    if abs(maxF - minH) < 0.10: #  peak too close to min value
+                        tooclose = True
+                    # KL added 2022 march 26
+                    if abs(maxF - maxH) < 0.10: #  peak too close to max value
+                        tooclose = True
+                    if (not tooclose) & (delT < lsp['delTmax']) & (eminObs < (e1 + ediff)) & (emaxObs > (e2 - ediff)) & (maxAmp > reqAmp[ct]) & (maxAmp/Noise > PkNoise):
+                        # request from a tide gauge person for Month, Day, Hour, Minute
+                        if lsp['mmdd']:
+                            ctime = g.nicerTime(UTCtime); ctime2 = ctime[0:2] + ' ' + ctime[3:5]
+                            line = " {0:4.0f} {1:3.0f} {2:6.3f} {3:3.0f} {4:6.3f} {5:6.2f} {6:6.2f} {7:6.2f} {8:6.2f} {9:4.0f} {10:3.0f} {11:2.0f} {12:8.5f} {13:6.2f} {14:7.2f} {15:12.6f} {16:1.0f} {17:2.0f} {18:2.0f} {19:5s} \n".format(year,doy,maxF,satNu, UTCtime, avgAzim,maxAmp,eminObs,emaxObs,Nv, f,riseSet, Edot2, maxAmp/Noise, delT, MJD,irefr,month,day,ctime2)
                         else:
-                            rj +=1
-                            if screenstats:
-                                print('FAILED QC for Azimuth {0:.1f} Satellite {1:2.0f} UTC {2:5.2f}'.format( iAzim,satNu,UTCtime))
-                                g.write_QC_fails(delT,lsp['delTmax'],eminObs,emaxObs,e1,e2,ediff,maxAmp, Noise,PkNoise,reqAmp[ct],tooclose)
-                            if plot_screen:
-                                failed = True
-                                local_update_plot(x,y,px,pz,ax1,ax2,failed)
+                            line = " {0:4.0f} {1:3.0f} {2:6.3f} {3:3.0f} {4:6.3f} {5:6.2f} {6:6.2f} {7:6.2f} {8:6.2f} {9:4.0f} {10:3.0f} {11:2.0f} {12:8.5f} {13:6.2f} {14:7.2f} {15:12.6f} {16:1.0f} \n".format(year,doy,maxF,satNu, UTCtime, avgAzim,maxAmp,eminObs,emaxObs,Nv, f,riseSet, Edot2, maxAmp/Noise, delT, MJD,irefr)
+                        fout.write(line)
+                        # same (rounded) values as the file
+                        stored.append(line.split()[0:store.NCOLS])
+                        gj +=1
+                        if screenstats:
+                            T = g.nicerTime(UTCtime)
+                            print('SUCCESS Azimuth {0:3.0f} Sat {1:3.0f} RH {2:7.3f} m PkNoise {3:4.1f} Amp {4:4.1f} Fr{5:3.0f} UTC {6:5s} DT {7:3.0f} '.format(iAzim,satNu,maxF,maxAmp/Noise,maxAmp, f,T,round(delT)))
+                        if plot_screen:
+                            failed = False
+                            local_update_plot(x,y,px,pz,ax1,ax2,failed)
+                    else:
+                        rj +=1
+                        if st.enabled:
+                            for reason in g.QC_fail_list(delT,lsp['delTmax'],eminObs,emaxObs,e1,e2,ediff,maxAmp, Noise,PkNoise,reqAmp[ct],tooclose):
+                                st.count('rejected_' + reason)
+                        if screenstats:
+                            print('FAILED QC for Azimuth {0:.1f} Satellite {1:2.0f} UTC {2:5.2f}'.format( iAzim,satNu,UTCtime))
+                            g.write_QC_fails(delT,lsp['delTmax'],eminObs,emaxObs,e1,e2,ediff,maxAmp, Noise,PkNoise,reqAmp[ct],tooclose)
+                        if plot_screen:
+                            failed = True
+                            local_update_plot(x,y,px,pz,ax1,ax2,failed)
 
             if screenstats:
                 print('=================================================================================')
                 print('     Frequency ', f, ' good arcs:', gj, ' rejected arcs:', rj )
                 print('=================================================================================')
             total_arcs = gj + total_arcs
+            st.count('arcs_accepted',gj); st.count('arcs_rejected',rj)
 # close the output files
             ct += 1
             #'Yes' if fruit == 'Apple' else 'No'
@@ -187,11 +235,22 @@ def gnssir_guts(station,year,doy, snr_type, extension,lsp):
                     print('no data found for this frequency: ',f)
                     #plt.close()
 
-        fout.close() ; # these are the LSP results written to text file 
+        with st.stage('qc_output'):
+            fout.close() ; # these are the LSP results written to text file 
+            os.replace(fout.name, fname)
+            try:
+                store.add_day(station, extension, year, doy, fname, np.array(stored, dtype=float))
+            except Exception as e:
+                # daily_avg and subdaily will pick the day up from the file instead
+                print('could not add this day to the results store', e)
         # try moving this
         if found_results and plot_screen:
             plot2screen(station, f, ax1, ax2,lsp['pltname']) 
 
+    st.emit(statsmode, 'logs/gnssir_stats.jsonl')
+
+    return status
+
 
 def set_refraction_params(station, dmjd,lsp):
     """
@@ -291,13 +350,11 @@ def read_json_file(station, extension):
     instructions = str(os.environ['REFL_CODE']) + '/input/' + station + '.json'
     if os.path.isfile(instructions_ext):
         #print('using specific instructions for this extension')
-        with open(instructions_ext) as f:
-            lsp = json.load(f)
+        lsp = load_json_instructions(instructions_ext)
     else:
         #print('will use the default instruction file')
         if os.path.isfile(instructions):
-            with open(instructions) as f:
-                lsp = json.load(f)
+            lsp = load_json_instructions(instructions)
         else:
             print('The json instruction file does not exist: ', instructions)
             print('Please make with make_json_input and run this code again.')
@@ -306,3 +363,26 @@ def read_json_file(station, extension):
     return lsp
 
 
+def load_json_instructions(jsonfile):
+    """
+    reads a json instruction file. the contents are kept for the rest of the session
+    (e.g. a gnssrefl_worker) and only read again if the file changes. the caller gets
+    its own copy, since the command line overrides are written into it
+
+    Parameters
+    ----------
+    jsonfile : string
+        name of the json file
+
+    Returns
+    -------
+    lsp : dictionary
+    """
+    path = os.path.abspath(jsonfile)
+    mtime = os.stat(path).st_mtime_ns
+    if (path not in _json_instructions) or (_json_instructions[path][0] != mtime):
+        with open(path) as f:
+            _json_instructions[path] = (mtime, json.load(f))
+    return copy.deepcopy(_json_instructions[path][1])
+
+
@@ -5,16 +5,25 @@
 
 
 import argparse
+import contextlib
+import io
+import multiprocessing
 import os
 import subprocess
 import sys
-import wget
+import traceback
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 
 import gnssrefl.gnssir as guts
 import gnssrefl.gps as g
+import gnssrefl.refraction as refr
 
 from gnssrefl.utils import str2bool
 
+# REFL_CODE directories where the refraction pickle file is known to exist
+_pickle_checked = set()
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
@@ -42,11 +51,14 @@ def parse_arguments():
     parser.add_argument("-e1", default=None, type=float, help="override min elev angle")
     parser.add_argument("-e2", default=None, type=float, help="override max elev angle")
     parser.add_argument("-mmdd", default=None, type=str, help="boolean, add columns for month,day,hour,minute")
+    parser.add_argument("-fastlsp", default=None, type=str, help="boolean, fast approximate periodogram with exact peak refinement")
+    parser.add_argument("-par", default=None, type=int, help="number of processes, days are analyzed in parallel")
+    parser.add_argument("-stats", default=None, type=str, choices=['json', 'table'], help="time the stages of each day: json (to logs/gnssir_stats.jsonl) or table")
 
     args = parser.parse_args().__dict__
 
     # convert all expected boolean inputs from strings to booleans
-    boolean_args = ['plt', 'screenstats', 'nooverwrite', 'compress', 'screenstats', 'mmdd','gzip']
+    boolean_args = ['plt', 'screenstats', 'nooverwrite', 'compress', 'screenstats', 'mmdd','gzip','fastlsp']
     args = str2bool(args, boolean_args)
 
     # only return a dictionary of arguments that were added from the user - all other defaults will be set in code below
@@ -57,7 +69,8 @@ def gnssir(station: str, year: int, doy: int, snr: int = 66, plt: bool = False,
            ampl: float = None, sat: int = None, doy_end: int = None, year_end: int = None,
            azim1: int = 0, azim2: int = 360, nooverwrite: bool = False, extension: str = '',
            compress: bool = False, screenstats: bool = False, delTmax: int = None,
-           e1: float = None, e2: float = None, mmdd: bool = False, gzip: bool = False):
+           e1: float = None, e2: float = None, mmdd: bool = False, gzip: bool = False,
+           fastlsp: bool = False, par: int = None, stats: str = None):
     """
         This is the main driver for estimating Reflector Height using GNSS Interferometric Reflectometry.
 
@@ -167,6 +180,20 @@ def gnssir(station: str, year: int, doy: int, snr: int = 66, plt: bool = False,
         gzip : boolean, optional
             gzip compress SNR files after use.
             default is False.
+        fastlsp : boolean, optional
+            compute a coarse periodogram with an FFT and then the exact one
+            only around its biggest peaks. Much faster for high-rate data.
+            Reflector heights and amplitudes are the same, the noise is approximate.
+            default is False.
+        par : integer, optional
+            number of processes. the days are shared out to them and the screen output
+            of each day is printed in order when it is done. plots are turned off.
+            default is None (one day after another in this process)
+        stats : string, optional
+            records the time spent reading, windowing, computing periodograms etc,
+            and counts of rows and of accepted and rejected arcs, for each day.
+            json appends one line per day to logs/gnssir_stats.jsonl, table prints them.
+            default is None (nothing is recorded)
 
     """
 
@@ -251,29 +278,17 @@ def gnssir(station: str, year: int, doy: int, snr: int = 66, plt: bool = False,
     lsp['mmdd'] = add_mmddhhss
     # added 2022apr15
     lsp['gzip'] = gzip
+    lsp['fastLSP'] = fastlsp
+    lsp['stats'] = stats
 
-    xdir = str(os.environ['REFL_CODE'])
-    picklefile = 'gpt_1wA.pickle'
-    pname = xdir + '/input/' + picklefile
-
-    if os.path.isfile(pname):
-        print('refraction file exists')
-    else:
-        local_copy = 'gnssrefl/' + picklefile
-        if os.path.isfile(local_copy):
-            print('found local copy of refraction file')
-            subprocess.call(['cp', '-f', local_copy, xdir + '/input/'])
-        else:
-            print('download and move refraction file')
-            url='https://github.com/kristinemlarson/gnssrefl/raw/master/gnssrefl/gpt_1wA.pickle'
-            wget.download(url, picklefile)
-            subprocess.call(['mv', '-f', picklefile, xdir + '/input/'])
+    check_refraction_pickle(str(os.environ['REFL_CODE']))
 
     args = {'station': station.lower(), 'year': year, 'doy': doy, 'snr_type': snr, 'extension': extension, 'lsp': lsp}
 
     year_list = list(range(year_st, year_end+1))
     # changed to better describe year and doy start/end
 
+    jobs = []
     for year in year_list:
         # edits made 2021Sep10 by Makan karegar
         if year != year_end:
@@ -287,10 +302,133 @@ def gnssir(station: str, year: int, doy: int, snr: int = 66, plt: bool = False,
         else:
             doy_list = list(range(1, doy_en+1))
 
-        args['year'] = year
-        for doy in doy_list:
-            args['doy'] = doy
+        for d in doy_list:
+            jobs.append((year, d))
+
+    if (par is None) or (par < 2) or (len(jobs) < 2):
+        for year, d in jobs:
+            args['year'] = year
+            args['doy'] = d
             guts.gnssir_guts(**args)
+    else:
+        gnssir_parallel(args, jobs, par)
+
+
+def check_refraction_pickle(xdir):
+    """
+    makes sure the refraction grid file (gpt_1wA.pickle) is in xdir/input,
+    copying or downloading it if it is not. this is only done once per session,
+    so jobs run by a gnssrefl_worker do not check again
+
+    Parameters
+    ----------
+    xdir : string
+        REFL_CODE directory
+    """
+    if xdir in _pickle_checked:
+        return
+    picklefile = 'gpt_1wA.pickle'
+    pname = xdir + '/input/' + picklefile
+
+    if os.path.isfile(pname):
+        print('refraction file exists')
+    else:
+        local_copy = 'gnssrefl/' + picklefile
+        if os.path.isfile(local_copy):
+            print('found local copy of refraction file')
+            subprocess.call(['cp', '-f', local_copy, xdir + '/input/'])
+        else:
+            print('download and move refraction file')
+            url='https://github.com/kristinemlarson/gnssrefl/raw/master/gnssrefl/gpt_1wA.pickle'
+            wget.download(url, picklefile)
+            subprocess.call(['mv', '-f', picklefile, xdir + '/input/'])
+    if os.path.isfile(pname):
+        _pickle_checked.add(xdir)
+
+
+def gnssir_one_day(args):
+    """
+    runs gnssir_guts for one day, with the screen output saved rather than printed.
+    this is what each process does in the parallel mode
+
+    Parameters
+    ----------
+    args : dictionary
+        inputs to gnssir_guts
+
+    Returns
+    -------
+    year : integer
+        year
+    doy : integer
+        day of year
+    status : string
+        what gnssir_guts returned ('analyzed', 'nodata' or 'skipped'),
+        or 'failed' if it exited or raised an error
+    screen : string
+        what gnssir_guts printed (and the error, if there was one)
+    """
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        try:
+            status = guts.gnssir_guts(**args)
+        except SystemExit:
+            status = 'failed'
+            print('gnssir_guts exited for this day')
+        except Exception:
+            status = 'failed'
+            traceback.print_exc(file=buf)
+    return args['year'], args['doy'], status, buf.getvalue()
+
+
+def gnssir_parallel(args, jobs, par):
+    """
+    runs gnssir_guts for a list of days using a pool of processes.
+    the screen output of the days is printed in the order of the list,
+    followed by a count of the days that were analyzed, had no SNR data, were skipped
+    because the results already exist, or failed, and a list of the days in the last three
+
+    Parameters
+    ----------
+    args : dictionary
+        inputs to gnssir_guts, other than year and doy
+    jobs : list of (year, doy) tuples
+        days to analyze
+    par : integer
+        number of processes
+    """
+    lsp = args['lsp']
+    station = args['station']
+    if lsp['plt_screen']:
+        print('Plots are not made in parallel mode')
+        lsp['plt_screen'] = False
+    # make the shared directories and files once, so the processes do not all try to make them at once
+    for year in sorted(set([j[0] for j in jobs])):
+        g.make_nav_dirs(year)
+        g.result_directories(station, year, args['extension'])
+        g.LSPresult_name(station, year, 1, args['extension'])
+    if lsp['refraction']:
+        refr.readWrite_gpt2_1w(os.environ['REFL_CODE'], station, lsp['lat'], lsp['lon'])
+
+    alljobs = []
+    for year, d in jobs:
+        a = dict(args)
+        a['year'] = year; a['doy'] = d
+        alljobs.append(a)
+
+    print('Analyzing', len(alljobs), 'days with', par, 'processes')
+    days = {'analyzed': [], 'nodata': [], 'skipped': [], 'failed': []}
+    with multiprocessing.Pool(par) as pool:
+        for year, d, status, screen in pool.imap(gnssir_one_day, alljobs):
+            sys.stdout.write(screen)
+            sys.stdout.flush()
+            days[status].append((year, d))
+
+    print('Days analyzed: ', len(days['analyzed']), ' Days with no SNR data: ', len(days['nodata']),
+          ' Days skipped (results exist): ', len(days['skipped']), ' Days that failed: ', len(days['failed']))
+    for status in ['nodata', 'skipped', 'failed']:
+        for year, d in days[status]:
+            print('  ' + status + ': ', year, d)
 
 
 def main():
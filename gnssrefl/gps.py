@@ -7,7 +7,6 @@ import math
 import os
 import pickle
 import re
-import requests
 import subprocess
 import sys
 import sqlite3
@@ -16,16 +15,21 @@ import time
 from ftplib import FTP #import FTP commands from python's built-in ftp library
 from ftplib import FTP_TLS
 
-
-import scipy.signal as spectral
-from scipy.interpolate import interp1d
-
-import matplotlib.pyplot as plt
 import numpy as np
-import wget
 from numpy import array
 
+from gnssrefl.lazy import lazy_import
+
+# these are only imported when something uses them, see lazy.py
+spectral = lazy_import('scipy.signal')
+interpolate = lazy_import('scipy.interpolate')
+plt = lazy_import('matplotlib.pyplot')
+requests = lazy_import('requests')
+wget = lazy_import('wget')
+
+import gnssrefl.hatanaka as hatanaka
 import gnssrefl.read_snr_files as snr
+from gnssrefl.read_snr_files import snr_source
 import gnssrefl.karnak_libraries as k
 
 # for future ref
@@ -215,7 +219,8 @@ def define_filename(station,year,doy,snr):
 def define_and_xz_snr(station,year,doy,snr):
     """
     finds and checks for existence of a SNR file
-    uncompresses if that is needed (xz or gz)
+    xz or gz files are no longer uncompressed, the SNR readers
+    read them as they are (see read_snr_files.load_snr)
 
     Parameters
     ----------
@@ -250,20 +255,8 @@ def define_and_xz_snr(station,year,doy,snr):
     f= station + cdoy + '0.' + cyy + '.snr' + str(snr)
     fname = xdir + '/' + cyyyy + '/snr/' + station + '/' + f
     fname2 = xdir + '/' + cyyyy  + '/snr/' + station + '/' + f  + '.xz'
-    fname3 = xdir + '/' + cyyyy  + '/snr/' + station + '/' + f  + '.gz'
-    snre = False
-    # add gzip
-    if os.path.isfile(fname):
-        snre = True
-    else:
-        if os.path.isfile(fname2):
-            subprocess.call(['unxz', fname2])
-        else:
-            if os.path.isfile(fname3):
-                subprocess.call(['gunzip', fname3])
-        # make sure the uncompression worked
-        if os.path.isfile(fname):
-            snre = True
+    # text, xz, gzip or binary SNR file
+    snre = (snr_source(fname) != '')
 
 #   return fname2 but only for backwards compatibility
     return fname, fname2, snre 
@@ -528,6 +521,41 @@ def elev_angle(up, RecSat):
     angle = np.pi/2.0 - ang
     return angle
 
+def elev_azim_angles(up, East, North, RecSat):
+    """
+    elevation and azimuth angles for many receiver-satellite vectors at once.
+    same as elev_angle and azimuth_angle, but in degrees for both
+
+    Parameters
+    -------------------
+    up : 3 vector float
+        unit vector in the up direction
+
+    East : 3 vector float
+        unit vector in the east direction
+
+    North : 3 vector float
+        unit vector in the north direction
+
+    RecSat : numpy array (N x 3)
+        Cartesian vectors pointing from receiver to satellite in meters
+
+    returns
+    --------------
+    eleA : numpy array of floats
+        elevation angles in degrees
+
+    azimA : numpy array of floats
+        azimuth angles in degrees, 0 to 360
+
+    """
+    RecSat = np.atleast_2d(RecSat)
+    dist = np.sqrt(np.sum(RecSat**2, axis=1))
+    eleA = (np.pi/2.0 - np.arccos(np.dot(RecSat, up)/dist))*180/np.pi
+    azimA = np.arctan2(np.dot(RecSat, East), np.dot(RecSat, North))*180/np.pi
+    azimA[azimA < 0] += 360
+    return eleA, azimA
+
 def sp3_interpolator(t, tow, x0, y0, z0, clock0):
     """
     author: originally from ryan hardy  
@@ -569,7 +597,7 @@ def sp3_interpolator(t, tow, x0, y0, z0, clock0):
     x = np.zeros(len(t))
     y = np.zeros(len(t))
     z = np.zeros(len(t))
-    clockf = interp1d(tow, clock0, bounds_error=False, fill_value=clock0[-1])
+    clockf = interpolate.interp1d(tow, clock0, bounds_error=False, fill_value=clock0[-1])
     clock = clockf(t)
     # looks like it computes it for a number of t values?
     for i in range(len(t)):
@@ -1186,11 +1214,21 @@ def read_sp3(file):
 		
     return week, tow, prn, x, y, z, clock
 
-def myreadnav(file):
+def myreadnav(file, cache=True):
     """
     input is navfile name
     output is complicated - broadcast ephemeris blocks
+
+    cache : bool, optional
+        if True (default), the ephemerides are saved in binary form next to the
+        nav file (file + '.npz') and read from there the next time,
+        as long as the nav file has not changed since
     """
+    cachefile = file + '.npz'
+    if cache and os.path.isfile(file):
+        ephem = _read_orbitcache(file, cachefile, 'ephem')
+        if ephem is not None:
+            return ephem
 # input is the nav file
     try:
         f = open(file, 'r')
@@ -1246,6 +1284,8 @@ def myreadnav(file):
     except:
         #print('This ephemeris file does not exist',file)
         ephem = []
+    if cache and (len(ephem) > 0):
+        _write_orbitcache(file, cachefile, 'ephem', ephem)
     return ephem
 def myfindephem(week, sweek, ephem, prn):
     """
@@ -1279,6 +1319,84 @@ def myfindephem(week, sweek, ephem, prn):
   
     return closest_ephem
 
+class EphemerisIndex:
+    """
+    broadcast ephemeris blocks organized by satellite, so that the closest
+    ephemeris for many epochs can be found without scanning the whole table.
+    build it once per nav file and reuse it for all epochs and satellites.
+
+    the choice is the same as in myfindephem: the latest ephemeris (week and Toe)
+    at or before the epoch; if there is none, the first one in the file for that PRN
+
+    Parameters
+    ----------
+    ephem : numpy array
+        ephemerides as returned by myreadnav
+
+    healthy : bool, optional
+        if True, ephemerides with a nonzero health flag are not used.
+        default is False, i.e. all are used, as in myfindephem
+    """
+    def __init__(self, ephem, healthy=False):
+        ephem = np.asarray(ephem)
+        if len(ephem) == 0:
+            ephem = np.empty(shape=[0, 32])
+        if healthy:
+            ephem = ephem[ephem[:, 27] == 0]
+        self.ephem = ephem
+        self.blocks = {}
+        self.teph = {}
+        self.first = {}
+        teph = ephem[:, 24]*86400*7 + ephem[:, 14]
+        for prn in np.unique(ephem[:, 0]).astype(int):
+            ii = np.nonzero(ephem[:, 0] == prn)[0]
+            # stable sort keeps the file order for duplicate Toe values
+            order = np.argsort(teph[ii], kind='stable')
+            self.blocks[prn] = ephem[ii[order]]
+            self.teph[prn] = teph[ii[order]]
+            self.first[prn] = ephem[ii[0]]
+        self.prns = list(self.blocks.keys())
+
+    def closest(self, prn, week, sweek):
+        """
+        closest ephemeris blocks for one satellite
+
+        Parameters
+        ----------
+        prn : integer
+            satellite number
+
+        week : integer or numpy array of integers
+            GPS week
+
+        sweek : float or numpy array of floats
+            GPS seconds of the week
+
+        Returns
+        -------
+        closest_ephem : numpy array
+            one ephemeris block (32 values) for a single epoch,
+            or one block per epoch (epochs x 32).
+            empty if there is no ephemeris for that PRN number
+        """
+        scalar = np.ndim(sweek) == 0
+        if prn not in self.blocks:
+            if scalar:
+                return []
+            return np.empty(shape=[0, 32])
+        t = np.atleast_1d(np.asarray(week)*86400*7 + np.asarray(sweek))
+        tsort = self.teph[prn]
+        j = np.searchsorted(tsort, t, side='right') - 1
+        before = j >= 0
+        # first of the blocks that share that Toe
+        j[before] = np.searchsorted(tsort, tsort[j[before]], side='left')
+        closest_ephem = np.empty(shape=[len(t), 32])
+        closest_ephem[before] = self.blocks[prn][j[before]]
+        closest_ephem[~before] = self.first[prn]
+        if scalar:
+            return closest_ephem[0]
+        return closest_ephem
+
 def findConstell(cc):
     """
     cc : string  is one character (from rinex satellite line)
@@ -1603,7 +1721,7 @@ def get_ofac_hifac(elevAngles, cf, maxH, desiredPrec):
 
     return ofac, hifac
 
-def strip_compute(x,y,cf,maxH,desiredP,pfitV,minH):
+def strip_compute(x,y,cf,maxH,desiredP,pfitV,minH,fast=False):
     """
     strips snr data
     Parameters
@@ -1628,6 +1746,9 @@ def strip_compute(x,y,cf,maxH,desiredP,pfitV,minH):
     minH : float
         minimum reflector height in meters
 
+    fast : boolean, optional
+        use the fast approximate periodogram (see lsp_batch). default is False
+
     returns 
     ----------
     maxF : float
@@ -1645,7 +1766,6 @@ def strip_compute(x,y,cf,maxH,desiredP,pfitV,minH):
     pz : numpy array
         periodogram, y-axis, volts/volts 
     """
-    ofac,hifac = get_ofac_hifac(x,cf,maxH,desiredP)
 #   min and max observed elevation angles
     eminObs = min(x); emaxObs = max(x)
     if x[0] > x[1]:
@@ -1653,45 +1773,332 @@ def strip_compute(x,y,cf,maxH,desiredP,pfitV,minH):
     else:
         riseSet = 1
 
-#   change so everything is rising, i.e. elevation angle is increasing
-    ij = np.argsort(x)
-    x = x[ij]
-    y = y[ij]
-
-    x = np.sin(x*np.pi/180)
-#   polynomial fit done before
-
-#   scale by wavelength
-    x=x/cf
-#    y=newy
-#   get frequency spacing
-    px = freq_out(x,ofac,hifac) 
-#   compute spectrum using scipy
-    scipy_LSP = spectral.lombscargle(x, y, 2*np.pi*px)
-
-#   find biggest peak
-#   scaling required to get amplitude spectrum
-    pz = 2*np.sqrt(scipy_LSP/len(x))
-#   now window
-#    ij = np.argmax(px > minH)
-#    new_px = px[ij]
-    new_pz = pz[(px > minH)]
-    new_px = px[(px > minH)]
-    px = new_px
-    pz = new_pz
-#   find the max
+#   scale by wavelength. the periodogram does not care about the order of the data
+    x = np.sin(x*np.pi/180)/cf
+#   periodogram on the reflector height grid above minH
+    px = lsp_grid(minH,maxH,desiredP)
+    allAmp, allF, allNoise, pz = lsp_batch([x],[y],px,fast=fast)
+    pz = pz[0]
 #   was causing it to crash.  check that pz has anything in it
     if len(pz) == 0:
         print('invalid LSP, no data returned. If this is pervasive, check your inputs')
         maxF = 0; maxAmp = 0
     else:
-        ij = np.argmax(pz)
-        maxF = px[ij]
-        maxAmp = np.max(pz)
+        maxF = allF[0]
+        maxAmp = allAmp[0]
 
     return maxF, maxAmp, eminObs, emaxObs,riseSet, px,pz
 
-def window_data(s1,s2,s5,s6,s7,s8, sat,ele,azi,seconds,edot,f,az1,az2,e1,e2,satNu,pfitV,pele,screenstats):
+def lsp_grid(minH,maxH,desiredP):
+    """
+    reflector height grid shared by all the arcs of a frequency:
+    exactly round(maxH/desiredP) evenly spaced heights from desiredP to maxH,
+    of which only those above minH are kept.
+    freq_out truncated its per-arc point count from ofac and hifac instead,
+    so the old grid of an arc can have one point fewer (a slightly different
+    spacing), and peak heights can differ by a fraction of desiredP
+
+    Parameters
+    ----------
+    minH : float
+        minimum reflector height in meters
+    maxH : float
+        maximum reflector height in meters
+    desiredP : float
+        precision of Lomb Scargle in meters
+
+    Returns
+    -------
+    px : numpy array
+        reflector heights (meters)
+    """
+    nout = int(round(maxH/desiredP))
+    px = np.linspace(desiredP, maxH, nout)
+    px = px[px > minH]
+    return px
+
+def lsp_batch(xlist,ylist,px,NReg=None,chunk=4000000,fast=False):
+    """
+    Lomb Scargle periodograms (same as scipy.signal.lombscargle)
+    for many arcs on one reflector height grid.
+
+    the arcs are padded to the same length and done together, in chunks
+    of at most chunk (arcs x points x heights) values so memory stays bounded.
+
+    with fast=True each arc first gets a coarse periodogram from lsp_fast
+    (Press and Rybicki extirpolation and an FFT). the periodogram is then computed
+    exactly on the grid heights near the biggest coarse peaks, so the peak height
+    and amplitude are the exact ones. the other heights are interpolated from the
+    coarse periodogram, which is what the noise is computed from.
+
+    Parameters
+    ----------
+    xlist : list of numpy arrays
+        sine(elevation angle)/cf for each arc
+    ylist : list of numpy arrays
+        SNR data (volts/volts), DC removed, for each arc
+    px : numpy array
+        reflector heights (meters), e.g. from lsp_grid
+    NReg : list of floats, optional
+        reflector height region (meters) used for the noise.
+        default is the whole grid
+    chunk : integer, optional
+        maximum size of the temporary arrays
+    fast : boolean, optional
+        coarse periodogram and exact refinement of the peaks. default is False
+
+    Returns
+    -------
+    maxAmp : numpy array
+        periodogram peak amplitude for each arc
+    maxF : numpy array
+        reflector height (meters) of the peak for each arc
+    Noise : numpy array
+        mean periodogram amplitude in the noise region for each arc,
+        zero if the region is empty
+    pz : numpy array
+        periodogram amplitudes, one row per arc (volts/volts)
+    """
+    narcs = len(xlist); nf = len(px)
+    pz = np.zeros((narcs,nf))
+    maxAmp = np.zeros(narcs); maxF = np.zeros(narcs); Noise = np.zeros(narcs)
+    if (narcs == 0) or (nf == 0):
+        return maxAmp, maxF, Noise, pz
+
+    if fast:
+        for i in range(narcs):
+            pz[i], maxAmp[i], maxF[i] = lsp_refine(xlist[i],ylist[i],px,chunk)
+        if NReg is None:
+            Noise = np.mean(pz,axis=1)
+        else:
+            nij = (px > NReg[0]) & (px < NReg[1])
+            if np.any(nij):
+                Noise = np.mean(pz[:,nij],axis=1)
+        return maxAmp, maxF, Noise, pz
+
+    npts = np.array([len(x) for x in xlist])
+    L = max(1,np.max(npts))
+    X = np.zeros((narcs,L)); Y = np.zeros((narcs,L)); M = np.zeros((narcs,L))
+    for i in range(narcs):
+        X[i,0:npts[i]] = xlist[i]; Y[i,0:npts[i]] = ylist[i]; M[i,0:npts[i]] = 1
+    w = 2*np.pi*px
+
+    # heights per block, and then arcs per block
+    nfb = max(1, min(nf, chunk//L))
+    nab = max(1, chunk//(L*nfb))
+    for i0 in range(0,narcs,nab):
+        i1 = min(narcs,i0+nab)
+        for j0 in range(0,nf,nfb):
+            j1 = min(nf,j0+nfb)
+            wx = X[i0:i1,:,None]*w[None,None,j0:j1]
+            c = np.cos(wx); s = np.sin(wx)
+            m = M[i0:i1,:,None]
+            xc = np.einsum('al,alf->af',Y[i0:i1],c)
+            xs = np.einsum('al,alf->af',Y[i0:i1],s)
+            cc = np.sum(m*c*c,axis=1)
+            ss = np.sum(m*s*s,axis=1)
+            cs = np.sum(m*c*s,axis=1)
+            tau = np.arctan2(2*cs, cc-ss)/(2*w[j0:j1])
+            c_tau = np.cos(w[j0:j1]*tau); s_tau = np.sin(w[j0:j1]*tau)
+            c_tau2 = c_tau*c_tau; s_tau2 = s_tau*s_tau; cs_tau = 2*c_tau*s_tau
+            P = 0.5*(((c_tau*xc + s_tau*xs)**2)/(c_tau2*cc + cs_tau*cs + s_tau2*ss) + \
+                    ((c_tau*xs - s_tau*xc)**2)/(c_tau2*ss - cs_tau*cs + s_tau2*cc))
+            # scaling required to get amplitude spectrum
+            pz[i0:i1,j0:j1] = 2*np.sqrt(P/npts[i0:i1,None])
+
+    ij = np.argmax(pz,axis=1)
+    maxAmp = pz[np.arange(narcs),ij]
+    maxF = px[ij]
+    if NReg is None:
+        Noise = np.mean(pz,axis=1)
+    else:
+        nij = (px > NReg[0]) & (px < NReg[1])
+        if np.any(nij):
+            Noise = np.mean(pz[:,nij],axis=1)
+    return maxAmp, maxF, Noise, pz
+
+def lsp_refine(x,y,px,chunk=4000000,ofac=4,npeaks=3):
+    """
+    periodogram of one arc on the grid px: a coarse one from lsp_fast,
+    and the exact one (lsp_batch) on the grid heights within one coarse
+    step of the npeaks biggest coarse peaks.
+    if the coarse grid would not be much coarser than px, it is all done exactly
+
+    Parameters
+    ----------
+    x : numpy array
+        sine(elevation angle)/cf
+    y : numpy array
+        SNR data (volts/volts), DC removed
+    px : numpy array
+        reflector heights (meters), evenly spaced
+    chunk : integer, optional
+        maximum size of the temporary arrays for lsp_batch
+    ofac : integer, optional
+        coarse grid points per periodogram peak width (1/span of x). default is 4
+    npeaks : integer, optional
+        number of coarse peaks that are refined. default is 3
+
+    Returns
+    -------
+    pz : numpy array
+        periodogram amplitudes (volts/volts)
+    maxAmp : float
+        periodogram peak amplitude
+    maxF : float
+        reflector height (meters) of the peak
+    """
+    W = np.max(x) - np.min(x)
+    dP = px[1] - px[0] if (len(px) > 1) else 0
+    dC = 1/(W*ofac)
+    if (len(px) < 2) or (dC < 4*dP):
+        maxA, allF, noise, pz = lsp_batch([x],[y],px,chunk=chunk)
+        return pz[0], maxA[0], allF[0]
+
+    nc = int(np.ceil((px[-1]-px[0])/dC)) + 1
+    pc = px[0] + dC*np.arange(nc)
+    zc = lsp_fast(x,y,px[0],dC,nc)
+    # biggest local maxima of the coarse periodogram (the ends count too)
+    zpad = np.concatenate(([-1],zc,[-1]))
+    peaks = np.nonzero((zpad[1:-1] >= zpad[0:-2]) & (zpad[1:-1] >= zpad[2:]))[0]
+    peaks = peaks[np.argsort(zc[peaks])[::-1][0:npeaks]]
+    use = np.zeros(len(px),dtype=bool)
+    for k in peaks:
+        use = use | (np.abs(px - pc[k]) <= dC)
+
+    pz = np.interp(px, pc, zc)
+    maxA, allF, noise, pexact = lsp_batch([x],[y],px[use],chunk=chunk)
+    pz[use] = pexact[0]
+    return pz, maxA[0], allF[0]
+
+def lsp_fast(x,y,f0,df,nf,oversampling=8,M=6):
+    """
+    approximate Lomb Scargle periodogram on an evenly spaced grid,
+    from the trigonometric sums of Press and Rybicki (1989):
+    the data are extirpolated onto a regular grid and the sums come from an FFT.
+    same normalization as lsp_batch
+
+    Parameters
+    ----------
+    x : numpy array
+        sine(elevation angle)/cf
+    y : numpy array
+        SNR data (volts/volts), DC removed
+    f0 : float
+        first reflector height (meters)
+    df : float
+        reflector height spacing (meters). must be less than half of 1/(span of x)
+    nf : integer
+        number of reflector heights
+    oversampling : integer, optional
+        FFT length relative to the number of heights. default is 8
+    M : integer, optional
+        number of grid points each value is extirpolated onto. default is 6
+
+    Returns
+    -------
+    pz : numpy array
+        periodogram amplitudes (volts/volts)
+    """
+    n = len(x)
+    Sh, Ch = trig_sums(x, y, f0, df, nf, 1, oversampling, M)
+    S2, C2 = trig_sums(x, np.ones(n), f0, df, nf, 2, oversampling, M)
+
+    # tau as in scipy.signal.lombscargle, from tan(2 w tau) = S2/C2
+    hypo = np.sqrt(C2*C2 + S2*S2)
+    cos2 = C2/hypo
+    cos_tau = np.sqrt(0.5*(1 + cos2))
+    sin_tau = np.sign(S2)*np.sqrt(0.5*(1 - cos2))
+    YC = Ch*cos_tau + Sh*sin_tau
+    YS = Sh*cos_tau - Ch*sin_tau
+    CC = 0.5*(n + hypo)
+    SS = 0.5*(n - hypo)
+    P = 0.5*(YC*YC/CC + YS*YS/SS)
+    pz = 2*np.sqrt(np.maximum(P,0)/n)
+    return pz
+
+def trig_sums(x, h, f0, df, nf, factor=1, oversampling=8, M=6):
+    """
+    sums of h*sin(2 pi f x) and h*cos(2 pi f x) for f = factor*(f0 + df*k),
+    k = 0 .. nf-1, using extirpolation and an FFT (Press and Rybicki, 1989)
+
+    Parameters
+    ----------
+    x : numpy array
+        abscissas
+    h : numpy array
+        values
+    f0 : float
+        first frequency
+    df : float
+        frequency spacing
+    nf : integer
+        number of frequencies
+    factor : integer, optional
+        frequency multiplier. default is 1
+    oversampling : integer, optional
+        FFT length relative to nf. default is 8
+    M : integer, optional
+        number of grid points each value is extirpolated onto. default is 6
+
+    Returns
+    -------
+    S : numpy array
+        sine sums
+    C : numpy array
+        cosine sums
+    """
+    df = df*factor; f0 = f0*factor
+    Nfft = 1 << int(np.ceil(np.log2(max(nf*oversampling, 2*M))))
+    x0 = np.min(x)
+    h = h*np.exp(2j*np.pi*f0*(x - x0))
+    xnorm = ((x - x0)*Nfft*df) % Nfft
+    grid = extirpolate(xnorm, h, Nfft, M)
+    fftgrid = np.fft.ifft(grid)[0:nf]
+    f = f0 + df*np.arange(nf)
+    fftgrid = fftgrid*np.exp(2j*np.pi*x0*f)
+    C = Nfft*fftgrid.real
+    S = Nfft*fftgrid.imag
+    return S, C
+
+def extirpolate(x, y, N, M=4):
+    """
+    spreads values at arbitrary positions onto a regular grid so that sums
+    of smooth functions of x are kept (Press and Rybicki, 1989)
+
+    Parameters
+    ----------
+    x : numpy array
+        positions, between 0 and N
+    y : numpy array
+        values (can be complex)
+    N : integer
+        grid length
+    M : integer, optional
+        number of grid points each value is spread onto. default is 4
+
+    Returns
+    -------
+    result : numpy array
+        gridded values
+    """
+    result = np.zeros(N, dtype=y.dtype)
+    # values that are exactly on a grid point
+    ongrid = (x % 1 == 0)
+    np.add.at(result, x[ongrid].astype(int), y[ongrid])
+    x = x[~ongrid]; y = y[~ongrid]
+    # lagrange interpolation weights, for the M grid points starting at ilo
+    ilo = np.clip((x - M//2).astype(int), 0, N - M)
+    numerator = y*np.prod(x - ilo - np.arange(M)[:,None], 0)
+    denominator = math.factorial(M - 1)
+    for j in range(M):
+        if j > 0:
+            denominator *= j/(j - M)
+        ind = ilo + (M - 1 - j)
+        np.add.at(result, ind, numerator/(denominator*(x - ind)))
+    return result
+
+def window_data(s1,s2,s5,s6,s7,s8, sat,ele,azi,seconds,edot,f,az1,az2,e1,e2,satNu,pfitV,pele,screenstats,arcindex=None):
     """
 
     also calculates the scale factor for various GNNS frequencies.  currently
@@ -1740,6 +2147,10 @@ def window_data(s1,s2,s5,s6,s7,s8, sat,ele,azi,seconds,edot,f,az1,az2,e1,e2,satN
         polynomial order for DC fit
     screenstats : boolean
         Whether statistics come to the screen
+    arcindex : dictionary, optional
+        made by make_arc_index from the same sat, ele, azi and seconds arrays.
+        if given, only the arcs of this satellite that reach into the azimuth and
+        elevation window are looked at. the results are the same, just faster
 
     Returns
     ---------
@@ -1786,6 +2197,9 @@ def window_data(s1,s2,s5,s6,s7,s8, sat,ele,azi,seconds,edot,f,az1,az2,e1,e2,satN
 #   if not, frequency does not exist, will be tripped by Nv
 #   this does remove the direct signal component - but gets you ready to do that
     if (cf > 0):
+        if arcindex is not None:
+            ii = arc_rows(arcindex, satNu, az1, az2, pele[0], pele[1])
+            dat = dat[ii]; sat = sat[ii]; ele = ele[ii]; azi = azi[ii]; edot = edot[ii]; seconds = seconds[ii]
         x,y,sat,azi,seconds,edot  = removeDC(dat, satNu, sat,ele, pele, azi,az1,az2,edot,seconds) 
 
 #
@@ -1867,6 +2281,101 @@ def window_data(s1,s2,s5,s6,s7,s8, sat,ele,azi,seconds,edot,f,az1,az2,e1,e2,satN
     outFact2 = cunit/(avgEdot_fit*3600) 
     return x,y,Nvv,cf,meanTime,avgAzim,outFact1, outFact2, delT
 
+def make_arc_index(sat, ele, azi, seconds, gap=600):
+    """
+    index of the satellite arcs in a day of SNR data, made once so that
+    window_data does not have to scan the whole day for every satellite,
+    azimuth window and frequency.
+
+    the rows of each satellite are put together (keeping their order in the file,
+    which is time order), and then split into arcs wherever there is a time gap
+    or the satellite switches between rising and setting.
+
+    Parameters
+    ----------
+    sat : numpy array
+        satellite numbers
+    ele : numpy array
+        elevation angles (degrees)
+    azi : numpy array
+        azimuth angles (degrees)
+    seconds : numpy array
+        seconds of the day
+    gap : float, optional
+        time gap (seconds) that starts a new arc. default is 600
+
+    Returns
+    -------
+    arcindex : dictionary
+        'order' : row numbers sorted by satellite
+        'arcs' : for each satellite, a numpy array with one row per arc:
+        first and last+1 position in order, start and end time,
+        minimum and maximum azimuth, minimum and maximum elevation angle
+    """
+    order = np.argsort(sat, kind='stable')
+    ssat = sat[order]; sele = ele[order]; sazi = azi[order]; st = seconds[order]
+    N = len(order)
+    # where a new satellite starts
+    newarc = np.zeros(N, dtype=bool)
+    if N > 0:
+        newarc[0] = True
+    newarc[1:] = (ssat[1:] != ssat[:-1]) | (np.abs(np.diff(st)) > gap)
+    # rising or setting, zero elevation changes take the previous sign
+    if N > 1:
+        s = np.sign(np.diff(sele))
+        ii = np.where(s != 0, np.arange(len(s)), 0)
+        np.maximum.accumulate(ii, out=ii)
+        s = s[ii]
+        newarc[2:] = newarc[2:] | ((s[1:] != s[:-1]) & (s[1:] != 0) & (s[:-1] != 0))
+    starts = np.nonzero(newarc)[0]
+    stops = np.append(starts[1:], N)
+
+    arcs = {}
+    if N > 0:
+        tab = np.vstack((starts, stops, st[starts], st[stops-1],
+            np.minimum.reduceat(sazi, starts), np.maximum.reduceat(sazi, starts),
+            np.minimum.reduceat(sele, starts), np.maximum.reduceat(sele, starts))).T
+        arcsat = ssat[starts]
+        for satNu in np.unique(arcsat):
+            arcs[int(satNu)] = tab[arcsat == satNu]
+    arcindex = {'order': order, 'arcs': arcs}
+    return arcindex
+
+def arc_rows(arcindex, satNu, az1, az2, e1, e2):
+    """
+    rows (in the original order) of the arcs of a satellite
+    that reach into an azimuth and elevation angle window
+
+    Parameters
+    ----------
+    arcindex : dictionary
+        made by make_arc_index
+    satNu : integer
+        satellite number
+    az1 : float
+        minimum azimuth (degrees)
+    az2 : float
+        maximum azimuth (degrees)
+    e1 : float
+        minimum elevation angle (degrees)
+    e2 : float
+        maximum elevation angle (degrees)
+
+    Returns
+    -------
+    ii : numpy array of integers
+        row numbers
+    """
+    if satNu not in arcindex['arcs']:
+        return np.array([], dtype=int)
+    a = arcindex['arcs'][satNu]
+    use = (a[:,5] > az1) & (a[:,4] < az2) & (a[:,7] > e1) & (a[:,6] < e2)
+    order = arcindex['order']
+    ii = [order[int(i0):int(i1)] for i0,i1 in a[use,0:2]]
+    if len(ii) == 0:
+        return np.array([], dtype=int)
+    return np.concatenate(ii)
+
 def arc_scaleF(f,satNu):
     """
     calculates LSP scale factor cf 
@@ -2127,6 +2636,8 @@ def open_outputfile(station,year,doy,extension):
     if the results directory does not exist, it tries to make it. i think
     june 2019, added snrending to output name
     july 2020, no longer open frej file
+    the results are written to a .tmp file next to the result file.
+    gnssir_guts renames it when it is done, so a result file is never half written
     """
     if os.path.isdir('logs'):
         skippingxist = True
@@ -2151,7 +2662,7 @@ def open_outputfile(station,year,doy,extension):
     filepath1,fexit = LSPresult_name(station,year,doy,extension)
     #print('Output will go to:', filepath1)
     try:
-        fout=open(filepath1,'w+')
+        fout=open(filepath1 + '.tmp','w+')
 #       put a header in the output file
         fout.write("% gnssrefl, https://github.com/kristinemlarson \n")
         fout.write("% Phase Center corrections have NOT been applied \n")
@@ -2167,7 +2678,7 @@ def open_outputfile(station,year,doy,extension):
         subprocess.call(['mkdir',f2])
         # os.system(cm)
         try:
-            fout=open(filepath1,'w+')
+            fout=open(filepath1 + '.tmp','w+')
             print('successful open')
         except:
             print('problems opening the file')
@@ -2563,8 +3074,6 @@ def new_big_Disk_in_DC(station, year, month, day):
     picks up gzip o file 
     removed Z option and now only use gz with d file
     """
-    # get the proper path/name of the hatanaka code
-    crnxpath = hatanaka_version()
     if day == 0:
         doy = month
         year, month, day, cyyyy,cdoy, YMD = ydoy2useful(year,doy)
@@ -2583,7 +3092,7 @@ def new_big_Disk_in_DC(station, year, month, day):
     url = mainadd + str(year) + '/' + cdoy+ '/' + station + '/' + gzip_rinexfile 
     try:
         wget.download(url, out=gzip_rinexfile)
-        status = subprocess.call(['gunzip', gzip_rinexfile])
+        uncompress_rinex(gzip_rinexfile, rinexfile)
     except:
         okok = 1
 
@@ -2595,11 +3104,8 @@ def new_big_Disk_in_DC(station, year, month, day):
         try:
             url = mainadd + str(year) + '/' + cdoy+ '/' + station + '/' + gzip_rinexfiled 
             wget.download(url, out=gzip_rinexfiled)
-            subprocess.call(['gunzip',gzip_rinexfiled])
-            # un hatanaka
-            subprocess.call([crnxpath, rinexfiled])
-            # remove d file
-            subprocess.call(['rm','-f',rinexfiled])
+            # un gzip and un hatanaka, the d file is removed
+            uncompress_rinex(gzip_rinexfiled, rinexfile)
         except:
             okok = 1
 
@@ -2610,8 +3116,6 @@ def big_Disk_in_DC(station, year, month, day):
     both but the d file appears to be 30 sec, and that I do not want
     allow doy to be sent to code in the month spot.  set day to zero
     """
-    # get the proper path/name of the hatanaka code
-    crnxpath = hatanaka_version()
     if day == 0:
         doy = month
         year, month, day, cyyyy,cdoy, YMD = ydoy2useful(year,doy)
@@ -2626,7 +3130,7 @@ def big_Disk_in_DC(station, year, month, day):
     url = mainadd + str(year) + '/' + cdoy+ '/' + station + '/' + gzip_rinexfile 
     try:
         wget.download(url, out=gzip_rinexfile)
-        status = subprocess.call(['gunzip', gzip_rinexfile])
+        uncompress_rinex(gzip_rinexfile, rinexfile)
     except:
         okok = 1
 
@@ -3052,6 +3556,26 @@ def write_QC_fails(delT,delTmax,eminObs,emaxObs,e1,e2,ediff,maxAmp, Noise,PkNois
     if maxAmp/Noise < PkNoise:
         print('     Obs PkN  {0:.1f} vs {1:.1f} required'.format(maxAmp/Noise, PkNoise ))
         
+def QC_fail_list(delT,delTmax,eminObs,emaxObs,e1,e2,ediff,maxAmp, Noise,PkNoise,reqamp,tooclose2edge):
+    """
+    returns the names of the QC tests (same as write_QC_fails) an arc failed:
+    tooclose, delT, emin, emax, amp, pknoise
+    """
+    fails = []
+    if tooclose2edge:
+        fails.append('tooclose')
+    if delT > delTmax:
+        fails.append('delT')
+    if eminObs  > (e1 + ediff):
+        fails.append('emin')
+    if emaxObs  < (e2 - ediff):
+        fails.append('emax')
+    if maxAmp < reqamp:
+        fails.append('amp')
+    if maxAmp/Noise < PkNoise:
+        fails.append('pknoise')
+    return fails
+
 def define_quick_filename(station,year,doy,snr):
     """
     given station name, year, doy, snr type
@@ -3274,7 +3798,6 @@ def rinex_ga_highrate(station, year, month, day):
     ??? does not appear to have Rinex 2 files anymore ???
     ??? goes they switched in 2020 .... ???
     """
-    crnxpath = hatanaka_version()
     teqcpath = teqc_version()
     alpha='abcdefghijklmnopqrstuvwxyz'
     # if doy is input
@@ -3304,17 +3827,14 @@ def rinex_ga_highrate(station, year, month, day):
         print('Hour: ', ch)
         for e in ['00', '15', '30', '45']:
             dname = station + cdoy + alpha[h] + e + '.' + cyy + 'd.gz'
-            dname1 = station + cdoy + alpha[h] + e + '.' + cyy + 'd'
             dname2 = station + cdoy + alpha[h] + e + '.' + cyy + 'o'
             url = gns + '/' + ch + '/' + dname
             #print(url)
             try:
                 wget.download(url,dname)
-                subprocess.call(['gunzip',dname])
-                subprocess.call([crnxpath, dname1])
-                # delete the d file
-                subprocess.call(['rm',dname1])
-                fileF = fileF + 1
+                # gzip and hatanaka removed in python, the d.gz file is deleted
+                if uncompress_rinex(dname, dname2):
+                    fileF = fileF + 1
             except:
                 okok = 1
                 #print('download failed for some reason')
@@ -3634,6 +4154,37 @@ def ign_rinex3(station9ch, year, doy,srate):
     return fexist
 
 
+def uncompress_rinex(filename, oname):
+    """
+    writes the plain RINEX file oname from a gzipped and/or Hatanaka compressed
+    file (e.g. .yyo.gz, .yyd.gz or .yyd), which is then removed.  this is done in
+    python (see hatanaka.py), so neither gunzip nor CRX2RNX are needed
+
+    Parameters
+    ----------
+    filename : string
+        compressed RINEX file
+    oname : string
+        name of the RINEX file to write
+
+    Returns
+    -------
+    boolean
+        whether oname was written
+    """
+    tmpname = oname + '.tmp'
+    try:
+        with open(tmpname, 'w') as fout:
+            fout.writelines(hatanaka.open_rinex(filename))
+    except Exception as err:
+        print('Could not uncompress ', filename, err)
+        subprocess.call(['rm', '-f', tmpname])
+        return False
+    os.replace(tmpname, oname)
+    subprocess.call(['rm', '-f', filename])
+    return True
+
+
 def hatanaka_version():
     """
     return string with location of hatanaka executable
@@ -3726,18 +4277,8 @@ def snr_exist(station,year,doy,snrEnd):
 
     f= station + cdoy + '0.' + cyy + '.snr' + snrEnd
     fname = xdir + '/' + cyyyy + '/snr/' + station + '/' + f
-    fname2 = xdir + '/' + cyyyy + '/snr/' + station + '/' + f  + '.xz'
-    fname3 = xdir + '/' + cyyyy + '/snr/' + station + '/' + f  + '.gz'
-    snre = False
-    # check for both
-    if os.path.isfile(fname):
-        snre = True
-    if os.path.isfile(fname2) and (not snre):
-        snre = True # but needs to be uncompressed
-        subprocess.call(['unxz', fname2])
-    if os.path.isfile(fname3) and (not snre):
-            snre = True # but needs to be ungzipped 
-            subprocess.call(['gunzip', fname3])
+    # text, xz, gzip or binary SNR file. compressed files are not uncompressed
+    snre = (snr_source(fname) != '')
 
     return snre 
 
@@ -4025,10 +4566,15 @@ def nextdoy(year,doy):
 
     return nyear, ndoy
 
-def read_sp3file(file_path):
+def read_sp3file(file_path, cache=True):
     """ 
     input: file_path is the sp3file name
 
+    cache : bool, optional
+        if True (default), the orbits are saved in binary form next to the
+        sp3 file (file_path + '.npz') and read from there the next time,
+        as long as the sp3 file has not changed since
+
     Returns
     -------
     sp3 : ndarray
@@ -4039,15 +4585,23 @@ def read_sp3file(file_path):
     some of this code came from joakim
 
     """
+    cachefile = file_path + '.npz'
+    if cache:
+        sp3 = _read_orbitcache(file_path, cachefile, 'sp3')
+        if sp3 is not None:
+            return sp3
+
     ignorePoint = False
-    max_sat = 150 # not used
-    # store as satNu, week, sec of week , x, y, and z?
-    sp3 = np.empty(shape=[0, 6])
-    count = -1
     firstEpochFound = False
 
     f = open(file_path, 'r')
-    for line in f.readlines():
+    lines = f.readlines()
+    f.close()
+    # store as satNu, week, sec of week , x, y, and z
+    # one row per position record, unused rows are removed at the end
+    sp3 = np.empty(shape=[sum(1 for line in lines if line[0:1] == 'P'), 6])
+    count = 0
+    for line in lines:
         #all time tags have a * in first column
         if line[0] == '*':
             year,month,day,hour,minute,second = line.split()[1:]
@@ -4056,8 +4610,6 @@ def read_sp3file(file_path):
             if (not firstEpochFound):
                 firstWeek = wk 
                 firstEpochFound = True
-                #print('first GPS Week and Seconds in the file', firstWeek, swk)
-            count += 1
             if (wk != firstWeek):
                 #print('this is a problem - this code should not be used with files that crossover GPS weeks ')
                 #print('JAXA orbits have this extra point, which is going to be thrown out')
@@ -4072,13 +4624,49 @@ def read_sp3file(file_path):
                 x = float(xs[1])*1000.0
                 y = float(xs[2])*1000.0
                 z = float(xs[3])*1000.0
-                lis = [satNu, wk,swk, x,y,z]
-                sp3 = np.vstack((sp3,lis))
-    f.close()
-    nr,nc = sp3.shape
-    #print('number of rows and columns being returned from the sp3 file', nr,nc)
+                sp3[count] = [satNu, wk,swk, x,y,z]
+                count += 1
+    sp3 = sp3[0:count]
+
+    if cache:
+        _write_orbitcache(file_path, cachefile, 'sp3', sp3)
     return sp3
 
+def _read_orbitcache(file_path, cachefile, name):
+    """
+    returns the orbits (sp3 positions or nav ephemerides) saved by _write_orbitcache
+    under name, or None if there is no cache or it was made from a different
+    version of the orbit file
+    """
+    if not os.path.isfile(cachefile):
+        return None
+    st = os.stat(file_path)
+    try:
+        with np.load(cachefile) as d:
+            if (int(d['mtime']) == st.st_mtime_ns) and (int(d['size']) == st.st_size):
+                return d[name]
+    except Exception:
+        pass
+    return None
+
+def _write_orbitcache(file_path, cachefile, name, values):
+    """
+    saves the orbits from an sp3 or nav file in numpy binary format under name,
+    together with the modification time and size of the orbit file
+    """
+    st = os.stat(file_path)
+    # many processes can be reading or writing the cache of the same orbit file,
+    # so write it under a name of our own and then swap it in
+    tmpfile = cachefile + '.tmp.' + str(os.getpid())
+    try:
+        with open(tmpfile, 'wb') as f:
+            np.savez(f, mtime=st.st_mtime_ns, size=st.st_size, **{name: values})
+        os.replace(tmpfile, cachefile)
+    except OSError:
+        # e.g. read-only orbits directory - no harm done
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
 def nicerTime(UTCtime):
     """
     input float hour
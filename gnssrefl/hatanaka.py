@@ -0,0 +1,249 @@
+import gzip
+
+# Hatanaka (compact RINEX) decompression in python, so that gzipped CRX files
+# can be read without the CRX2RNX executable and without temporary files.
+# Supports CRINEX 1.0 (RINEX 2.11) and CRINEX 3.0 (RINEX 3).
+# Y. Hatanaka, A Compression Format and Tools for GNSS Observation Data,
+# Bulletin of the Geographical Survey Institute, 55, 21-30, 2008
+
+
+class HatanakaError(Exception):
+    pass
+
+
+def open_rinex(filename):
+    """ Open a RINEX observation file and return its lines.
+
+    gzip compression (.gz) and Hatanaka compression are removed on the fly,
+    so the lines are always plain RINEX.
+
+    Parameters
+    ----------
+    filename : str
+        RINEX, gzipped RINEX, Hatanaka or gzipped Hatanaka filename
+
+    Returns
+    -------
+    lines : iterator of str
+        lines of the uncompressed RINEX file
+    """
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'rt')
+    else:
+        f = open(filename, 'r')
+    first = f.readline()
+    return _lines(f, first)
+
+
+def _lines(f, first):
+    """ Generator behind open_rinex. The file is closed when the lines are used up. """
+    with f:
+        if 'COMPACT RINEX FORMAT' in first:
+            yield from crx2rnx(f, first)
+        else:
+            if first:
+                yield first
+            yield from f
+
+
+def is_hatanaka(filename):
+    """ Return True if filename is (gzipped) Hatanaka compressed, judged from the first line. """
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'rt')
+    else:
+        f = open(filename, 'r')
+    with f:
+        return 'COMPACT RINEX FORMAT' in f.readline()
+
+
+def _textdiff(old, diff):
+    """ Apply a CRINEX text difference: blank keeps the old character, & means blank. """
+    new = list(old.ljust(len(diff)))
+    for i, c in enumerate(diff):
+        if c == '&':
+            new[i] = ' '
+        elif c != ' ':
+            new[i] = c
+    return ''.join(new)
+
+
+def _decodefield(field, state):
+    """ Decode one differenced numeric field of a CRINEX file.
+
+    Parameters
+    ----------
+    field : str
+        either 'k&value' to start a new arc with difference order k, or the difference itself.
+
+    state : list or None
+        [arc order, current order, differences] from the previous epoch.
+
+    Returns
+    -------
+    state : list
+        updated state. The decoded integer is state[2][0]
+    """
+    if '&' in field:
+        arcorder, value = field.split('&')
+        return [int(arcorder), 0, [int(value)]]
+    if state is None:
+        raise HatanakaError('difference found for an arc that was never initialized')
+    arcorder, order, diffs = state
+    if order < arcorder:
+        order += 1
+        diffs.append(int(field))
+    else:
+        diffs[order] = int(field)
+    for j in range(order-1, -1, -1):
+        diffs[j] += diffs[j+1]
+    return [arcorder, order, diffs]
+
+
+def crx2rnx(lines, first=None):
+    """ Translate the lines of a Hatanaka compressed file into RINEX lines.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        lines of the CRINEX file
+
+    first : str, optional
+        first line of the file, if it has already been read from lines
+
+    Yields
+    ------
+    line : str
+        RINEX 2.11 or RINEX 3 line, ending with a newline
+    """
+    lines = iter(lines)
+    if first is None:
+        first = next(lines, '')
+    if 'COMPACT RINEX FORMAT' not in first:
+        raise HatanakaError('Not a compact RINEX file')
+    crxversion = first[:9].strip()
+    version3 = crxversion[0] == '3'
+    next(lines, '')  # CRINEX PROG / DATE
+
+    # header is copied as it is, only the number of observables is needed
+    nobs = {}
+    system = ''
+    for line in lines:
+        line = line.rstrip('\r\n')
+        yield line + '\n'
+        label = line[60:80].strip()
+        if label == '# / TYPES OF OBSERV' and line[:6].strip():
+            nobs[' '] = int(line[:6])
+        elif label == 'SYS / # / OBS TYPES' and line[0] != ' ':
+            system = line[0]
+            nobs[system] = int(line[3:6])
+        elif label == 'END OF HEADER':
+            break
+
+    if version3:
+        flagcol, numcol, satcol, epochlen = 31, slice(32, 35), 41, 35
+    else:
+        flagcol, numcol, satcol, epochlen = 28, slice(29, 32), 32, 32
+
+    epoch = ''
+    clock = None
+    data = {}
+    flags = {}
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if (version3 and line[:1] == '>') or ((not version3) and line[:1] == '&'):
+            # epoch line is not differenced - start over
+            epoch = ''
+        epoch = _textdiff(epoch, line)
+
+        if epoch[flagcol] in '2345':
+            # event flag: header records follow as they are
+            nrecords = int(epoch[numcol])
+            yield epoch[:epochlen].rstrip() + '\n'
+            for _ in range(nrecords):
+                yield next(lines, '').rstrip('\r\n') + '\n'
+            continue
+
+        nsat = int(epoch[numcol])
+        sats = [epoch[satcol+3*i:satcol+3*i+3] for i in range(nsat)]
+
+        clockline = next(lines, '').rstrip('\r\n')
+        if clockline.strip():
+            clock = _decodefield(clockline.strip(), clock)
+            clockvalue = clock[2][0]
+        else:
+            clock = None
+            clockvalue = None
+
+        # data and flags are differenced against the same satellite in the previous epoch
+        newdata = {}
+        newflags = {}
+        records = []
+        for sat in sats:
+            if version3:
+                ntype = nobs[sat[0]]
+            else:
+                ntype = nobs[' ']
+            parts = next(lines, '').rstrip('\r\n').split(' ', ntype)
+            olddata = data.get(sat, [None]*ntype)
+            values = []
+            satdata = []
+            for i in range(ntype):
+                if i < len(parts) and parts[i] != '':
+                    state = _decodefield(parts[i], olddata[i])
+                    satdata.append(state)
+                    values.append(state[2][0])
+                else:
+                    satdata.append(None)
+                    values.append(None)
+            satflags = flags.get(sat, '')
+            if len(parts) > ntype:
+                satflags = _textdiff(satflags, parts[ntype])
+            newdata[sat] = satdata
+            newflags[sat] = satflags
+            records.append((sat, values, satflags.ljust(2*ntype)))
+        data = newdata
+        flags = newflags
+
+        yield from _rinexepoch(epoch, epochlen, sats, clockvalue, records, version3)
+
+
+def _rinexepoch(epoch, epochlen, sats, clockvalue, records, version3):
+    """ Format one decoded epoch as RINEX lines. """
+    out = []
+    if version3:
+        line = epoch[:epochlen]
+        if clockvalue is not None:
+            line = line + '      ' + _fixedpoint(clockvalue, 15, 12)
+        out.append(line)
+    else:
+        # 12 satellites per line, receiver clock offset at the end of the first line
+        for i in range(0, max(len(sats), 1), 12):
+            if i == 0:
+                line = epoch[:epochlen] + ''.join(sats[:12])
+                if clockvalue is not None:
+                    line = line.ljust(68) + _fixedpoint(clockvalue, 12, 9)
+            else:
+                line = ' '*32 + ''.join(sats[i:i+12])
+            out.append(line)
+
+    for sat, values, satflags in records:
+        fields = []
+        for i, value in enumerate(values):
+            if value is None:
+                fields.append(' '*16)
+            else:
+                fields.append(_fixedpoint(value, 14, 3) + satflags[2*i:2*i+2])
+        if version3:
+            out.append((sat + ''.join(fields)).rstrip())
+        else:
+            for i in range(0, max(len(fields), 1), 5):
+                out.append(''.join(fields[i:i+5]).rstrip())
+
+    return [line + '\n' for line in out]
+
+
+def _fixedpoint(value, width, decimals):
+    """ Format an integer count of 10**-decimals units, e.g. F14.3, without rounding errors. """
+    sign = '-' if value < 0 else ''
+    digits = str(abs(value)).rjust(decimals+1, '0')
+    return (sign + digits[:-decimals] + '.' + digits[-decimals:]).rjust(width)
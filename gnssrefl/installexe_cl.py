@@ -3,7 +3,8 @@
 installs non-python executables for the gnssrefl code
 """
 import argparse
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 import os
 import subprocess
 import sys
@@ -5,10 +5,11 @@
 import datetime
 import json
 import os
-import requests
+from gnssrefl.lazy import lazy_import
+requests = lazy_import('requests')
 import sys
 import subprocess
-import wget
+wget = lazy_import('wget')
 from urllib.parse import urlparse
 import gnssrefl.gps as g
 import gnssrefl.cddis_highrate as ch
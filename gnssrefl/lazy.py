@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+deferred imports for the heavy dependencies (matplotlib, scipy, requests, wget ...).
+every command line tool imports gps.py, so importing those at the top made even
+ydoy wait a second and a half before doing anything. a module made with lazy_import
+is only imported the first time one of its attributes is used.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    stands in for a module until it is needed
+
+    Parameters
+    ----------
+    name : string
+        full module name, e.g. matplotlib.pyplot
+    """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self._module is None:
+            return f'<lazy module {self._name!r}>'
+        return repr(self._module)
+
+
+def lazy_import(name):
+    """
+    returns the module if it was already imported, else a LazyModule for it
+
+    Parameters
+    ----------
+    name : string
+        full module name, e.g. scipy.interpolate
+
+    Returns
+    -------
+    module or LazyModule
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
@@ -7,8 +7,10 @@ from __future__ import division
 import numpy as np 
 import os
 import subprocess
-from scipy.interpolate import interp1d
+from gnssrefl.lazy import lazy_import
+interpolate = lazy_import('scipy.interpolate')
 import gnssrefl.gps as g
+import gnssrefl.read_snr_files as read_snr
 
 def NMEA2SNR(locdir, fname, snrfile, csnr):
     """
@@ -240,8 +242,8 @@ def fix_angle_azimuth(time, angle, azimuth):
         azim0 = azimuth_mean(azimuth[ind3], azimuth[ind4])
 
 #interpolate at mean values
-        f_ang = interp1d(time_angle0, angle0, kind = 'linear', fill_value="extrapolate")
-        f_azim = interp1d(time_azim0, azim0, kind = 'linear', fill_value="extrapolate")
+        f_ang = interpolate.interp1d(time_angle0, angle0, kind = 'linear', fill_value="extrapolate")
+        f_azim = interpolate.interp1d(time_azim0, azim0, kind = 'linear', fill_value="extrapolate")
         angle_fixed = f_ang(time)#interpolated elev angle
         azim_fixed = f_azim(time)#interpolated azimuth angle
 
@@ -365,7 +367,7 @@ def elev_limits(snroption):
 
     return emin, emax
   
-def run_nmea2snr(station, year_list, doy_list, isnr, overwrite):
+def run_nmea2snr(station, year_list, doy_list, isnr, overwrite, binary=False):
     """
     runs the nmea2snr conversion
 
@@ -381,6 +383,8 @@ def run_nmea2snr(station, year_list, doy_list, isnr, overwrite):
         snr file type
     overwrite : boolean 
         whether make a new SNR file even if one already exists
+    binary : boolean
+        also write a binary copy of the SNR file (see read_snr_files.write_binary_snr)
     """
     # loop over years and day of years
     for yr in year_list:
@@ -395,7 +399,8 @@ def run_nmea2snr(station, year_list, doy_list, isnr, overwrite):
             if snre:
                 print('SNR file exists', snrfile)
             if overwrite:
-                subprocess.call(['rm', snrfile])
+                # compressed and binary versions too
+                subprocess.call(['rm', '-f', snrfile, snrfile + '.xz', snrfile + '.gz', read_snr.binary_snr_name(snrfile)])
                 snre = False
         
             illegal_day = False
@@ -408,6 +413,8 @@ def run_nmea2snr(station, year_list, doy_list, isnr, overwrite):
                 if os.path.exists(locdir+r) or os.path.exists(locdir+r+'.gz') or os.path.exists(locdir+r+'.Z'):
                     print('Creating '+snrfile)
                     NMEA2SNR(locdir, r, snrfile, csnr)
+                    if binary:
+                        read_snr.write_binary_snr(snrfile)
                     
                 else:
                     print('NMEA file '+r+' does not exist')
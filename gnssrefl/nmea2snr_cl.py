@@ -26,6 +26,7 @@ def main():
     parser.add_argument("-doy_end", default=None, help="end day of year", type=int)
     parser.add_argument("-year_end", default=None, help="end year", type=int)
     parser.add_argument("-overwrite", default=None, help="boolean", type=str)
+    parser.add_argument("-binary", default=None, help="use True to also write binary SNR files", type=str)
 
     args = parser.parse_args()
 
@@ -66,7 +67,11 @@ def main():
     if (args.overwrite == 'True'):
         overwrite = True
         
-    nmea.run_nmea2snr(station, year_list, doy_list, isnr, overwrite)
+    binary = False
+    if (args.binary == 'True'):
+        binary = True
+
+    nmea.run_nmea2snr(station, year_list, doy_list, isnr, overwrite, binary)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,8 @@
 import sys
 import os
 
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import subprocess
 
@@ -12,8 +13,7 @@ from gnssrefl.utils import FileManagement, FileTypes
 import gnssrefl.daily_avg_cl as da
 
 from functools import partial
-from scipy import optimize
-from scipy.interpolate import interp1d
+optimize = lazy_import('scipy.optimize')
 from datetime import datetime
 from pathlib import Path
 
@@ -376,7 +376,7 @@ def phase_tracks(station, year, doy, snr_type, fr_list, e1, e2, pele, plot, scre
                                 result = [[year, doy, utctime, phase, nv, avg_azim, sat_number, amp, min_el, max_el, del_t, rh_apriori, freq, max_f, obs_pk2noise, max_amp]]
                                 np.savetxt(my_file, result, fmt="%4.0f %3.0f %6.2f %8.3f %5.0f %6.1f %3.0f %5.2f %5.2f %5.2f %6.2f %5.3f %2.0f %6.3f %6.2f %6.2f", comments="%")
         # gzip SNR file if requested
-        if gzip:
+        if gzip and os.path.isfile(obsfile):
             subprocess.call(['gzip', obsfile])
 
 
@@ -10,8 +10,11 @@ import os
 import sys
 
 import numpy as np
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 from datetime import date
+
+import gnssrefl.results_store as store
 #
 
 def main():
@@ -64,48 +67,33 @@ def main():
     yearEnd = year2 + 1
     year_list = np.arange(year1,yearEnd,1)
     print('Years to examine: ',year_list)
-    for yr in year_list:
-        direc = xdir + '/' + str(yr) + '/results/' + station + '/' + extension + '/'
-        print('looking at ', yr, direc)
-        if os.path.isdir(direc):
-            all_files = os.listdir(direc)
-            for f in all_files:
-                fname = direc + f
-                L = len(f)
-        # file names have 7 characters in them ... 
-                if (L == 7):
-        # check that it is a file and not a directory and that it has something/anything in it
-                    try:
-                        a = np.loadtxt(fname,skiprows=3,comments='%').T
-                        numlines = len(a) 
-                        if (len(a) > 0):
-                            y = a[0] +a[1]/365.25; rh = a[2] ; doy = int(np.mean(a[1]))
+    # all the results of these years, from the results store rather than the daily files
+    alla, ndays = store.read_results(station, extension, year1, year2)
+    for yr, doy, a in store.day_groups(alla):
+        a = a.T
+        y = a[0] +a[1]/365.25; rh = a[2]
         # change from doy to month and day in datetime
-                            d = datetime.date(yr,1,1) + datetime.timedelta(doy-1)
-                            medv = np.median(rh)
-                            cc = (rh < (medv+howBig))  & (rh > (medv-howBig))
-                            good =rh[cc]; goodT =y[cc]
+        d = datetime.date(yr,1,1) + datetime.timedelta(doy-1)
+        medv = np.median(rh)
+        cc = (rh < (medv+howBig))  & (rh > (medv-howBig))
+        good =rh[cc]; goodT =y[cc]
         # only save if there are some minimal number of values
-                            if (len(good) > ReqTracks):
-                                rh = good
-                                obstimes.append(datetime.datetime(year=yr, month=d.month, day=d.day, hour=12, minute=0, second=0))
-                                medRH =np.append(medRH, medv)
-                                plt.plot(goodT, good,'.')
+        if (len(good) > ReqTracks):
+            rh = good
+            obstimes.append(datetime.datetime(year=yr, month=d.month, day=d.day, hour=12, minute=0, second=0))
+            medRH =np.append(medRH, medv)
+            plt.plot(goodT, good,'.')
             # store the meanRH after the outliers are removed using simple median filter
-                                meanRHtoday = np.mean(good)
-                                stdRHtoday = np.std(good)
-                                meanRH =np.append(meanRH, meanRHtoday)
+            meanRHtoday = np.mean(good)
+            stdRHtoday = np.std(good)
+            meanRH =np.append(meanRH, meanRHtoday)
             # add month and day just cause some people like that instead of doy
             # added standard deviation feb14, 2020
-                                newl = [yr, doy, meanRHtoday, len(rh), d.month, d.day, stdRHtoday]
-                                tv = np.append(tv, [newl],axis=0)
-                                k += 1
-                            else:
-                                print('not enough retrievals on ', yr, d.month, d.day, len(good))
-                    except:
-                        print('problem reading ', fname, ' so skipping it')
+            newl = [yr, doy, meanRHtoday, len(rh), d.month, d.day, stdRHtoday]
+            tv = np.append(tv, [newl],axis=0)
+            k += 1
         else:
-            print('that directory does not exist - so skipping')
+            print('not enough retrievals on ', yr, d.month, d.day, len(good))
     plt.ylabel('Reflector Height (m)')
     plt.title('GNSS station: ' + station)
     plt.gca().invert_yaxis()
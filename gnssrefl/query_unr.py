@@ -5,7 +5,8 @@ database (when I downloaded it ;-)
 
 """
 import argparse
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 import sys
 import os
 import gnssrefl.gps as g
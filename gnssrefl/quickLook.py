@@ -9,10 +9,9 @@ import os
 import sys
 import subprocess
 
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
-import scipy.interpolate
-import scipy.signal
 
 
 # my codes
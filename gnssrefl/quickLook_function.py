@@ -5,15 +5,14 @@ quickLook functions - consolidated snr reader (previously in a separate file)
 import sys
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import subprocess
 import warnings
 
-import scipy.interpolate
-import scipy.signal
 
 import gnssrefl.gps as g
+import gnssrefl.read_snr_files as snr
 import gnssrefl.rinex2snr as rinex
 
 
@@ -35,7 +34,7 @@ def read_snr_simple(obsfile):
 #   
     allGood = 1
     try:
-        f = np.genfromtxt(obsfile,comments='%')
+        f = snr.load_snr(obsfile)
         r,c = f.shape
         # put in a positive elev mask
         i= f[:,1] > 0
@@ -239,6 +238,8 @@ def quickLook_function(station, year, doy, snr_type,f,e1,e2,minH,maxH,reqAmp,pel
         if pltscreen:
             plt.figure(figsize=(10,6))
         allpoints = 0
+        # find the satellite arcs once, rather than for every satellite/azimuth
+        arcindex = g.make_arc_index(sat,ele,azi,t)
         for a in range(naz):
             if pltscreen:
                 plt.subplot(2,2,bz[a])
@@ -256,7 +257,7 @@ def quickLook_function(station, year, doy, snr_type,f,e1,e2,minH,maxH,reqAmp,pel
                 satlist = [satsel]
 
             for satNu in satlist:
-                x,y,Nv,cf,UTCtime,avgAzim,avgEdot,Edot2,delT= g.window_data(s1,s2,s5,s6,s7,s8,sat,ele,azi,t,edot,f,az1,az2,e1,e2,satNu,polyV,pele,screenstats) 
+                x,y,Nv,cf,UTCtime,avgAzim,avgEdot,Edot2,delT= g.window_data(s1,s2,s5,s6,s7,s8,sat,ele,azi,t,edot,f,az1,az2,e1,e2,satNu,polyV,pele,screenstats,arcindex) 
                 allpoints = allpoints + Nv
                 # if screenstats:
                     #print('ALL tracks: Azim {0:5.1f} Satellite {1:2.0f} UTC {2:5.2f} Npts {3:3.0f} between Azimuths {4:3.0f}-{5:3.0f}'.format( avgAzim,satNu,UTCtime,Nv, az1, az2))
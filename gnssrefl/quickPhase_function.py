@@ -1,7 +1,8 @@
 import sys
 import os
 
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 
 
@@ -10,8 +11,7 @@ import gnssrefl.read_snr_files as read_snr
 from gnssrefl.utils import FileManagement, FileTypes
 
 from functools import partial
-from scipy import optimize
-from scipy.interpolate import interp1d
+optimize = lazy_import('scipy.optimize')
 from datetime import datetime
 from pathlib import Path
 
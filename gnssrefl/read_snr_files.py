@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import gzip
+import lzma
 import numpy as np
 import os
 import subprocess 
@@ -60,10 +62,7 @@ def read_snr_multiday(obsfile,obsfile2,twoDays):
     try:
 #       this will be 24 hours - all in one calendar day 
 #        print('>>>>>>>>>>>>>>>>>>>>> try to read file 1:')
-        compressedObs = obsfile + '.xz'
-        if (os.path.isfile(compressedObs) == True):
-            print('compressed file exists, so uncompress it')
-            subprocess.call(['unxz', compressedObs])
+        # compressed files are read as they are, see load_snr
         sat, ele, azi, t, edot, s1, s2, s5, s6, s7, s8, snrE = read_one_snr(obsfile,1)
         allGood1 = 1
 #        g.print_file_stats(ele,sat,s1,s2,s5,s6,s7,s8,e1,e2)
@@ -98,10 +97,6 @@ def read_snr_multiday(obsfile,obsfile2,twoDays):
 #       I think this is ok??
         QsnrE = snrE
         try:
-            compressedObs = obsfile2 + '.xz'
-            if (os.path.isfile(compressedObs) == True):
-                print('compressed file exists, so uncompress it')
-                cmd = 'unxz ' + compressedObs; os.system(cmd)
             #print('>>>>>>>>>>>>>>>>>>>>> try to read last three hours of file 2:')
             Psat, Pele, Pazi, Pt, Pedot, Ps1, Ps2, Ps5, Ps6, Ps7, Ps8, PsnrE = read_one_snr(obsfile2,2)
             allGood2 = 1
@@ -136,7 +131,7 @@ def read_one_snr(obsfile,ifile):
 #
 
     snrE = np.array([False, True, True,False,False,True,True,True,True],dtype = bool)
-    f = np.genfromtxt(obsfile,comments='%')
+    f = load_snr(obsfile)
     #print('reading from this snr file ',obsfile)
     r,c = f.shape
     if (r > 0) & (c > 0):
@@ -219,6 +214,125 @@ def read_one_snr(obsfile,ifile):
 
     return sat, ele, azi, t, edot, s1, s2, s5, s6, s7, s8, snrE
 
+# columns of the binary SNR files, in the same order as in the text SNR files
+snr_columns = [('sat', '<u2'), ('ele', '<f4'), ('azi', '<f4'), ('sod', '<i4'), ('edot', '<f4'),
+    ('s6', '<f4'), ('s1', '<f4'), ('s2', '<f4'), ('s5', '<f4'), ('s7', '<f4'), ('s8', '<f4')]
+
+def binary_snr_name(obsfile):
+    """
+    name of the binary version of a SNR file, i.e. obsfile + '.npy'
+    """
+    return obsfile + '.npy'
+
+def write_binary_snr(obsfile):
+    """
+    writes a binary copy of a SNR file, with typed columns
+    (satellite as uint16, seconds of the day as int32, all else float32).
+    It is a numpy structured array, so it can be memory mapped.  The field names
+    tell you which columns (i.e. which SNR signals) the text file had
+    and the snr type is in the file name, as always.
+
+    parameters
+    ----------
+    obsfile : string
+        name of the (uncompressed) SNR file
+
+    returns
+    -------
+    binfile : string
+        name of the binary SNR file, empty if it could not be made
+    """
+    binfile = binary_snr_name(obsfile)
+    try:
+        f = np.loadtxt(obsfile, comments='%', ndmin=2)
+    except:
+        print('could not read the SNR file, so no binary SNR file was made', obsfile)
+        return ''
+    r,c = f.shape
+    if c == 0:
+        c = 9 # empty file
+    c = min(c,len(snr_columns))
+    b = np.empty(r, dtype=snr_columns[0:c])
+    for i in range(c):
+        name = snr_columns[i][0]
+        if name in ['sat','sod']:
+            b[name] = np.round(f[:,i])
+        else:
+            b[name] = f[:,i]
+    np.save(binfile, b)
+    return binfile
+
+def read_binary_snr(binfile):
+    """
+    reads a binary SNR file made by write_binary_snr
+
+    returns
+    -------
+    f : numpy array of floats
+        same rows and columns as the text SNR file
+    """
+    b = np.load(binfile, mmap_mode='r')
+    f = np.empty((len(b), len(b.dtype.names)))
+    for i,name in enumerate(b.dtype.names):
+        f[:,i] = b[name]
+    return f
+
+def snr_source(obsfile):
+    """
+    which file on disk holds the SNR data for obsfile:
+    the binary SNR file (unless the text file is newer), the text file,
+    or the xz or gzip compressed text file, in that order.
+
+    parameters
+    ----------
+    obsfile : string
+        name of the (uncompressed) SNR file
+
+    returns
+    -------
+    source : string
+        name of the file to read, empty if there is none
+    """
+    text = ''
+    for name in [obsfile, obsfile + '.xz', obsfile + '.gz']:
+        if os.path.isfile(name):
+            text = name
+            break
+    binfile = binary_snr_name(obsfile)
+    if os.path.isfile(binfile):
+        if (text == '') or (os.path.getmtime(binfile) >= os.path.getmtime(text)):
+            return binfile
+    return text
+
+def load_snr(obsfile):
+    """
+    contents of a SNR file as a two dimensional numpy array.
+    the binary version of the file is used when there is one,
+    unless the text file is newer.  xz and gzip compressed
+    files are uncompressed in memory, the compressed file is left as it is.
+
+    parameters
+    ----------
+    obsfile : string
+        name of the SNR file
+
+    returns
+    -------
+    f : numpy array of floats
+        one row per observation, columns as in the SNR file
+    """
+    source = snr_source(obsfile)
+    if source == binary_snr_name(obsfile):
+        return read_binary_snr(source)
+    if source.endswith('.xz'):
+        with lzma.open(source, 'rt') as f:
+            return np.genfromtxt(f,comments='%')
+    if source.endswith('.gz'):
+        with gzip.open(source, 'rt') as f:
+            return np.genfromtxt(f,comments='%')
+    # this also gives the usual error message if there is no file
+    return np.genfromtxt(obsfile,comments='%')
+
 def compress_snr_files(wantCompression, obsfile, obsfile2,TwoDays,gzip):
     """
     inputs boolean (whether you want to compress), whether you have two
@@ -6,13 +6,16 @@ import datetime
 import os
 import pickle
 import sys
-import wget
+from gnssrefl.lazy import lazy_import
+wget = lazy_import('wget')
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 import gnssrefl.gps as g
 
+# station refraction grids already read in this session, see read_4by5
+_refr_grids = {}
+
 
 def read_4by5(station, dlat,dlon,hell):
     """
@@ -41,7 +44,8 @@ def read_4by5(station, dlat,dlon,hell):
     lagrid : 4 by 5 numpy array
     Tmgrid : 4 by 5 numpy array
 
-    requires that an environment variable exists for REFL_CODE
+    requires that an environment variable exists for REFL_CODE. the grid of a station
+    is kept for the rest of the session and only read again if the file changes
     """
 #
     xdir = str(os.environ['REFL_CODE'])
@@ -51,6 +55,9 @@ def read_4by5(station, dlat,dlon,hell):
 
     # input file should be written here
     obsfile = inputpath + station + '_refr.txt'
+    mtime = os.stat(obsfile).st_mtime_ns
+    if (obsfile in _refr_grids) and (_refr_grids[obsfile][0] == mtime):
+        return _refr_grids[obsfile][1]
     #print('reading from station refraction file: ', obsfile)
     x = np.genfromtxt(obsfile,comments='%')
     max_ind = 4
@@ -80,7 +87,9 @@ def read_4by5(station, dlat,dlon,hell):
             Tmgrid[n,ij] = x[m,11] 
             ij +=1
 
-    return pgrid, Tgrid, Qgrid, dTgrid, u, Hs, ahgrid, awgrid, lagrid, Tmgrid
+    grids = pgrid, Tgrid, Qgrid, dTgrid, u, Hs, ahgrid, awgrid, lagrid, Tmgrid
+    _refr_grids[obsfile] = (mtime, grids)
+    return grids
 #
 def gpt2_1w (station, dmjd,dlat,dlon,hell,it):
     """
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+one file with all the gnssir results of a station
+
+gnssir writes a text file per day ($REFL_CODE/<year>/results/<station>/<extension>/<doy>.txt).
+daily_avg and subdaily used to list those directories and read every file, every time,
+which is thousands of text files for a long record. the results are also kept in
+$REFL_CODE/Files/<station>_results.db (sqlite), one row per day with the day's results
+as a binary array, indexed by extension, year and doy.
+
+the text files are still what counts: gnssir updates the store when it writes a
+day, and before reading the store is brought up to date with any day file that
+was added, changed (size or modification time) or removed since. so results
+made with an older version or copied in from elsewhere are picked up too.
+
+only the 17 standard columns are kept (year, doy, RH, sat, UTCtime, Azim, Amp, eminO,
+emaxO, NumbOf, freq, rise, EdotF, PkNoise, DelT, MJD, refr-appl), i.e. not the
+month, day, hour and minute columns added by gnssir -mmdd
+"""
+import os
+import pickle
+import sqlite3
+import warnings
+
+import numpy as np
+
+NCOLS = 17
+
+# column numbers (python, i.e. starting at zero) of the results
+YEAR = 0; DOY = 1; RH = 2; SAT = 3; UTC = 4; AZIM = 5; AMP = 6; FREQ = 10; PKNOISE = 13
+
+
+def store_name(station):
+    """
+    returns the name of the results store of a station, $REFL_CODE/Files/<station>_results.db
+    """
+    return os.environ['REFL_CODE'] + '/Files/' + station + '_results.db'
+
+
+def _connect(station):
+    """
+    opens (and if needed makes) the results store of a station. gnssir may be writing
+    days from several processes at once, so wait for the others rather than failing
+    """
+    fname = store_name(station)
+    d = os.path.dirname(fname)
+    if not os.path.isdir(d):
+        os.makedirs(d, exist_ok=True)
+    conn = sqlite3.connect(fname, timeout=120)
+    conn.execute('CREATE TABLE IF NOT EXISTS days (extension TEXT, year INTEGER, doy INTEGER, '
+                 'mtime INTEGER, size INTEGER, nrows INTEGER, data BLOB, '
+                 'PRIMARY KEY (extension, year, doy))')
+    conn.execute('CREATE TABLE IF NOT EXISTS summaries (name TEXT, extension TEXT, year INTEGER, doy INTEGER, '
+                 'mtime INTEGER, size INTEGER, data BLOB, PRIMARY KEY (name, extension, year, doy))')
+    return conn
+
+
+def results_dir(station, year, extension=''):
+    """
+    returns the directory with the daily result files of a station and year
+    """
+    return os.environ['REFL_CODE'] + '/' + str(year) + '/results/' + station + '/' + extension + '/'
+
+
+def read_day_file(fname):
+    """
+    reads a daily gnssir result file
+
+    Parameters
+    ----------
+    fname : string
+        name of the file
+
+    Returns
+    -------
+    a : numpy array of floats
+        results, one row per arc and NCOLS columns. None if the file cannot be read
+    """
+    try:
+        # no warnings about days without results
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            a = np.loadtxt(fname, comments='%', ndmin=2)
+    except Exception:
+        return None
+    if len(a) == 0:
+        return np.empty(shape=[0, NCOLS])
+    if a.shape[1] < NCOLS:
+        return None
+    return np.ascontiguousarray(a[:, 0:NCOLS])
+
+
+def _put(conn, extension, year, doy, st, a):
+    conn.execute('INSERT OR REPLACE INTO days VALUES (?,?,?,?,?,?,?)',
+                 (extension, int(year), int(doy), st.st_mtime_ns, st.st_size, len(a),
+                  np.asarray(a, dtype=np.float64).tobytes()))
+
+
+def add_day(station, extension, year, doy, fname, a=None):
+    """
+    puts the results of one day in the store. called by gnssir after it writes the day file
+
+    Parameters
+    ----------
+    station : string
+        4 character station name
+    extension : string
+        gnssir extension, usually ''
+    year : integer
+        year
+    doy : integer
+        day of year
+    fname : string
+        the daily result file
+    a : numpy array, optional
+        the results in that file. if None, they are read from the file
+    """
+    if a is None:
+        a = read_day_file(fname)
+        if a is None:
+            return
+    st = os.stat(fname)
+    a = np.asarray(a, dtype=np.float64).reshape(-1, NCOLS)
+    conn = _connect(station)
+    try:
+        with conn:
+            _put(conn, extension, year, doy, st, a)
+    finally:
+        conn.close()
+
+
+def sync(station, extension='', year1=1980, year2=2100):
+    """
+    brings the store up to date with the daily result files of these years:
+    new or changed files are read, and days whose file is gone are removed
+
+    Parameters
+    ----------
+    station : string
+        4 character station name
+    extension : string, optional
+        gnssir extension, default is ''
+    year1 : integer, optional
+        first year
+    year2 : integer, optional
+        last year
+
+    Returns
+    -------
+    nread : integer
+        number of day files that were read
+    """
+    xdir = os.environ['REFL_CODE']
+    years = [int(y) for y in os.listdir(xdir) if y.isdigit() and (year1 <= int(y) <= year2)] if os.path.isdir(xdir) else []
+    conn = _connect(station)
+    nread = 0
+    try:
+        with conn:
+            known = {}
+            for yr, doy, mtime, size in conn.execute('SELECT year, doy, mtime, size FROM days '
+                                                     'WHERE extension=? AND year>=? AND year<=?',
+                                                     (extension, year1, year2)):
+                known[(yr, doy)] = (mtime, size)
+            seen = set()
+            for yr in years:
+                direc = results_dir(station, yr, extension)
+                if not os.path.isdir(direc):
+                    continue
+                with os.scandir(direc) as it:
+                    for entry in it:
+                        # file names are doy.txt
+                        f = entry.name
+                        if (len(f) != 7) or (f[3:7] != '.txt') or (not f[0:3].isdigit()) or (not entry.is_file()):
+                            continue
+                        doy = int(f[0:3])
+                        seen.add((yr, doy))
+                        st = entry.stat()
+                        if known.get((yr, doy)) == (st.st_mtime_ns, st.st_size):
+                            continue
+                        a = read_day_file(entry.path)
+                        if a is None:
+                            continue
+                        _put(conn, extension, yr, doy, st, a)
+                        nread += 1
+            gone = [k for k in known if k not in seen]
+            conn.executemany('DELETE FROM days WHERE extension=? AND year=? AND doy=?',
+                             [(extension, yr, doy) for yr, doy in gone])
+    finally:
+        conn.close()
+    return nread
+
+
+def read_results(station, extension='', year1=1980, year2=2100, doy1=1, doy2=366,
+                 azim1=None, azim2=None, freq=None, minamp=None, update=True):
+    """
+    returns the gnssir results of a station, sorted by year and doy
+
+    Parameters
+    ----------
+    station : string
+        4 character station name
+    extension : string, optional
+        gnssir extension, default is ''
+    year1 : integer, optional
+        first year
+    year2 : integer, optional
+        last year
+    doy1 : integer, optional
+        first day of year of year1
+    doy2 : integer, optional
+        last day of year of year2
+    azim1 : float, optional
+        only results with azimuth >= azim1 (degrees)
+    azim2 : float, optional
+        only results with azimuth <= azim2 (degrees)
+    freq : integer or list of integers, optional
+        only results for these frequencies, e.g. 1 or [1, 101]
+    minamp : float, optional
+        only results with LSP amplitude >= minamp
+    update : boolean, optional
+        first bring the store up to date with the daily files (see sync). default is True
+
+    Returns
+    -------
+    a : numpy array of floats
+        the results, NCOLS columns as in the daily files
+    ndays : integer
+        number of days in the store for this time span (including days without results)
+    """
+    if update:
+        sync(station, extension, year1, year2)
+    conn = _connect(station)
+    try:
+        rows = conn.execute('SELECT nrows, data FROM days WHERE extension=? '
+                            'AND (year*1000 + doy) >= ? AND (year*1000 + doy) <= ? ORDER BY year, doy',
+                            (extension, year1*1000 + doy1, year2*1000 + doy2)).fetchall()
+    finally:
+        conn.close()
+    ndays = len(rows)
+    parts = [np.frombuffer(data, dtype=np.float64).reshape(nrows, NCOLS) for nrows, data in rows if nrows > 0]
+    if len(parts) == 0:
+        return np.empty(shape=[0, NCOLS]), ndays
+    a = np.concatenate(parts)
+
+    keep = np.ones(len(a), dtype=bool)
+    if azim1 is not None:
+        keep &= a[:, AZIM] >= azim1
+    if azim2 is not None:
+        keep &= a[:, AZIM] <= azim2
+    if freq is not None:
+        keep &= np.isin(a[:, FREQ], np.atleast_1d(freq))
+    if minamp is not None:
+        keep &= a[:, AMP] >= minamp
+    return a[keep, :], ndays
+
+
+def day_versions(station, extension='', year1=1980, year2=2100):
+    """
+    returns a dictionary with (year, doy) keys and (mtime, size) of the daily
+    result file as values, for the days in the store
+    """
+    conn = _connect(station)
+    try:
+        rows = conn.execute('SELECT year, doy, mtime, size FROM days WHERE extension=? AND year>=? AND year<=?',
+                            (extension, year1, year2)).fetchall()
+    finally:
+        conn.close()
+    return {(yr, doy): (mtime, size) for yr, doy, mtime, size in rows}
+
+
+def read_days(station, extension, days):
+    """
+    returns the results of a list of (year, doy) days, sorted by year and doy
+    """
+    conn = _connect(station)
+    parts = []
+    try:
+        for yr, doy in sorted(days):
+            row = conn.execute('SELECT nrows, data FROM days WHERE extension=? AND year=? AND doy=?',
+                               (extension, yr, doy)).fetchone()
+            if (row is not None) and (row[0] > 0):
+                parts.append(np.frombuffer(row[1], dtype=np.float64).reshape(row[0], NCOLS))
+    finally:
+        conn.close()
+    if len(parts) == 0:
+        return np.empty(shape=[0, NCOLS])
+    return np.concatenate(parts)
+
+
+def read_summaries(station, name, extension='', year1=1980, year2=2100):
+    """
+    returns the summaries of days saved with write_summaries, as a dictionary
+    with (year, doy) keys and (mtime, size, summary) values. the summaries kept
+    under other names for this extension are removed, so that only the summaries
+    made with the latest settings take up space
+
+    Parameters
+    ----------
+    station : string
+        4 character station name
+    name : string
+        who made the summaries, and with which settings, e.g. 'daily_avg fr=0 ...'
+    extension : string, optional
+        gnssir extension, default is ''
+    year1 : integer, optional
+        first year
+    year2 : integer, optional
+        last year
+    """
+    conn = _connect(station)
+    try:
+        with conn:
+            conn.execute('DELETE FROM summaries WHERE extension=? AND name!=?', (extension, name))
+        rows = conn.execute('SELECT year, doy, mtime, size, data FROM summaries '
+                            'WHERE name=? AND extension=? AND year>=? AND year<=?',
+                            (name, extension, year1, year2)).fetchall()
+    finally:
+        conn.close()
+    return {(yr, doy): (mtime, size, pickle.loads(data)) for yr, doy, mtime, size, data in rows}
+
+
+def write_summaries(station, name, extension, summaries, gone=()):
+    """
+    saves summaries of days, e.g. the daily statistics of daily_avg
+
+    Parameters
+    ----------
+    station : string
+        4 character station name
+    name : string
+        who made the summaries, and with which settings
+    extension : string
+        gnssir extension
+    summaries : dictionary
+        (year, doy) keys and (mtime, size, summary) values, where mtime and size are those
+        of the daily result file (see day_versions) and summary is anything that can be pickled
+    gone : list of (year, doy), optional
+        days whose summaries are removed
+    """
+    conn = _connect(station)
+    try:
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO summaries VALUES (?,?,?,?,?,?,?)',
+                             [(name, extension, yr, doy, v[0], v[1], pickle.dumps(v[2]))
+                              for (yr, doy), v in summaries.items()])
+            conn.executemany('DELETE FROM summaries WHERE name=? AND extension=? AND year=? AND doy=?',
+                             [(name, extension, yr, doy) for yr, doy in gone])
+    finally:
+        conn.close()
+
+
+def day_groups(a):
+    """
+    yields (year, doy, results of that day) for results sorted by year and doy,
+    e.g. as returned by read_results
+    """
+    if len(a) == 0:
+        return
+    key = a[:, YEAR]*1000 + a[:, DOY]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], len(a)]
+    for i0, i1 in zip(starts, ends):
+        yield int(a[i0, YEAR]), int(a[i0, DOY]), a[i0:i1, :]
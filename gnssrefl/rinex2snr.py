@@ -2,10 +2,11 @@
 """
 """
 import datetime
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
-from scipy.interpolate import interp1d
+interpolate = lazy_import('scipy.interpolate')
 import subprocess
 import sys
 import time
@@ -17,6 +18,7 @@ from progress.bar import Bar
 # my gps libraries
 import gnssrefl.gps as g
 import gnssrefl.rinpy as rinpy
+import gnssrefl.read_snr_files as snr
 import gnssrefl.karnak_libraries as k
 import gnssrefl.cddis_highrate as ch
 
@@ -30,6 +32,9 @@ class constants:
     omegaEarth = 7.2921151467E-5 #      %rad/sec
     mu = 3.986005e14 # Earth GM value
     c= 299792458 # m/sec
+
+# orbit products already made in this process, see orbit_product
+_orbit_products = {}
  
 #
 #
@@ -59,7 +64,7 @@ def quickname(station,year,cyy, cdoy, csnr):
     fname =  xdir + str(year) + '/snr/' + station + '/' + station + cdoy + '0.' + cyy + '.snr' + csnr
     return fname
 
-def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,archive,fortran,nol,overwrite,translator,srate,mk,skipit,stream='R'):
+def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,archive,fortran,nol,overwrite,translator,srate,mk,skipit,stream='R',binary=False):
     """
     main code to convert RINEX files into SNR
 
@@ -113,6 +118,9 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
 
     skipit = skips making files every day, so a value of 7 means weekly.  1 means do every day
 
+    binary : boolean
+        also write a binary copy of each new SNR file (see read_snr_files.write_binary_snr)
+
 
     """
     # 
@@ -175,7 +183,8 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                 print('SNR file already exists', fname)
                 if overwrite:
                     print('overwriting')
-                    subprocess.call(['rm', fname])
+                    # compressed and binary versions too
+                    subprocess.call(['rm', '-f', fname, fname + '.xz', fname + '.gz', snr.binary_snr_name(fname)])
                     snre = False
             illegal_day = False
             if (doy > dec31):
@@ -191,7 +200,7 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                     if version == 2:
                         the_makan_option(station,cyyyy,cyy,cdoy) # looks everywhere in your local directories
                         if os.path.exists(r):
-                            conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator) 
+                            conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator,binary=binary) 
                         else:
                             print('You Chose the No Look Option, but did not provide the needed RINEX file.')
                     if version == 3:
@@ -205,15 +214,22 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                         r3 = station9ch + streamid + str(year) + cdoy + '0000_01D_' + csrate + 'S_MO.rnx'
                         r3gz = station9ch + streamid + str(year) + cdoy + '0000_01D_' + csrate + 'S_MO.rnx.gz'
                         r2 = station + cdoy + '0.' + cyy + 'o'
-                        if os.path.exists(r3cmpgz):
-                            translated, rnx_filename = go_from_crxgz_to_rnx(r3cmpgz)
-                        if os.path.exists(r3gz):
-                            subprocess.call(['gunzip', r3gz])
+                        if translator == 'python':
+                            # the python translator reads gzip and Hatanaka compressed files as they are
+                            if not os.path.exists(r3):
+                                for r3option in [r3gz, r3cmpgz]:
+                                    if os.path.exists(r3option):
+                                        r3 = r3option
+                        else:
+                            if os.path.exists(r3cmpgz):
+                                translated, rnx_filename = go_from_crxgz_to_rnx(r3cmpgz)
+                            if os.path.exists(r3gz):
+                                subprocess.call(['gunzip', r3gz])
                         if os.path.exists(r3):
                             print('The RINEX 3 file exists locally')
-                            fexists = g.new_rinex3_rinex2(r3,r2,dec_rate)
+                            fexists, rinex3file = rinex3_input(r3,r2,dec_rate,translator)
                             if fexists:
-                                conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator) 
+                                conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator,rinex3file,binary) 
                             else:
                                 print('Something about the RINEX 3-2 conversion did not work')
                         else:
@@ -227,7 +243,7 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                         rnx_filename = '' # just in  case?
                         print(station9ch, ' year:', year, ' doy:', doy, 'from: ', archive)
                         r2 = station + cdoy + '0.' + cyy + 'o'
-                        rinex2exists = False; rinex3name = '';
+                        rinex2exists = False; rinex3name = ''; rinex3file = None
                         if (rate == 'high'):
                             print('This code only accesses 1-Hz Rinex 3 data at CDDIS, BKG, and GA')
                             if archive == 'ga':
@@ -240,12 +256,12 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                                 rnx_filename,foundit = ch.cddis_highrate(station9ch, year, doy, 0,stream,dec_rate)
                                 if foundit:
                                     print('The RINEX 3 file has been downloaded. Try to make ', r2)
-                                    fexists = g.new_rinex3_rinex2(rnx_filename,r2,dec_rate)
+                                    fexists, rinex3file = rinex3_input(rnx_filename,r2,dec_rate,translator)
                             if archive == 'bkg':
                                 rnx_filename,foundit = ch.bkg_highrate(station9ch, year, doy, 0,stream,dec_rate)
                                 if foundit:
                                     print('The RINEX 3 file has been downloaded and merged. Try to make ', r2)
-                                    fexists = g.new_rinex3_rinex2(rnx_filename,r2,dec_rate)
+                                    fexists, rinex3file = rinex3_input(rnx_filename,r2,dec_rate,translator)
 
                         else:
                             if (archive == 'all'):
@@ -258,27 +274,71 @@ def run_rinex2snr(station, year_list, doy_list, isnr, orbtype, rate,dec_rate,arc
                                 if (not foundit): # try again
                                     #print('stream',stream)
                                     file_name,foundit = k.universal(station9ch, year, doy, archive,srate,k.swapRS(stream))
-                            if foundit: # version 3 found - now need to gzip, then hatanaka decompress
+                            if foundit and (translator == 'python'):
+                                # compressed file is read as it is
+                                translated = os.path.exists(file_name); rnx_filename = file_name
+                            elif foundit: # version 3 found - now need to gzip, then hatanaka decompress
                                 translated, rnx_filename = go_from_crxgz_to_rnx(file_name)
                             # now make rinex2
-                                if translated:
-                                    print('The RINEX 3 file has been downloaded. Try to make ', r2)
-                                    fexists = g.new_rinex3_rinex2(rnx_filename,r2,dec_rate)
-                                    #subprocess.call(['rm', '-f',rnx_filename]) # rnx
+                            if foundit and translated:
+                                print('The RINEX 3 file has been downloaded. Try to make ', r2)
+                                fexists, rinex3file = rinex3_input(rnx_filename,r2,dec_rate,translator)
+                                #subprocess.call(['rm', '-f',rnx_filename]) # rnx
                         # this means the rinex 2 version exists
-                        if fexists:
+                        if fexists and (rinex3file is not None):
+                             print('RINEX 3 file will be translated directly', year, doy)
+                             conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator,rinex3file,binary) 
+                             subprocess.call(['rm', '-f',rnx_filename]) # downloaded RINEX 3 file
+                        elif fexists:
                              print('RINEX 2 created from v3', year, doy, ' Now remove RINEX 3 files and convert')
                              subprocess.call(['rm', '-f',rnx_filename]) # rnx
-                             conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator) 
+                             conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator,binary=binary) 
                         else:
                             print('Unsuccessful RINEX 3 retrieval/translation', year, doy)
                     else:
                         print(station, ' year:', year, ' doy:', doy, 'from: ', archive)
                         # this is rinex version 2 - finds rinex and converts it
-                        conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator) 
+                        conv2snr(year, doy, station, isnr, orbtype,rate,dec_rate,archive,fortran,translator,binary=binary) 
 
 
-def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,fortran,translator):
+def rinex3_input(rnx_filename,r2,dec_rate,translator):
+    """
+    the python translator reads RINEX 3 files directly.  the hybrid and fortran
+    translators read RINEX 2.11, so for them the file is translated with gfzrnx
+
+    parameters
+    ------------
+    rnx_filename : string
+        RINEX 3 filename. the python translator also accepts gzip/Hatanaka compressed files
+
+    r2 : string
+        RINEX 2.11 filename to be created
+
+    dec_rate : integer
+        decimation value
+
+    translator : string
+         hybrid, python, or fortran 
+
+    returns
+    ----------
+    fexists : boolean
+        whether a file is ready for the translator
+
+    rinex3file : string
+        RINEX 3 filename to be given to conv2snr. None if the RINEX 2.11 file was made instead
+
+    """
+    if translator == 'python':
+        fexists = os.path.exists(rnx_filename)
+        if fexists:
+            return fexists, rnx_filename
+        return fexists, None
+    fexists = g.new_rinex3_rinex2(rnx_filename,r2,dec_rate)
+    return fexists, None
+
+
+def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,fortran,translator,rinex3file=None,binary=False):
     """
     parameters
     ------------
@@ -308,6 +368,14 @@ def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,f
     translator : string
          hybrid, python, or fortran 
 
+    rinex3file : string, optional
+         RINEX 3 file on disk (can be gzip and/or Hatanaka compressed), used instead of 
+         looking for a RINEX 2.11 file. only the python translator reads RINEX 3.
+         this file is not removed
+
+    binary : boolean, optional
+         also write a binary copy of the SNR file, which the SNR readers use instead of the text file
+
     """
     # define directory for the conversion executables
     if not os.path.isdir('logs'):
@@ -336,7 +404,10 @@ def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,f
             rinexfile,rinexfiled = g.rinex_name(station, year, month, day)
             # This goes to find the rinex file. I am changing it to allow 
             # an archive preference 
-            if receiverrate == 'high':
+            if rinex3file is not None:
+                # RINEX 3 file already on disk - no need for a RINEX 2.11 version
+                rinexfile = rinex3file
+            elif receiverrate == 'high':
                 strip_snr = False # for now - 
                 file_name, foundit = k.rinex2_highrate(station, year, doy,archive,strip_snr)
             else:
@@ -426,7 +497,8 @@ def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,f
 #                        print(' Exec time:', '{0:4.2f}'.format(t2-t1) )
 
                 # remove the rinex file
-                subprocess.call(['rm', '-f',rinexfile])
+                if rinex3file is None:
+                    subprocess.call(['rm', '-f',rinexfile])
 
                 if os.path.isfile(snrname): 
 #                make sure it exists and is non-zero size before moving it
@@ -439,6 +511,8 @@ def conv2snr(year, doy, station, option, orbtype,receiverrate,dec_rate,archive,f
                         print('\n')
                         print('SUCCESS: SNR file was created:', snrname_full)
                         g.store_snrfile(snrname,year,station) 
+                        if binary:
+                            snr.write_binary_snr(snrname_full)
                 else:
                     print('No SNR file was created - check logs section for additional information')
             else:
@@ -515,18 +589,70 @@ def satorb(week, sec_of_week, ephem):
     return np.array([xk, yk, zk])
 
 
-def rnx2snr(obsfile, navfile,snrfile,snroption,year,month,day,dec_rate,log):
+def orbit_product(orbfile):
+    """
+    orbit product for one orbit file, i.e. usually one day. It only depends on
+    the orbit file, so within one python process it is made once and reused for
+    later translations of that day. rinex2snr does one station per run, so reuse
+    across stations in this process requires gnssrefl_worker. Other processes
+    only share the parsed orbit file, through the binary caches written next to
+    it by g.read_sp3file and g.myreadnav; the interpolation is redone in each.
+
+    parameters
+    ----------
+    orbfile : str
+        broadcast navigation file or sp3 file
+
+    returns
+    -------
+    product : g.EphemerisIndex or dictionary
+        for a nav file, the ephemeris index. for an sp3 file, a dictionary with
+        satellite numbers (as in g.read_sp3file) as keys and the x,y,z
+        interpolating functions of GPS seconds of the week as values
+        (quadratic splines, with extrapolation). None if the file has no orbits
+    """
+    key = (os.path.abspath(orbfile), os.stat(orbfile).st_mtime_ns)
+    if key in _orbit_products:
+        return _orbit_products[key]
+
+    if orbfile[-3::] in ['SP3', 'sp3']:
+        sp3 = g.read_sp3file(orbfile)
+        product = {}
+        for satNu in np.unique(sp3[:,0]):
+            m = sp3[:,0] == satNu
+            # same interpolation as interp1d quadratic
+            product[int(satNu)] = interpolate.make_interp_spline(sp3[m,2], sp3[m,3:6], k=2)
+        if len(product) == 0:
+            product = None
+    else:
+        ephemdata = g.myreadnav(orbfile)
+        if len(ephemdata) == 0:
+            product = None
+        else:
+            product = g.EphemerisIndex(ephemdata)
+
+    # one day at a time is the usual case, so only keep a few
+    if len(_orbit_products) >= 4:
+        _orbit_products.pop(next(iter(_orbit_products)))
+    _orbit_products[key] = product
+    return product
+
+
+def rnx2snr(obsfile, navfile,snrfile,snroption,year,month,day,dec_rate,log,chunksize=3600):
     """
-    inputs are obsfile - RINEX 2.11
+    inputs are obsfile - RINEX 2.11 or RINEX 3, gzip and Hatanaka compression allowed
     navfile, which can be nav message or sp3 file
     snrfile: where the results go
     snroption: integer
     year,month,day:  what it sounds like, integer
     dec_rate: integer I think, decimation rate. For fortran users, this is done with teqc
+    chunksize: integer, number of epochs read from the RINEX file at a time.
+        memory use is proportional to this rather than to the length of the file
 
     no output - the output is the snrfile that is created
 
-    This only works for rinex v2.11.  
+    RINEX 3 SNR signals are merged into S1, S2, etc using the same choices
+    as the gfzrnx translation (see g.myfavoriteobs)
     Kristine M. Larson August 2020
     This relies on Joakim's rinex reading code
     """
@@ -544,9 +670,8 @@ def rnx2snr(obsfile, navfile,snrfile,snroption,year,month,day,dec_rate,log):
     emin,emax = elev_limits(snroption)
 
     exitQ = False
-    obsdata, systemsatlists, prntoidx, obstypes, header, obstimes,gpstime = rinpy.processrinexfile(obsfile)
-    obsdata = rinpy.separateobservables(obsdata, obstypes)
-    obslist = obstypes['G'][:] 
+    rinex3 = (rinpy.getrinexversion(obsfile)[0] == '3')
+    header = rinpy.readrinexheader(obsfile)
     # need to check to see what happens without coordinates
     key = 'APPROX POSITION XYZ' 
     if key in header.keys():
@@ -567,47 +692,78 @@ def rnx2snr(obsfile, navfile,snrfile,snroption,year,month,day,dec_rate,log):
     lat, lon, h = g.xyz2llh(recv,1e-8) # returns lat/lon in radians
     up,East,North = g.up(lat,lon) # returns unit vector for UP
 
-
-# set defaults
-    s5exist = False; s1exist = False; s2exist = False;
-    if 'S1' in obslist :
-        s1exist = True
-    if 'S2' in obslist :
-        s2exist = True
-    if 'S5' in obslist :
-        s5exist = True
-    if not s1exist and not s2exist: 
-        log.write('There are no S1 and no S2 data - this file is not useful for reflectometry \n')
-        exitQ = True
+    if not os.path.isfile(navfile):
+        log.write("The orbit file does not exist \n")
+        return
     if (orbtype == 'nav'):
-        gpssatlist = systemsatlists['G'][:] 
-        #print('GPS satellite list', gpssatlist)
-        navorbits(navfile,obstimes,obsdata,obslist,prntoidx,gpssatlist,snrfile,s1exist,s2exist,s5exist,up,East,North,emin,emax,recv,dec_rate,log)
+        log.write('reading the ephemeris data \n')
+        ephemdata = orbit_product(navfile)
+        if ephemdata is None:
+            log.write("Empty ephemeris or the file does not exist \n")
+            return
     else:
-        log.write('Read the sp3 file \n'); sp3 = g.read_sp3file(navfile)
-        testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day,emin,emax,snrfile,up,East,North,recv,dec_rate,log)
-        #test_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day,emin,emax,snrfile,up,East,North,recv,dec_rate,log)
+        log.write('Read the sp3 file \n'); sp3 = orbit_product(navfile)
+        if sp3 is None:
+            log.write("Empty sp3 file \n")
+            return
+
+    log.write('Opening output file for the SNR data \n')
+    fout = open(snrfile, 'w+')
+    # the RINEX file is read chunksize epochs at a time so that memory does not scale with the file
+    # and only the SNR observables are decoded
+    for obsdata, systemsatlists, prntoidx, obstypes, header, obstimes,gpstime in rinpy.iterrinexfile(obsfile, chunksize, observables=['S*']):
+        if rinex3:
+            obsdata, obstypes = rinpy.mapsnrobservables(obsdata, obstypes)
+        obsdata = rinpy.separateobservables(obsdata, obstypes)
+        if (orbtype == 'nav'):
+            if 'G' not in obstypes:
+                continue
+            obslist = obstypes['G'][:] 
+# set defaults
+            s5exist = False; s1exist = False; s2exist = False;
+            if 'S1' in obslist :
+                s1exist = True
+            if 'S2' in obslist :
+                s2exist = True
+            if 'S5' in obslist :
+                s5exist = True
+            if not s1exist and not s2exist: 
+                log.write('There are no S1 and no S2 data - this file is not useful for reflectometry \n')
+                exitQ = True
+            gpssatlist = systemsatlists['G'][:] 
+            #print('GPS satellite list', gpssatlist)
+            navorbits(ephemdata,obstimes,obsdata,obslist,prntoidx,gpssatlist,fout,s1exist,s2exist,s5exist,up,East,North,emin,emax,recv,dec_rate,log)
+        else:
+            testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day,emin,emax,fout,up,East,North,recv,dec_rate,log)
+    fout.close()
 
     #print('Closing python RINEX conversion log file:',logname)
     #log.close()
 
-def navorbits(navfile,obstimes,observationdata,obslist,prntoidx,gpssatlist,snrfile,s1exist,s2exist,s5exist,up,East,North,emin,emax,recv,dec_rate,log):
+def navorbits(ephemdata,obstimes,observationdata,obslist,prntoidx,gpssatlist,fout,s1exist,s2exist,s5exist,up,East,North,emin,emax,recv,dec_rate,log):
     """
     parameters : 
 
-    navfile : string
+    ephemdata : g.EphemerisIndex
+        broadcast ephemeris, as read by g.myreadnav
 
-    obstimes : ??
+    obstimes : list of datetime objects
+        observation epochs
 
-    observationdata :
+    observationdata : dictionary
+        SNR data, as returned by rinpy.separateobservables
 
-    obslist : 
+    obslist : list of str
+        GPS observables
 
-    prn2oidx : 
+    prn2oidx : dictionary
+        index of each satellite in the observation arrays
 
-    gpssatlist :
+    gpssatlist : list of integers
+        GPS satellites in the file
 
-    snrfile : 
+    fout : file object
+        open SNR output file
 
     s1exist :
 
@@ -616,55 +772,59 @@ def navorbits(navfile,obstimes,observationdata,obslist,prntoidx,gpssatlist,snrfi
     s5exist :
 
     This is for GPS only files !
-    navfile is nav broadcast ephemeris in RINEX format
     inputs are rinex info, obstimes, observationdata,prntoidx,gpssatlist
     various bits about SNR existence
-    snrfile is output name
+    the SNR records are written to fout, which is closed by the caller
     log is for screen outputs - now going to a file
+
+    orbits, elevation and azimuth angles are computed for all epochs and satellites
+    at once. the records are written in the same order as before, i.e. by epoch
+    and then by satellite
     """
-    log.write('reading the ephemeris data \n')
-    ephemdata = g.myreadnav(navfile)
-    if len(ephemdata) == 0:
-        log.write("Empty ephemeris or the file does not exist \n")
+    K=len(obstimes)
+    log.write('Number of epochs in the RINEX file {0:6.0f} \n '.format( K))
+    log.write('Decimation rate {0:3.0f} \n'.format(dec_rate))
+    nsat = len(gpssatlist)
+    if (K == 0) or (nsat == 0):
         return
+    # sod is seconds of the day
+    sod = np.array([3600*a.hour + 60*a.minute + a.second for a in obstimes])
+    gpstime = np.array([g.kgpsweek(a.year, a.month, a.day, a.hour, a.minute, a.second) for a in obstimes])
+    keep = np.ones(K, dtype=bool)
+    if dec_rate > 0:
+        keep = (sod % dec_rate) == 0
+
+    # SNR data for all epochs and satellites, missing values set to zero
+    snr = np.zeros((3, K, nsat))
+    cols = [prntoidx['G'][sat] for sat in gpssatlist]
+    for i, (exists, obs) in enumerate(zip([s1exist, s2exist, s5exist], ['S1', 'S2', 'S5'])):
+        if exists:
+            snr[i] = np.nan_to_num(observationdata['G'][obs][:, cols])
+
+    # closest ephemeris for every epoch and satellite that has S1 data
+    use = (snr[0] > 0) & keep[:, None]
+    closest = np.zeros((K, nsat, 32))
+    for j, sat in enumerate(gpssatlist):
+        ii = np.nonzero(use[:, j])[0]
+        if len(ii) == 0:
+            continue
+        e = ephemdata.closest(sat, gpstime[ii, 0], gpstime[ii, 1])
+        if len(e) == 0:
+            use[:, j] = False
+        else:
+            closest[ii, j] = e
 
-    # change variable name to save typing
-    a=obstimes
-    if True:
-        log.write('Opening output file for the SNR data \n')
-        fout = open(snrfile, 'w+')
-        K=len(obstimes)
-        log.write('Number of epochs in the RINEX file {0:6.0f} \n '.format( K))
-        log.write('Decimation rate {0:3.0f} \n'.format(dec_rate))
-
-        with Bar('Processing RINEX', max=K,fill='@',suffix='%(percent)d%%') as bar:
-            for i in range(0,K):
-                bar.next()
-                if np.remainder(i,200) == 0:
-                    log.write('Epoch {0:6.0f} \n'.format( i))
-            # sod is seconds of the day
-                sod = 3600*a[i].hour + 60*a[i].minute + a[i].second
-                if dec_rate > 0:
-                    rem = sod % dec_rate
-                else:
-                    rem = 0
-                if (rem == 0):
-                    gweek, gpss = g.kgpsweek(a[i].year, a[i].month, a[i].day, a[i].hour, a[i].minute, a[i].second)
-                    for sat in gpssatlist:
-                        s1,s2,s5 = readSNRval(s1exist,s2exist,s5exist,observationdata,prntoidx,sat,i)
-                        if (s1 > 0):
-                            closest = g.myfindephem(gweek, gpss, ephemdata, sat)
-                            if len(closest) > 0:
-                                satv = satorb_prop(gweek, gpss, sat, recv, closest)
-                                r=np.subtract(satv,recv) # satellite minus receiver vector
-                                eleA = g.elev_angle(up, r)*180/np.pi
-                                azimA = g.azimuth_angle(r, East, North)
-                                if (eleA >= emin) and (eleA <= emax):
-                                    fout.write("{0:3.0f} {1:10.4f} {2:10.4f} {3:10.0f} {4:7.2f} {5:7.2f} {6:7.2f} {7:7.2f} {8:7.2f} \n".format(sat,eleA, azimA, sod,0, 0, s1,s2, s5))
-        fout.close()
-    else:
-        log.write('There was some kind of problem with your file, exiting ...\n')
-        print('There was some kind of problem with your file, exiting ...')
+    # (epoch, satellite) pairs, in the order they are written out
+    ii, jj = np.nonzero(use)
+    if len(ii) == 0:
+        return
+    satv = satorb_prop_vector(gpstime[ii, 0], gpstime[ii, 1], recv, closest[ii, jj])
+    r = satv - recv # satellite minus receiver vector
+    eleA, azimA = g.elev_azim_angles(up, East, North, r)
+    m = (eleA >= emin) & (eleA <= emax)
+    sats = np.array(gpssatlist)[jj]
+    out = np.vstack((sats, eleA, azimA, sod[ii], np.zeros(len(ii)), np.zeros(len(ii)), snr[0, ii, jj], snr[1, ii, jj], snr[2, ii, jj])).T
+    np.savetxt(fout, out[m], fmt='%3.0f %10.4f %10.4f %10.0f %7.2f %7.2f %7.2f %7.2f %7.2f ')
 
 def readSNRval(s1exist,s2exist,s5exist,observationdata,prntoidx,sat,i):
     """
@@ -747,6 +907,106 @@ def satorb_prop(week, secweek, prn, rrec0, closest_ephem):
     return SatOrbn
 
 
+def satorb_vector(week, sec_of_week, ephem):
+    """
+    vectorized version of satorb
+
+    parameters
+    ---------
+
+    week : numpy array of integers
+        GPS week. as in satorb, the week in the ephemeris block is what is used
+
+    sec_of_week : numpy array of floats
+        GPS seconds of the week
+
+    ephem : numpy array
+        one ephemeris block per time (N x 32)
+
+    returns 
+    -----------
+    numpy array (N x 3)
+         the x,y,z, coordinates of the satellite in meters
+
+    """
+    e = np.atleast_2d(ephem)
+    delta_n = e[:,8]; M0 = e[:,9]; Cuc = e[:,10]; ecc = e[:,11]; Cus = e[:,12]
+    sqrta = e[:,13]; Toe = e[:,14]; Cic = e[:,15]; Loa = e[:,16]; Cis = e[:,17]
+    incl = e[:,18]; Crc = e[:,19]; perigee = e[:,20]; radot = e[:,21]
+    idot = e[:,22]; Crs = e[:,7]; week = e[:,24]
+    # semi-major axis
+    a = sqrta**2
+    t = week*7*86400+sec_of_week
+    tk = t-Toe
+    tk  =  (tk - 302400) % (302400*2) - 302400
+    n0 = np.sqrt(constants.mu/a**3)
+    n = n0+ delta_n
+    Mk = M0 + n*tk
+    i = 0
+    Ek = Mk
+    E0 = Mk + ecc*np.sin(Mk)
+    # solve kepler's equation for all times together
+    while(i < 3 or np.max(np.abs(Ek-E0)) > 1e-12):
+        i +=1
+        Ek = Mk + ecc*np.sin(E0)
+        E0 = Mk + ecc*np.sin(Ek)
+    nuk = np.arctan2(np.sqrt(1-ecc**2)*np.sin(Ek),np.cos(Ek)-ecc)
+    Phik = nuk + perigee
+    duk = Cus*np.sin(2*Phik)+Cuc*np.cos(2*Phik)
+    drk = Crs*np.sin(2*Phik)+Crc*np.cos(2*Phik)
+    dik = Cis*np.sin(2*Phik)+Cic*np.cos(2*Phik)
+    uk = Phik + duk
+    rk = a*(1-ecc*np.cos(Ek))+drk
+
+    ik = incl+dik+idot*tk
+    xkp = rk*np.cos(uk)
+    ykp = rk*np.sin(uk)
+    Omegak = Loa + (radot-constants.omegaEarth)*tk -constants.omegaEarth*Toe
+    xk = xkp*np.cos(Omegak)-ykp*np.cos(ik)*np.sin(Omegak)
+    yk = xkp*np.sin(Omegak)+ykp*np.cos(ik)*np.cos(Omegak)
+    zk = ykp*np.sin(ik)
+    return np.vstack((xk, yk, zk)).T
+
+
+def satorb_prop_vector(week, secweek, rrec0, closest_ephem):
+    """
+    vectorized version of satorb_prop: satellite coordinates at transmission time,
+    rotated into the ECEF frame at reception time, for many times at once
+
+    paramters :
+    week : numpy array of integers
+        GPS week
+
+    secweek : numpy array
+        GPS second of the week
+
+    rrec0 : 3vector
+        receiver coordinates, meters
+
+    closest_ephem : numpy array
+        one ephemeris block per time (N x 32)
+
+    returns
+    -------
+    SatOrbn : numpy array (N x 3)
+        satellite coordinates in meters
+
+    """
+    # might as well start with 70 milliseconds
+    SatOrb = satorb_vector(week, secweek-0.07, closest_ephem)
+    deltaT = np.sqrt(np.sum((SatOrb - rrec0)**2, axis=1))/constants.c
+    # should not need more than two iterations, since i am
+    #starting with 70 msec
+    for k in range(2):
+        SatOrb = satorb_vector(week, secweek-deltaT, closest_ephem)
+        Th = -constants.omegaEarth * deltaT
+        xs = SatOrb[:,0]*np.cos(Th)-SatOrb[:,1]*np.sin(Th)
+        ys = SatOrb[:,0]*np.sin(Th)+SatOrb[:,1]*np.cos(Th)
+        SatOrbn = np.vstack((xs, ys, SatOrb[:,2])).T
+        deltaT = np.sqrt(np.sum((SatOrbn - rrec0)**2, axis=1))/constants.c
+    return SatOrbn
+
+
 def satorb_prop_sp3(iX,iY,iZ,recv,Tp,ij):
     """
     for satellite number prn
@@ -786,6 +1046,41 @@ def satorb_prop_sp3(iX,iY,iZ,recv,Tp,ij):
 
     return SatOrbn
 
+def satorb_prop_sp3_vector(iXYZ,recv,Tp):
+    """
+    vectorized version of satorb_prop_sp3, for all epochs of a satellite at once
+
+    parameters 
+    ------------
+    iXYZ : scipy interpolating function
+        returns the sp3 x,y,z coordinates (meters, N x 3) for GPS seconds of the week
+
+    recv : 3 vector, float
+        receiver coordinates, meters
+
+    Tp : numpy array of floats
+        GPS seconds of the week
+
+    returns
+    -------
+    SatOrbn : numpy array (N x 3)
+        satellite coordinates in meters, rotated for the Earth rotation during the light time
+    """
+    oE = constants.omegaEarth
+    c = constants.c
+    # start with 70 milliseconds as the guess for the transmission time
+    SatOrb = iXYZ(Tp-0.07)
+    tau = np.sqrt(np.sum((SatOrb-recv)**2, axis=1))/c
+    for k in range(2):
+        SatOrb = iXYZ(Tp-tau)
+        Th = -oE * tau
+        xs = SatOrb[:,0]*np.cos(Th)-SatOrb[:,1]*np.sin(Th)
+        ys = SatOrb[:,0]*np.sin(Th)+SatOrb[:,1]*np.cos(Th)
+        SatOrbn = np.vstack((xs, ys, SatOrb[:,2])).T
+        tau = np.sqrt(np.sum((SatOrbn-recv)**2, axis=1))/c
+
+    return SatOrbn
+
 def test_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day, emin,emax,outputfile,up,East,North,recv,dec_rate,log):
     """
     inputs are gpstime( numpy array with week and sow)
@@ -821,9 +1116,9 @@ def test_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day
                     x = sp3[m,3] ; y = sp3[m,4] ; z = sp3[m,5]
                 # fit the orbits for this satellite
                     t=sp3_sec
-                    iX= interp1d(t, x, ll,bounds_error=False,fill_value='extrapolate')
-                    iY= interp1d(t, y, ll,bounds_error=False,fill_value='extrapolate')
-                    iZ= interp1d(t, z, ll,bounds_error=False,fill_value='extrapolate')
+                    iX= interpolate.interp1d(t, x, ll,bounds_error=False,fill_value='extrapolate')
+                    iY= interpolate.interp1d(t, y, ll,bounds_error=False,fill_value='extrapolate')
+                    iZ= interpolate.interp1d(t, z, ll,bounds_error=False,fill_value='extrapolate')
         # get the S1 data for this satellite
                     if 'S1' in obslist:
                         s1 = obsdata[con]['S1'][:, prntoidx[con][prn]]
@@ -936,11 +1231,12 @@ def testit(input):
     return True
 
 
-def testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day, emin,emax,outputfile,up,East,North,recv,dec_rate,log):
+def testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day, emin,emax,fout,up,East,North,recv,dec_rate,log):
     """
     inputs are gpstime( numpy array with week and sow)
-    sp3 is what has been read from the sp3 file
-    columsn are satNu, week, sow, x, y, z (in meters)
+    sp3 is the orbit product made from the sp3 file (see orbit_product),
+    i.e. x,y,z interpolating functions for each satellite
+    fout is the open SNR output file, it is closed by the caller
     log is for comments
     """
     checkD = False
@@ -950,11 +1246,6 @@ def testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,
     # epoch at the beginning of the day of your RINEX file
     gweek0, gpssec0 = g.kgpsweek(year, month,day,0,0,0 )
 
-    ll = 'quadratic'
-#   will store in this variable, then sort it before writing out to a file
-    saveit = np.empty(shape=[0,11] )
-    fout = open(outputfile, 'w+')
-    NsatT = 0
     # make a dictionary for constellation name
     sname ={}; sname['G']='GPS' ; sname['R'] = 'GLONASS'; sname['E'] = 'GALILEO'; sname['C']='BEIDOU'
     for con in ['G','E','R','C']:
@@ -969,54 +1260,44 @@ def testing_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,
                     bar.next()
                     addon = g.findConstell(con) # 100,200,or 300 for R,E, and C 
                     log.write('Constellation {0:1s} Satellite {1:2.0f}  Addon {2:3.0f} \n'.format( con, prn, addon))
-                # window out the data for this satellite
-                    m = sp3[:,0] == prn + addon
-                    x = sp3[m,3]
-                    if len(x) > 0:
-                        sp3_week = sp3[m,1] ; sp3_sec = sp3[m,2]
-                        x = sp3[m,3] ; y = sp3[m,4] ; z = sp3[m,5]
-                # fit the orbits for this satellite
-                        t=sp3_sec
-                        iX= interp1d(t, x, ll,bounds_error=False,fill_value='extrapolate')
-                        iY= interp1d(t, y, ll,bounds_error=False,fill_value='extrapolate')
-                        iZ= interp1d(t, z, ll,bounds_error=False,fill_value='extrapolate')
+                # interpolating functions for this satellite
+                    if prn + addon in sp3:
+                        iXYZ = sp3[prn + addon]
         # get the S1 data for this satellite
-                        if 'S1' in obslist:
-                            s1 = obsdata[con]['S1'][:, prntoidx[con][prn]]
+                        if 'S1' not in obslist:
+                            log.write('No S1 data for this satellite \n')
+                            continue
+                        s1 = obsdata[con]['S1'][:, prntoidx[con][prn]]
 
         # indices when there are no data for this satellite
                         ij = np.isnan(s1)
         # indices when there are data in the RINEX file - this way you do not compute 
         # orbits unless there are data.
                         not_ij = np.logical_not(ij)
+                        if checkD:
+                            not_ij = not_ij & (gpstime[:,1] % dec_rate == 0)
                         Tp = gpstime[not_ij,1] # only use the seconds of the week for now
+                        if len(Tp) == 0:
+                            continue
                         s1 = s1[not_ij]; 
-                    #print(s1.shape)
                         emp = np.zeros(shape=[len(s1),1],dtype=float)
         # get the rest of the SNR data in a function
                         s2,s5,s6,s7,s8 = extract_snr(prn, con, obslist,obsdata,prntoidx,not_ij,emp)
-        # make sure there are no nan values in s2 or s5
 
-                        nepochs = len(Tp)
-                        for ij in range(0,nepochs):
-                            TT = 0 # default value
-                            if checkD:
-                                TT = Tp[ij]  % dec_rate # get the modulus
-                            if TT == 0:
-                                SatOrb = satorb_prop_sp3(iX,iY,iZ,recv,Tp,ij) 
-                                r=np.subtract(SatOrb,recv)
-                                azimA = g.azimuth_angle(r, East, North)
-                                eleA = g.elev_angle(up, r)*180/np.pi
-                                if (eleA >= emin) and (eleA <= emax):
-                                    # bug reported by Andrea Gatti. 2021 October 26
-                                    fout.write("{0:3.0f} {1:10.4f} {2:10.4f} {3:10.0f} {4:7.2f} {5:7.2f} {6:7.2f} {7:7.2f} {8:7.2f} {9:7.2f} {10:7.2f} \n".format( 
-                                        prn+addon,eleA,azimA,Tp[ij]-gpssec0, 0,float(s6[ij]),s1[ij],float(s2[ij]),float(s5[ij]),float(s7[ij]),float(s8[ij]) ))
+        # orbits, elevation and azimuth angles for all epochs at once
+                        SatOrb = satorb_prop_sp3_vector(iXYZ,recv,Tp)
+                        r=np.subtract(SatOrb,recv)
+                        eleA, azimA = g.elev_azim_angles(up, East, North, r)
+                        # bug reported by Andrea Gatti. 2021 October 26
+                        m = (eleA >= emin) & (eleA <= emax)
+                        out = np.vstack((np.full(len(Tp), prn+addon), eleA, azimA, Tp-gpssec0, np.zeros(len(Tp)),
+                            np.ravel(s6), s1, np.ravel(s2), np.ravel(s5), np.ravel(s7), np.ravel(s8))).T
+                        np.savetxt(fout, out[m], fmt='%3.0f %10.4f %10.4f %10.0f %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f ')
                     else:
                         log.write('This satellite is not in the orbit file. {0:3.0f} \n'.format(prn))
         else:
             log.write('No data for constellation {0:1s} \n'.format(con))
-    log.write('write SNR data to file \n')
-    fout.close()
+    log.write('wrote SNR data to file \n')
 
                     # only do this for the older version
                     #print('teqc executable exists, will use to eliminate unnecessary observables')
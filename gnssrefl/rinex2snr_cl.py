@@ -48,11 +48,12 @@ def parse_arguments():
     parser.add_argument("-mk", default=None, help="use True for uppercase station names ", type=str)
     parser.add_argument("-weekly", default=None, help="use True for weekly data translation", type=str)
     parser.add_argument("-cddis_offline", default=None, help="use True when CDDIS is offline", type=str)
+    parser.add_argument("-binary", default=None, help="use True to also write binary SNR files, which are faster to read", type=str)
 
     args = parser.parse_args().__dict__
 
     # convert all expected boolean inputs from strings to booleans
-    boolean_args = ['nolook', 'fortran', 'overwrite', 'mk', 'weekly','cddis_offline']
+    boolean_args = ['nolook', 'fortran', 'overwrite', 'mk', 'weekly','cddis_offline','binary']
     args = str2bool(args, boolean_args)
 
     # only return a dictionary of arguments that were added from the user - all other defaults will be set in code below
@@ -62,7 +63,8 @@ def parse_arguments():
 def rinex2snr(station: str, year: int, doy: int, snr: int = 66, orb: str = 'nav', rate: str = 'low', dec: int = 0,
               fortran: bool = False, nolook: bool = False, archive: str = 'all', doy_end: int = None,
               year_end: int = None, overwrite: bool = False, translator: str = 'hybrid', samplerate: int = 30,
-              stream: str = 'R', mk: bool = False, weekly: bool = False, cddis_offline: bool = False):
+              stream: str = 'R', mk: bool = False, weekly: bool = False, cddis_offline: bool = False,
+              binary: bool = False):
     """
         rinex2snr translates RINEX files to an SNR format. This function will fetch orbit files for you.
 
@@ -174,6 +176,10 @@ def rinex2snr(station: str, year: int, doy: int, snr: int = 66, orb: str = 'nav'
         cddis_offline: boolean, optional
             alert the system if CDDIS is failing
 
+        binary: boolean, optional
+            also write a binary copy of each SNR file. The SNR readers use it instead of the text file.
+            Default is False.
+
 
         """
     # validate parameter types
@@ -356,7 +362,7 @@ def rinex2snr(station: str, year: int, doy: int, snr: int = 66, orb: str = 'nav'
     args = {'station': station, 'year_list': year_list, 'doy_list': doy_list, 'isnr': snr, 'orbtype': orb,
             'rate': rate, 'dec_rate': dec, 'archive': archive, 'fortran': fortran, 'nol': nolook,
             'overwrite': overwrite, 'translator': translator, 'srate': samplerate, 'mk': mk,
-            'skipit': skipit, 'stream': stream}
+            'skipit': skipit, 'stream': stream, 'binary': binary}
 
     s1 = time.time()
     rnx.run_rinex2snr(**args)
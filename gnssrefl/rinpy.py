@@ -1,9 +1,11 @@
 import numpy as np
 import re
 import datetime
-import struct
+import fnmatch
+from contextlib import closing
 
 import gnssrefl.gps as g
+import gnssrefl.hatanaka as hatanaka
 
 # Joakim Strandberg wrote this code originally-
 # I made some small changes ???  Kristine M. Larson
@@ -19,21 +21,45 @@ def getrinexversion(filename):
     Parameters
     ---------
     filename : str
-        Filename of the rinex file
+        Filename of the rinex file. gzip and Hatanaka compressed files are allowed.
 
     Returns
     -------
     version : str
         Version number.
     """
-    with open(filename, 'r') as f:
-        line = f.readline()
-        while 'RINEX VERSION / TYPE' not in line:
-            line = f.readline()
-
+    with closing(hatanaka.open_rinex(filename)) as f:
+        for line in f:
+            if 'RINEX VERSION / TYPE' in line:
+                return line[:9].strip()
             if 'END OF HEADER' in line:
-                raise RinexError("No 'RINEX VERSION / TYPE' found.")
-    return line[:9].strip()
+                break
+    raise RinexError("No 'RINEX VERSION / TYPE' found.")
+
+
+def readrinexheader(filename):
+    """ Read only the header section of a RINEX file.
+
+    Parameters
+    ---------
+    filename : str
+        Filename of the rinex file. gzip and Hatanaka compressed files are allowed.
+
+    Returns
+    -------
+    header : dict
+        Dict containing the header information from the RINEX file, same format as processrinexfile.
+    """
+    header = {}
+    with closing(hatanaka.open_rinex(filename)) as f:
+        for line in f:
+            if "END OF HEADER" in line:
+                break
+            if line[60:80].strip() not in header:  # Header label
+                header[line[60:80].strip()] = line[:60]  # don't strip for fixed-width parsers
+            else:
+                header[line[60:80].strip()] += "\n"+line[:60]
+    return header
 
 
 def readheader(lines, rinexversion):
@@ -114,7 +140,7 @@ def _readheader_v21x(lines):
     obstimes = []
     epochsatlists = []
     # for those of who do not like datetime
-    gpstime = np.empty(shape=[0, 2])
+    gpstime = []
     satset = set()
 
     century = int(timeoffirstobs[0][:2]+'00')
@@ -138,8 +164,7 @@ def _readheader_v21x(lines):
                                                   microsecond=int(float(second) % 1 * 100000)))
 
                 week, sow = g.kgpsweek(century+int(year), int(month), int(day), int(hour), int(minute), int(float(second)))
-                ne = np.array((week,sow))
-                gpstime = np.vstack((gpstime,ne))
+                gpstime.append((week, sow))
 
                 numsats = int(lines[i][29:32])  # Number of visible satellites %i3
                 headerlengths.append(1 + (numsats-1)//12)  # number of lines in header, depends on how many svs on view
@@ -170,6 +195,8 @@ def _readheader_v21x(lines):
     for satlist in epochsatlists:
         satset = satset.union(satlist)
 
+    gpstime = np.array(gpstime, dtype=float).reshape(-1, 2)
+
     return header, headerlines, headerlengths, obstimes, epochsatlists, satset, gpstime 
 
 
@@ -194,6 +221,7 @@ def _readheader_v3(lines):
     headerlines = []
     obstimes = []
     epochsatlists = []
+    gpstime = []
     satset = set()
 
     while i < len(lines):
@@ -210,7 +238,10 @@ def _readheader_v3(lines):
                                                   second=int(float(second)),
                                                   microsecond=int(float(second) % 1 * 100000)))
 
-                numsats = int(lines[i][33:35])  # Number of visible satellites %i3
+                week, sow = g.kgpsweek(int(year), int(month), int(day), int(hour), int(minute), int(float(second)))
+                gpstime.append((week, sow))
+
+                numsats = int(lines[i][32:35])  # Number of visible satellites %i3
 
                 sv = []
                 for j in range(numsats):
@@ -232,8 +263,10 @@ def _readheader_v3(lines):
     for satlist in epochsatlists:
         satset = satset.union(satlist)
 
+    gpstime = np.array(gpstime, dtype=float).reshape(-1, 2)
+
     headerlengths = None
-    return header, headerlines, headerlengths, obstimes, epochsatlists, satset
+    return header, headerlines, headerlengths, obstimes, epochsatlists, satset, gpstime
 
 
 def _converttofloat(numberstr):
@@ -243,7 +276,70 @@ def _converttofloat(numberstr):
         return np.nan
 
 
-def _readblocks(lines, rinexversion, header, headerlines, headerlengths, epochsatlists, satset):
+def _selectobservables(obstypes, observables):
+    """ Return the indices of the observables that match the requested patterns.
+
+    Parameters
+    ----------
+    obstypes : list[str]
+        Observables listed in the RINEX header, in column order.
+
+    observables : list[str] or None
+        Observables to keep. Shell-style wildcards are allowed, e.g. ['S*'] for all SNR observables.
+        None keeps everything.
+
+    Returns
+    -------
+    kept : list[int]
+        Column indices of the wanted observables.
+    """
+    if observables is None:
+        return list(range(len(obstypes)))
+    return [i for i, obstype in enumerate(obstypes)
+            if any(fnmatch.fnmatchcase(obstype, pattern) for pattern in observables)]
+
+
+def _chararray(datalines, width):
+    """ Fixed-width character array, one row per line, padded with blanks to width. """
+    chars = np.array([line.rstrip('\r\n') for line in datalines], dtype='S%d' % width).view(np.uint8)
+    chars = chars.reshape(len(datalines), width).copy()
+    chars[chars == 0] = 32
+    return chars
+
+
+def _fixedwidth_fields(chars, offsets):
+    """ Convert F14.3 fields of fixed-width records to floats in one vectorized pass.
+
+    Parameters
+    ----------
+    chars : nd-array
+        nrecords x width array of characters (uint8), see _chararray.
+
+    offsets : list[int]
+        Starting column of each field to decode.
+
+    Returns
+    -------
+    data : nd-array
+        nrecords x len(offsets) array of floats. Blank fields are NaN.
+    """
+    data = np.nan * np.zeros((chars.shape[0], len(offsets)))
+    for k, offset in enumerate(offsets):
+        field = chars[:, offset:offset+14]
+        filled = np.any(field != 32, axis=1)
+        if not np.any(filled):
+            continue
+        numbers = np.ascontiguousarray(field[filled]).view('S14').ravel()
+        try:
+            data[filled, k] = numbers.astype(float)
+        except ValueError:
+            # something that is not a number - fall back to converting one field at a time
+            data[filled, k] = [_converttofloat(number.decode('ascii')) for number in numbers]
+
+    return data
+
+
+def _readblocks(lines, rinexversion, header, headerlines, headerlengths, epochsatlists, satset, observables=None):
     """ Read and return information in the blocks for the RINEX file
 
     Parameters
@@ -269,6 +365,9 @@ def _readblocks(lines, rinexversion, header, headerlines, headerlengths, epochsa
     satset : set(str)
         Set containing all satellites in the data.
 
+    observables : list[str], optional
+        Observables to decode, wildcards allowed. Default is all of them.
+
     Returns
     -------
     observationdata : dict
@@ -285,9 +384,9 @@ def _readblocks(lines, rinexversion, header, headerlines, headerlengths, epochsa
     """
     try:
         if '2.1' in rinexversion:
-            return _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, satset)
+            return _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, satset, observables)
         elif '3' in rinexversion:
-            return _readblocks_v3(lines, header, headerlines, epochsatlists, satset)
+            return _readblocks_v3(lines, header, headerlines, epochsatlists, satset, observables)
         else:
             raise RinexError('RINEX v%s is not supported.' % rinexversion)
 
@@ -296,7 +395,7 @@ def _readblocks(lines, rinexversion, header, headerlines, headerlengths, epochsa
 
 
 
-def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, satset):
+def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, satset, observables=None):
     """ Read the lines of data.
 
     Parameters
@@ -319,6 +418,9 @@ def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, sa
     satset : set(str)
         Set containing all satellites in the data.
 
+    observables : list[str], optional
+        Observables to decode, wildcards allowed. Default is all of them.
+
     Returns
     -------
     observationdata : dict
@@ -337,9 +439,12 @@ def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, sa
     --------
     processrinexfile : The wrapper.
     """
-    observables = header['# / TYPES OF OBSERV'][6:].split()
-    nobstypes = len(observables)
+    allobservables = header['# / TYPES OF OBSERV'][6:].split()
+    nobstypes = len(allobservables)
     rowpersat = 1 + (nobstypes-1) // 5
+    # only the requested columns are decoded
+    kept = _selectobservables(allobservables, observables)
+    obsnames = [allobservables[k] for k in kept]
     nepochs = len(headerlines)
 
     systemletters = set([letter for letter in set(''.join(satset)) if letter.isalpha()])
@@ -355,27 +460,39 @@ def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, sa
     for letter in systemletters:
         satlists[letter].sort()
         nsats = len(satlists[letter])
-        observationdata[letter] = np.nan * np.zeros((nepochs, nsats, nobstypes))
+        observationdata[letter] = np.nan * np.zeros((nepochs, nsats, len(kept)))
         prntoidx[letter] = {prn: idx for idx, prn in enumerate(satlists[letter])}
-        obstypes[letter] = observables  # Proofing for V3 functionality
-
-    fmt = '14s 2x '*nobstypes
-    fieldstruct = struct.Struct(fmt)
-    parse = fieldstruct.unpack_from
+        obstypes[letter] = obsnames  # Proofing for V3 functionality
 
+    # every observation record of the file, i.e. rowpersat lines per satellite per epoch,
+    # is located first and then all fields are decoded in one vectorized pass
+    datalines = []
+    recepochs = []
+    recsats = []
     for iepoch, (headerstart, headerlength, satlist) in enumerate(zip(headerlines, headerlengths, epochsatlists)):
-        for i, sat in enumerate(satlist):
-            datastring = ''.join(["{:<80}".format(line.rstrip()) for line in
-                                  lines[headerstart+headerlength+rowpersat*i:headerstart+headerlength+rowpersat*(i+1)]])
-            try:
-                data = np.array([_converttofloat(number.decode('ascii')) for number in parse(datastring.encode('ascii'))])
-
-                systemletter = sat[0]
-                prn = int(sat[1:])
-
-                observationdata[systemletter][iepoch, prntoidx[systemletter][prn], :] = data
-            except struct.error:
-                continue
+        first = headerstart + headerlength
+        block = lines[first:first + rowpersat*len(satlist)]
+        if len(block) < rowpersat*len(satlist):
+            # truncated file - pad with empty lines so the missing fields become NaN
+            block = block + ['']*(rowpersat*len(satlist) - len(block))
+        datalines.extend(block)
+        recepochs.extend([iepoch]*len(satlist))
+        recsats.extend(satlist)
+
+    if len(recsats) > 0 and len(kept) > 0:
+        chars = _chararray(datalines, 80).reshape(len(recsats), rowpersat*80)
+        # five observables per line, each F14.3 followed by LLI and signal strength
+        data = _fixedwidth_fields(chars, [80*(k // 5) + 16*(k % 5) for k in kept])
+        recepochs = np.array(recepochs)
+        recletters = np.array([sat[0] for sat in recsats])
+        recprns = np.array([int(sat[1:]) for sat in recsats])
+
+        for letter in systemletters:
+            m = recletters == letter
+            # translate prn into the satellite index of the observationdata array
+            lookup = np.zeros(max(satlists[letter])+1, dtype=int)
+            lookup[satlists[letter]] = np.arange(len(satlists[letter]))
+            observationdata[letter][recepochs[m], lookup[recprns[m]], :] = data[m, :]
 
     for letter in observationdata:
         kept_observables = [i for i in range(len(obstypes[letter])) if np.sum(~np.isnan(observationdata[letter][:,:,i]))>0]
@@ -385,7 +502,7 @@ def _readblocks_v21(lines, header, headerlines, headerlengths, epochsatlists, sa
     return observationdata, satlists, prntoidx, obstypes
 
 
-def _readblocks_v3(lines, header, headerlines, epochsatlists, satset):
+def _readblocks_v3(lines, header, headerlines, epochsatlists, satset, observables=None):
     """ Read the lines of data for rinex 3 files.
 
     Parameters
@@ -405,6 +522,9 @@ def _readblocks_v3(lines, header, headerlines, epochsatlists, satset):
     satset : set(str)
         Set containing all satellites in the data.
 
+    observables : list[str], optional
+        Observables to decode, wildcards allowed. Default is all of them.
+
     Returns
     -------
     observationdata : dict
@@ -440,7 +560,7 @@ def _readblocks_v3(lines, header, headerlines, epochsatlists, satset):
 
     observationdata = {}
     prntoidx = {}
-    parser = {}
+    kept = {}
 
     for sat in satset:
         satlists[sat[0]].append(int(sat[1:]))
@@ -454,28 +574,43 @@ def _readblocks_v3(lines, header, headerlines, epochsatlists, satset):
 
         satlists[letter].sort()
         nsats = len(satlists[letter])
-        nobstypes = len(obstypes[letter])
-        observationdata[letter] = np.nan * np.zeros((nepochs, nsats, nobstypes))
+        # only the requested columns are decoded
+        kept[letter] = _selectobservables(obstypes[letter], observables)
+        observationdata[letter] = np.nan * np.zeros((nepochs, nsats, len(kept[letter])))
         prntoidx[letter] = {prn: idx for idx, prn in enumerate(satlists[letter])}
 
-        fmt = '3x' + '14s 2x ' * (nobstypes-1) + '14s'
-        parser[letter] = struct.Struct(fmt)
-
+    # collect the data line of every satellite of every epoch, then decode each system in one pass
+    datalines = []
+    recepochs = []
+    recsats = []
     for iepoch, (headerstart, satlist) in enumerate(zip(headerlines, epochsatlists)):
-        for i, sat in enumerate(satlist):
-            datastring = lines[headerstart+1+i]
+        block = lines[headerstart+1:headerstart+1+len(satlist)]
+        if len(block) < len(satlist):
+            # truncated file - pad with empty lines so the missing fields become NaN
+            block = block + ['']*(len(satlist) - len(block))
+        datalines.extend(block)
+        recepochs.extend([iepoch]*len(satlist))
+        recsats.extend(satlist)
+
+    recepochs = np.array(recepochs, dtype=int)
+    recletters = np.array([sat[0] for sat in recsats])
+    recprns = np.array([int(sat[1:]) for sat in recsats], dtype=int)
 
-            systemletter = sat[0]
-            prn = int(sat[1:])
+    for letter in observationdata:
+        m = np.flatnonzero(recletters == letter)
+        if len(m) == 0 or len(kept[letter]) == 0:
+            continue
+        width = 3 + 16*len(obstypes[letter])
+        chars = _chararray([datalines[idx] for idx in m], width)
+        # satellite id, then F14.3 plus LLI and signal strength for each observable
+        data = _fixedwidth_fields(chars, [3 + 16*k for k in kept[letter]])
 
-            try:
-                data = np.array([_converttofloat(number.decode('ascii'))
-                                 for number in parser[systemletter].unpack_from(datastring.encode('ascii'))])
+        lookup = np.zeros(max(satlists[letter])+1, dtype=int)
+        lookup[satlists[letter]] = np.arange(len(satlists[letter]))
+        observationdata[letter][recepochs[m], lookup[recprns[m]], :] = data
 
-                observationdata[systemletter][iepoch, prntoidx[systemletter][prn], :] = data
-            except struct.error:
-                continue
-                #print('Data loss for %s at epoch %i' % (sat, iepoch))
+    for letter in observationdata:
+        obstypes[letter] = [obstypes[letter][k] for k in kept[letter]]
 
     for letter in observationdata:
         kept_observables = [i for i in range(len(obstypes[letter])) if np.sum(~np.isnan(observationdata[letter][:,:,i]))>0]
@@ -485,17 +620,22 @@ def _readblocks_v3(lines, header, headerlines, epochsatlists, satset):
     return observationdata, satlists, prntoidx, obstypes
 
 
-def processrinexfile(filename, savefile=None):
+def processrinexfile(filename, savefile=None, observables=None):
     """ Process a RINEX file into python format
 
     Parameters
     ----------
     filename : str
-        Filename of the rinex file
+        Filename of the rinex file. gzip and Hatanaka compressed files are allowed.
 
     savefile : str, optional
         Name of file to save data to. If supplied the data is saved to a compressed npz file.
 
+    observables : list[str], optional
+        Observables to read, shell-style wildcards allowed. The column offsets are taken from the
+        observation type headers and all other fields are never decoded, e.g. ['S*'] reads only the SNR data.
+        Default (None) reads every observable.
+
     Returns
     -------
     observationdata : dict
@@ -527,12 +667,11 @@ def processrinexfile(filename, savefile=None):
     """
     rinexversion = getrinexversion(filename)
 
-    with open(filename, 'r') as f:
-        lines = f.read().splitlines(True)
+    lines = list(hatanaka.open_rinex(filename))
 
     header, headerlines, headerlengths, obstimes, epochsatlists, satset,gpstime = _readheader(lines, rinexversion)
     observationdata, satlists, prntoidx, obstypes = _readblocks(lines, rinexversion, header, headerlines,
-                                                                headerlengths, epochsatlists, satset)
+                                                                headerlengths, epochsatlists, satset, observables)
 
     if savefile is not None:
         saverinextonpz(savefile, observationdata, satlists, prntoidx, obstypes, header, obstimes)
@@ -540,6 +679,111 @@ def processrinexfile(filename, savefile=None):
     return observationdata, satlists, prntoidx, obstypes, header, obstimes, gpstime 
 
 
+def _iterepochrecords(f, rinexversion, rowpersat):
+    """ Yield the lines belonging to each data record of an open RINEX file.
+
+    Parameters
+    ----------
+    f : iterator of str
+        Lines of a RINEX file, positioned just after the END OF HEADER line.
+
+    rinexversion : str
+        Version number for the RINEX file.
+
+    rowpersat : int
+        Number of lines per satellite in a RINEX 2.11 epoch. Not used for rinex3.
+
+    Yields
+    ------
+    record : list[str]
+        Epoch header line(s) followed by the lines of the epoch (or event flag block).
+    """
+    pattern = re.compile('(\s{2}\d|\s\d{2}){2}')
+    for line in f:
+        nextra = 0
+        if '2.1' in rinexversion:
+            if pattern.match(line[:6]):
+                if int(line[28]) in (0, 1, 6):
+                    numsats = int(line[29:32])
+                    nextra = (numsats-1)//12 + numsats*rowpersat
+                else:
+                    nextra = int(line[30:32])
+        elif line[0] == '>':
+            # number of satellites, or of special records for event flags
+            nextra = int(line[32:35])
+
+        record = [line]
+        for _ in range(nextra):
+            extra = next(f, '')
+            if not extra:
+                break
+            record.append(extra)
+        yield record
+
+
+def iterrinexfile(filename, chunksize=3600, observables=None):
+    """ Process a RINEX file into python format a chunk of epochs at a time.
+
+    Only the lines of the current chunk are kept in memory, so the memory used
+    is proportional to chunksize rather than to the length of the file.
+
+    Parameters
+    ----------
+    filename : str
+        Filename of the rinex file. gzip and Hatanaka compressed files are decompressed
+        on the fly, without temporary files.
+
+    chunksize : int, optional
+        Number of epochs in each chunk. Default is 3600, i.e. an hour of 1-Hz data.
+
+    observables : list[str], optional
+        Observables to read, wildcards allowed. Default (None) reads every observable.
+
+    Yields
+    ------
+    observationdata, satlists, prntoidx, obstypes, header, obstimes, gpstime
+        Data for the epochs of the chunk in the same format as returned by processrinexfile.
+        Satellite lists and observables only describe the chunk.
+    """
+    rinexversion = getrinexversion(filename)
+
+    with closing(hatanaka.open_rinex(filename)) as f:
+        headerblock = []
+        for line in f:
+            headerblock.append(line)
+            if 'END OF HEADER' in line:
+                break
+
+        rowpersat = 1
+        if '2.1' in rinexversion:
+            obsline = [line[:60] for line in headerblock if '# / TYPES OF OBSERV' in line]
+            if len(obsline) == 0:
+                raise RinexError("Missing required header '# / TYPES OF OBSERV'")
+            nobstypes = int(obsline[0][:6])
+            rowpersat = 1 + (nobstypes-1) // 5
+
+        chunk = []
+        nepochs = 0
+        for record in _iterepochrecords(f, rinexversion, rowpersat):
+            chunk.extend(record)
+            nepochs += 1
+            if nepochs == chunksize:
+                yield _processchunk(headerblock + chunk, rinexversion, observables)
+                chunk = []
+                nepochs = 0
+
+        if nepochs > 0:
+            yield _processchunk(headerblock + chunk, rinexversion, observables)
+
+
+def _processchunk(lines, rinexversion, observables=None):
+    """ Parse a header plus a chunk of data lines, see iterrinexfile. """
+    header, headerlines, headerlengths, obstimes, epochsatlists, satset, gpstime = _readheader(lines, rinexversion)
+    observationdata, satlists, prntoidx, obstypes = _readblocks(lines, rinexversion, header, headerlines,
+                                                                headerlengths, epochsatlists, satset, observables)
+    return observationdata, satlists, prntoidx, obstypes, header, obstimes, gpstime
+
+
 def mergerinexfiles(filelist, savefile=None):
     """ Process several rinexfiles and merges them into one file.
 
@@ -599,7 +843,7 @@ def mergerinexfiles(filelist, savefile=None):
                         line = f.readline()
                     lines.extend(f.read().splitlines(True))
 
-        header, headerlines, headerlengths, obstimes, epochsatlists, satset = _readheader(lines, rinexversion)
+        header, headerlines, headerlengths, obstimes, epochsatlists, satset, gpstime = _readheader(lines, rinexversion)
         observationdata, satlists, prntoidx, obstypes = _readblocks(lines, rinexversion, header, headerlines,
                                                                     headerlengths, epochsatlists, satset)
 
@@ -657,6 +901,85 @@ def separateobservables(observationdata, obstypes):
     return separatedobservationdata
 
 
+def _snrpriority(gobblygook):
+    """ Turn a gfzrnx observable selection string into a dict of signal codes per system.
+
+    Parameters
+    ----------
+    gobblygook : str
+        e.g. 'G:S1C,S2X,S2L+E:S1,S5', as returned by gps.myfavoriteobs
+
+    Returns
+    -------
+    priority : dict
+        Signal codes for each system letter, in order of preference.
+    """
+    priority = {}
+    for part in gobblygook.split('+'):
+        letter, codes = part.split(':')
+        priority[letter] = codes.split(',')
+    return priority
+
+
+def mapsnrobservables(observationdata, obstypes, gobblygook=None):
+    """ Merge RINEX 3 SNR signals into RINEX 2 style S1, S2, S5, S6, S7 and S8 observables.
+
+    This does in memory what the gfzrnx translation to RINEX 2.11 does for the SNR data,
+    so RINEX 3 files can be used directly. For each frequency band the signals are taken in
+    order of preference, and a missing value is filled from the next signal in the list.
+    Systems without a selection are dropped.
+
+    Parameters
+    ----------
+    observationdata : dict
+        Data dict as returned by processrinexfile for a RINEX 3 file.
+
+    obstypes : dict
+        Dict with observation types for each system, e.g. ['S1C', 'S2W', 'S2L'].
+
+    gobblygook : str, optional
+        Signal preference in gfzrnx format. Default is gps.myfavoriteobs()
+
+    Returns
+    -------
+    observationdata, obstypes : dict
+        Data and observation types with the RINEX 2 observable names.
+    """
+    if gobblygook is None:
+        gobblygook = g.myfavoriteobs()
+    priority = _snrpriority(gobblygook)
+
+    newdata = {}
+    newtypes = {}
+    for letter in observationdata:
+        if letter not in priority:
+            continue
+        # signal codes without an attribute (e.g. S5 for Galileo) accept every attribute
+        columns = []
+        for code in priority[letter]:
+            columns.extend([i for i, obstype in enumerate(obstypes[letter])
+                            if obstype.startswith(code) and i not in columns])
+        names = []
+        merged = []
+        for i in columns:
+            name = obstypes[letter][i][:2]
+            if name not in names:
+                names.append(name)
+                merged.append(observationdata[letter][:, :, i].copy())
+            else:
+                data = merged[names.index(name)]
+                missing = np.isnan(data)
+                data[missing] = observationdata[letter][:, :, i][missing]
+        nepochs, nsats = observationdata[letter].shape[:2]
+        if len(merged) > 0:
+            newdata[letter] = np.stack(merged, axis=2)
+        else:
+            newdata[letter] = np.nan * np.zeros((nepochs, nsats, 0))
+        newtypes[letter] = names
+
+    return newdata, newtypes
+
+
 def saverinextonpz(savefile, observationdata, satlists, prntoidx, obstypes, header, obstimes):
     """ Save data to numpy's npz format.
 
@@ -2,12 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
 import sys
 import subprocess
-from scipy.interpolate import interp1d
+interpolate = lazy_import('scipy.interpolate')
  
 import gnssrefl.rinpy as rinpy
 import gnssrefl.gps as g
@@ -253,6 +254,7 @@ def navorbits(navfile,obstimes,observationdata,obslist,prntoidx,gpssatlist,snrfi
     if len(ephemdata) == 0:
         print("empty ephemeris or does not exist")
         return
+    ephemindex = g.EphemerisIndex(ephemdata)
 
     # change variable name to save typing
     a=obstimes
@@ -277,7 +279,7 @@ def navorbits(navfile,obstimes,observationdata,obslist,prntoidx,gpssatlist,snrfi
                 for sat in gpssatlist:
                     s1,s2,s5 = readSNRval(s1exist,s2exist,s5exist,observationdata,prntoidx,sat,i)
                     if (s1 > 0):
-                        closest = g.myfindephem(gweek, gpss, ephemdata, sat)
+                        closest = ephemindex.closest(sat, gweek, gpss)
                         if len(closest) > 0:
                             satv = satorb_prop(gweek, gpss, sat, recv, closest)
                             r=np.subtract(satv,recv) # satellite minus receiver vector
@@ -417,9 +419,9 @@ def test_sp3(gpstime,sp3,systemsatlists,obsdata,obstypes,prntoidx,year,month,day
                     x = sp3[m,3] ; y = sp3[m,4] ; z = sp3[m,5]
                 # fit the orbits for this satellite
                     t=sp3_sec
-                    iX= interp1d(t, x, ll,bounds_error=False,fill_value='extrapolate')
-                    iY= interp1d(t, y, ll,bounds_error=False,fill_value='extrapolate')
-                    iZ= interp1d(t, z, ll,bounds_error=False,fill_value='extrapolate')
+                    iX= interpolate.interp1d(t, x, ll,bounds_error=False,fill_value='extrapolate')
+                    iY= interpolate.interp1d(t, y, ll,bounds_error=False,fill_value='extrapolate')
+                    iZ= interpolate.interp1d(t, z, ll,bounds_error=False,fill_value='extrapolate')
         # get the S1 data for this satellite
                     if 'S1' in obslist:
                         s1 = obsdata[con]['S1'][:, prntoidx[con][prn]]
@@ -1,22 +1,24 @@
 import numpy as np
-from astropy.time import Time
-from astropy.timeseries import LombScargle
 import datetime
 import math
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+astropy_time = lazy_import('astropy.time')
+astropy_timeseries = lazy_import('astropy.timeseries')
+plt = lazy_import('matplotlib.pyplot')
 import os
 import pickle
-from scipy import interpolate
-from scipy.optimize import least_squares
-import scipy.signal as spectral
+interpolate = lazy_import('scipy.interpolate')
+optimize = lazy_import('scipy.optimize')
+spectral = lazy_import('scipy.signal')
+mdates = lazy_import('matplotlib.dates')
 
-from matplotlib.dates import (date2num, DateFormatter)
 import subprocess
 import sys
 import time
 
 # my local functions
 import gnssrefl.gps as g
+import gnssrefl.read_snr_files as read_snr
 import gnssrefl.refraction as refr
 
 
@@ -181,7 +183,7 @@ def readklsnrtxt(snrfile, thedir, signal):
     stryear = str(int(snrfile[9:11]) + 2000)
     strdoy = snrfile[4:7]
     stryday = stryear + ':' + strdoy + ':00:00:00'
-    #tobj = Time(stryday, format='yday')
+    #tobj = astropy_time.Time(stryday, format='yday')
     #gbase = tobj.gps
     # put the time tags into fake GPS time (seconds since GPS began?)
     #snrdata[:, 3] = snrdata[:, 3] + gbase
@@ -232,13 +234,13 @@ def datetime2gps(dt):
         gpstime : float
     """
 
-    timeobj = Time(dt, format='datetime')
+    timeobj = astropy_time.Time(dt, format='datetime')
     gpstime = timeobj.gps
     return gpstime
 
 
 def gps2datetime(gt):
-    timeobj = Time(gt, format='gps', scale='utc')
+    timeobj = astropy_time.Time(gt, format='gps', scale='utc')
     dt = timeobj.datetime
     return dt
 
@@ -254,9 +256,9 @@ def gps2datenum(gt):
 
     """
 
-    timeobj = Time(gt, format='gps', scale='utc')
+    timeobj = astropy_time.Time(gt, format='gps', scale='utc')
     dt = timeobj.datetime
-    dn = date2num(dt)
+    dn = mdates.date2num(dt)
     return dn
 
 
@@ -465,7 +467,7 @@ def snr2arcs(snrdata, azilims, elvlims, rhlims, precision, year,doy,signal='L1',
                 # estimating the periodogram used to compute the dominant reflector 
                 # frequency, and thus RH
                     snrdt = snrt - p(sinelvt)
-                    pgram = LombScargle(sinelvt, snrdt, normalization='psd').power(f)
+                    pgram = astropy_timeseries.LombScargle(sinelvt, snrdt, normalization='psd').power(f)
 
                 # converting it into the proper units of RH (meters)
                     reflh = 0.5 * f * lcar
@@ -736,7 +738,7 @@ def snr2spline(station,year,doy, azilims, elvlims,rhlims, precision, kdt, snrfit
     stryday = stryear + ':' + strdoy + ':00:00:00'
 
     print(stryday)
-    tobj = Time(stryday, format='yday')
+    tobj = astropy_time.Time(stryday, format='yday')
     gbase = tobj.gps
     print('>>>>  gbase value', gbase)
     # Setting up knots ...
@@ -809,7 +811,7 @@ def snr2spline(station,year,doy, azilims, elvlims,rhlims, precision, kdt, snrfit
     kval_0 = np.nanmean(rh_arr[:, 1]) * np.ones(len(knots))
     print('Number of knots here ', len(knots))
     s1=time.time()
-    ls_spectral = least_squares(residuals_spectral_ls, kval_0, method='trf', bounds=rhlims)
+    ls_spectral = optimize.least_squares(residuals_spectral_ls, kval_0, method='trf', bounds=rhlims)
     kval_spectral = ls_spectral.x
     print('Length of kval_spectral', len(kval_spectral))
     invout['knots'] = knots
@@ -839,7 +841,7 @@ def snr2spline(station,year,doy, azilims, elvlims,rhlims, precision, kdt, snrfit
             residuals = residuals_cubspl_js(inparam, knots, satconsts, signal, snrdt_arr,final_list,Nfreq)
             return residuals
         print('Calling the least squares code')
-        ls_js = least_squares(residuals_js_ls, kval_0, method='lm')
+        ls_js = optimize.least_squares(residuals_js_ls, kval_0, method='lm')
         invout_js = ls_js.x
         kval_js = invout_js[:len(knots)]
         outparams_js = invout_js[len(knots):]
@@ -929,13 +931,13 @@ def snr2spline(station,year,doy, azilims, elvlims,rhlims, precision, kdt, snrfit
             pjs.set_label('invmod')
             iout.close()
 
-        dformat = DateFormatter('%Y-%m-%d')
+        dformat = mdates.DateFormatter('%Y-%m-%d')
         ax.xaxis.set_major_formatter(dformat)
         ax.set_title('Station ' + station.upper() + ' ' + signal)
         ax.set_xlim(gps2datenum(gbase), gps2datenum(gbase + numdays*86400))
         ax.set_xticks(np.linspace(gps2datenum(gbase), gps2datenum(gbase + numdays*86400), int(86400 / (60 * 60 * 6) + 1)))
-        ax.xaxis.set_major_formatter(DateFormatter('%m-%d %H:%M'))
-        #ax.xaxis.set_major_formatter(DateFormatter('%Y-%m-%d %H:%M'))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
+        #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
         ax.legend(loc="upper right", prop={"size":8})
         #ax.legend(loc="upper right",bbox_to_anchor=(1. , 0.7),prop={"size":8})
         #plt.xticks(rotation =45); 
@@ -1038,25 +1040,13 @@ def define_inputfile(station,year,doy,snr_ending):
     cyyyy = str(year)
     xdir = os.environ['REFL_CODE'] + '/' + cyyyy + '/snr/' + station + '/'
     snrfile = station + cdoy + '0.' + cyy + '.snr' + str(snr_ending)
-    gzfile = xdir + snrfile + '.gz'
-    xzfile = xdir + snrfile + '.xz'
     snrdir = ''
     if not os.path.isfile(snrfile):
         #print('SNR file does not exist in the local directory')
-        if os.path.isfile(xdir + snrfile):
+        # plain, gzipped, xz or binary file - compressed files are read as they are
+        if read_snr.snr_source(xdir + snrfile) != '':
             #print('SNR file does exist in the REFL_CODE directory')
             snrdir = xdir
-        # look for gzipped file
-        elif os.path.isfile(gzfile):
-            # unzip it, declare success
-            print('Found gzipped version', snrfile)
-            subprocess.call(['gunzip',gzfile])
-            snrdir = xdir
-        elif os.path.isfile(xzfile):
-            # unxz it, declare success
-            print('Found xz version', snrfile)
-            subprocess.call(['unxz',xzfile])
-            snrdir = xdir
         else:
             print('No file found. Exiting')
             sys.exit()
@@ -1173,12 +1163,12 @@ def loadsnrfile(snrfile, thedir):
 
     print('Reading file:', snrin)
     # this assumes someone has checked existence first
-    snrdata = np.loadtxt(snrin)
+    snrdata = read_snr.load_snr(snrin)
 
     stryear = str(int(snrfile[9:11]) + 2000)
     strdoy = snrfile[4:7]
     stryday = stryear + ':' + strdoy + ':00:00:00'
-    tobj = Time(stryday, format='yday')
+    tobj = astropy_time.Time(stryday, format='yday')
     gbase = tobj.gps
     # put the time tags into fake GPS time (seconds since GPS began?)
     snrdata[:, 3] = snrdata[:, 3] + gbase
@@ -1394,26 +1384,19 @@ def simpleLSP(rhlims, lcar, precision,elvt, sinelvt, snrdt,sat,xsignal,screensta
     sinelvt, sine elevation angle
     snrdt - detrended snr data
     """
-    maxH = rhlims[-1] # meters
     cf = lcar/2 # wavelength/2
 
-    # get oversampling factor and hifac (how far in RH space)
-    ofac, hifac = get_ofac_hifac(elvt, cf, maxH, precision)
     # scaled elevation angle
     scaledE = sinelvt /cf
-    px = freq_out(scaledE,ofac,hifac)
-    scipy_LSP = spectral.lombscargle(scaledE, snrdt, 2*np.pi*px)
-    pz = 2*np.sqrt(scipy_LSP/len(sinelvt))
-    # impose rh limits
-    ii = (px >= rhlims[0]) & (px <= rhlims[1])
-    px = px[ii]
-    pz = pz[ii]
-    noise = np.mean(pz)
+    # periodogram on the rh limits only
+    px = g.lsp_grid(rhlims[0], rhlims[1], precision)
+    maxA, allF, noiseA, pz = g.lsp_batch([scaledE], [snrdt], px)
+    noise = noiseA[0]
     # don't allow max to be at hte beginning of the end
 
-    ij = np.argmax(pz)
-    maxF = px[ij]
-    maxAmp = np.max(pz)
+    ij = np.argmax(pz[0])
+    maxF = allF[0]
+    maxAmp = maxA[0]
     #print(ij, maxF,len(px))
     bad = False
     if int(ij) == (len(px)-1): # end
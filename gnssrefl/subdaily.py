@@ -1,21 +1,28 @@
 # codes for subdaily module. primarily for tidal applications
 import argparse
+import contextlib
 import datetime
+import io
 import json
-import matplotlib.pyplot as plt
+import multiprocessing
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
+import shutil
 import sys
+import tempfile
+import traceback
 
 from datetime import date
 
 # support code
 import gnssrefl.gps as g
+import gnssrefl.results_store as store
 
 
-import scipy
-import scipy.interpolate as interpolate
-from scipy.interpolate import interp1d
+interpolate = lazy_import('scipy.interpolate')
+linalg = lazy_import('scipy.linalg')
 import math
 
 def print_badpoints(t,outliersize):
@@ -250,26 +257,10 @@ def readin_and_plot(station, year,d1,d2,plt2screen,extension,sigma,writecsv,azim
         if (d2 < d1):
             print('First day of year must be less than last day of year. Exiting')
             sys.exit()
-    # where the LSP results are kept
-        direc = xdir + '/' + str(year) + '/results/' + station  + '/' + extension + '/'
     # datetime object for time
         obstimes = []
-        tv = np.empty(shape=[0, 17])
-        if os.path.isdir(direc):
-            all_files = os.listdir(direc)
-            for f in all_files:
-            # only evaluate txt files
-                if (len(f) ==  7) and (f[4:7] == 'txt'):
-                    day = int(f[0:3])
-                #print('looking at file: ', day)
-                    if (day >= d1) & (day <= d2):
-                        fname = direc + f
-                        try:
-                            a = np.loadtxt(fname,comments='%')
-                            if len(a) > 0:
-                                tv = np.append(tv, a,axis=0)
-                        except:
-                            print('some issue with ',fname)
+    # the LSP results of these days, from the results store rather than the daily files
+        tv, ndays = store.read_results(station, extension, year, year, d1, d2)
 
     else:
         # using external file of concatenated results
@@ -459,13 +450,160 @@ def spline_in_out(x,y,knots_per_day):
     x1 = x.min()+0.1/365.25
     x2 = x.max()-0.1/365.25
     knots =np.linspace(x1,x2,num=numKnots)
-    t, c, k = interpolate.splrep(x, y, s=0, k=3,t=knots,task=-1)
+    spline, keep = lsq_spline(x, y, knots)
 #   calculate water level hourly for now
     N = int(Ndays*24 )
     xx = np.linspace(x.min(), x.max(), N)
-    spline = interpolate.BSpline(t, c, k, extrapolate=False)
 
-    return xx,spline(xx) 
+    return xx,spline(xx)
+
+def fill_gaps(th, h, gap=5/24, fillgap=1/24):
+    """
+    fills the gaps in a RH time series with fake values, linearly interpolated
+    between the points on each side of the gap, so a spline can be fit through it.
+    as has always been done in rhdot_correction, the first point and the point at
+    the end of each gap are not kept
+
+    parameters
+    ----------
+    th : numpy array of floats
+        sorted times (days)
+    h : numpy array of floats
+        reflector heights (m)
+    gap : float, optional
+        longer gaps are filled (days). default is 5 hours
+    fillgap : float, optional
+        spacing of the fake values (days). default is one hour
+
+    returns
+    -------
+    tnew : numpy array of floats
+        times, with the fake values
+    ynew : numpy array of floats
+        reflector heights, with the fake values
+    gaps : numpy array of integers
+        index in th of the point at the end of each gap
+    """
+    # the points between gaps are copied a block at a time - appending them one by one
+    # took a time that goes up with the square of the number of points
+    tparts = []; yparts = []
+    i0 = 1
+    gaps = 1 + np.flatnonzero(np.diff(th) > gap)
+    for i in gaps:
+        tparts.append(th[i0:i]); yparts.append(h[i0:i])
+        f = interpolate.interp1d(th[i-1:i+1], h[i-1:i+1])
+        # so this is fake data
+        ttnew = np.arange(th[i-1]+fillgap, th[i], fillgap)
+        tparts.append(ttnew); yparts.append(f(ttnew))
+        i0 = i + 1
+    tparts.append(th[i0:]); yparts.append(h[i0:])
+    return np.concatenate(tparts), np.concatenate(yparts), gaps
+
+def bspline_basis(x, t, k=3):
+    """
+    values of the B-splines of a knot vector at x. only k+1 of them are not zero
+    at any x, so this is the design matrix of a spline fit in banded form
+
+    parameters
+    ----------
+    x : numpy array of floats
+        where the B-splines are evaluated, between t[k] and t[-k-1]
+    t : numpy array of floats
+        full knot vector (including the k+1 end knots at each end)
+    k : integer, optional
+        spline degree, default is 3 (cubic)
+
+    returns
+    -------
+    B : numpy array of floats
+        len(x) by k+1, values of the B-splines first, first+1, ... first+k at each x
+    first : numpy array of integers
+        number of the first B-spline that is not zero at each x
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(t) - k - 1
+    # knot interval of each x, the last one includes its right end
+    l = np.clip(np.searchsorted(t, x, side='right') - 1, k, n - 1)
+    # de Boor / Cox recursion, for all the x at once
+    B = np.zeros((len(x), k+1)); B[:,0] = 1
+    left = np.zeros((len(x), k+1)); right = np.zeros((len(x), k+1))
+    for j in range(1, k+1):
+        left[:,j] = x - t[l+1-j]
+        right[:,j] = t[l+j] - x
+        saved = 0
+        for r in range(j):
+            temp = B[:,r]/(right[:,r+1] + left[:,j-r])
+            B[:,r] = saved + right[:,r+1]*temp
+            saved = left[:,j-r]*temp
+        B[:,j] = saved
+    return B, l - k
+
+def _lsq_coefficients(B, first, y, w, ncoef):
+    """
+    solves the normal equations of a spline fit. the normal matrix is banded
+    (k super diagonals) so it is made with bincount and solved with a banded Cholesky
+    """
+    k = B.shape[1] - 1
+    ab = np.zeros((k+1, ncoef))
+    rhs = np.zeros(ncoef)
+    for a in range(k+1):
+        wb = w*B[:,a]
+        rhs += np.bincount(first + a, weights=wb*y, minlength=ncoef)
+        for b in range(a, k+1):
+            # upper form used by cholesky_banded: element (i,j) goes in ab[k+i-j, j]
+            ab[k+a-b] += np.bincount(first + b, weights=wb*B[:,b], minlength=ncoef)
+    return linalg.cho_solve_banded((linalg.cholesky_banded(ab), False), rhs)
+
+def lsq_spline(x, y, knots, k=3, outlier=None, maxiter=5):
+    """
+    least squares spline fit with the given interior knots, i.e. what
+    interpolate.splrep(x, y, k=k, t=knots, task=-1) does. the design matrix is built
+    once in banded form (bspline_basis), so the cost goes up linearly with the number
+    of points, and refitting without outliers only needs new (banded) normal equations
+
+    parameters
+    ----------
+    x : numpy array of floats
+        times, e.g. day of year
+    y : numpy array of floats
+        values, e.g. reflector heights (m)
+    knots : numpy array of floats
+        interior knots, sorted, inside the range of x
+    k : integer, optional
+        spline degree, default is 3 (cubic)
+    outlier : float, optional
+        if given, points further than this from the fit are left out and the spline
+        is fit again, until no new points are left out (at most maxiter fits)
+    maxiter : integer, optional
+        maximum number of fits when removing outliers, default is 5
+
+    returns
+    -------
+    spline : interpolate.BSpline
+        the fit. it is not extrapolated (nan outside the range of x)
+    keep : numpy array of booleans
+        points used in the final fit (all True without outlier)
+    """
+    x = np.asarray(x, dtype=float); y = np.asarray(y, dtype=float)
+    t = np.r_[[x.min()]*(k+1), knots, [x.max()]*(k+1)]
+    ncoef = len(t) - k - 1
+    B, first = bspline_basis(x, t, k)
+    keep = np.ones(len(x), dtype=bool)
+    c = _lsq_coefficients(B, first, y, keep.astype(float), ncoef)
+    if outlier is not None:
+        for i in range(1, maxiter):
+            # the fit at the points, straight from the design matrix
+            fit = np.sum(B*c[first[:,None] + np.arange(k+1)], axis=1)
+            newkeep = np.abs(y - fit) <= outlier
+            if np.array_equal(newkeep, keep):
+                break
+            try:
+                c = _lsq_coefficients(B, first, y, newkeep.astype(float), ncoef)
+            except linalg.LinAlgError:
+                print('Too few points left between some knots, stopped removing outliers from the spline fit')
+                break
+            keep = newkeep
+    return interpolate.BSpline(t, c, k, extrapolate=False), keep
     
 def write_out_header(fout,station,extraline,**kwargs):
     """
@@ -647,29 +785,11 @@ def rhdot_correction(station,fname,fname_new,pltit,outlierV,**kwargs):
     # ???
     gap = 5/24 # up to five hour gap allowed before warning
 
-    tnew =[] ; ynew =[]; faket = []; 
     # fill in gaps using variables called tnew and ynew
-    Ngaps = 0
-    for i in range(1,len(th)):
-        d= th[i]-th[i-1] # delta in time in units of days ?
-        if (d > gap):
-            #print(t[i], t[i-1])
-            x0 = th[i-1:i+1]
-            h0 = h[i-1:i+1]
-            print('Gap on doy:', int(np.floor(x0[0])), ' lasting ', round(d*24,2), ' hours ')
-            Ngaps = Ngaps + 1
-            f = scipy.interpolate.interp1d(x0,h0)
-            #f = scipy.interpolate.interp1d(x0,h0,'quadratic')
-            # so this is fake data
-            ttnew = np.arange(th[i-1]+fillgap, th[i], fillgap)
-            yynew = f(ttnew)
-            faket = np.append(faket, ttnew)
-            # now append it to your real data
-            tnew = np.append(tnew,ttnew)
-            ynew = np.append(ynew,yynew)
-        else:
-            tnew = np.append(tnew,th[i])
-            ynew = np.append(ynew,h[i])
+    tnew, ynew, gaps = fill_gaps(th, h, gap, fillgap)
+    Ngaps = len(gaps)
+    for i in gaps:
+        print('Gap on doy:', int(np.floor(th[i-1])), ' lasting ', round((th[i]-th[i-1])*24,2), ' hours ')
 
     if (Ngaps > 3):
         print('This is a beta version of the rhdot/spline fit code - and does not work well with gaps. You have been warned!')
@@ -699,12 +819,12 @@ def rhdot_correction(station,fname,fname_new,pltit,outlierV,**kwargs):
     knots =np.linspace(t1,t2,num=numKnots)
 
 
-    t, c, k = interpolate.splrep(tnew, ynew, s=0, k=3,t=knots,task=-1)
-
+    # least squares fit, refit without the points further than outlierV from it
+    spline, used = lsq_spline(tnew, ynew, knots, outlier=outlierV)
+    if (len(ynew) - used.sum()) > 0:
+        print('Points left out of the spline fit: ', len(ynew) - used.sum())
 
     # should i do extrapolate True? it is the default  
-    #spline = interpolate.BSpline(t, c, k, extrapolate=True)
-    spline = interpolate.BSpline(t, c, k, extrapolate=False)
     # equal spacing in both x and y
     # evenly spaced data - units of days
     N = int(Ndays*perday)
@@ -1142,8 +1262,7 @@ def redo_spline(tnew,ynew,biasCorr_ynew,pltit,txtdir,station):
     #
     knots =np.linspace(t1,t2,num=numKnots)
     try:
-        t, c, k = interpolate.splrep(tnew, ynew, s=0, k=3,t=knots,task=-1)
-        spline = interpolate.BSpline(t, c, k, extrapolate=False)
+        spline, used = lsq_spline(tnew, ynew, knots)
     except:
         print('crashed on the interpolation stage')
         sys.exit()
@@ -1235,3 +1354,338 @@ def redo_spline(tnew,ynew,biasCorr_ynew,pltit,txtdir,station):
     #for i in range(0,len(knots)):
     #    ftest.write('{0:9.4f} \n'.format( knots[i]))
     #ftest.close()
+
+def mjd_days(year, doy):
+    """
+    modified julian day (integer) of arrays of year and day of year
+    """
+    y = (np.asarray(year).astype(int) - 1970).astype('datetime64[Y]')
+    return y.astype('datetime64[D]').astype(int) + np.asarray(doy).astype(int) - 1 + 40587
+
+def mjd_ydoy(mjd):
+    """
+    year and day of year of arrays of modified julian days (integer part is used)
+    """
+    d = (np.floor(np.asarray(mjd)).astype(int) - 40587).astype('datetime64[D]')
+    y = d.astype('datetime64[Y]')
+    return y.astype(int) + 1970, (d - y.astype('datetime64[D]')).astype(int) + 1
+
+def daily_sigma_edit(tv, sigma):
+    """
+    the daily edit of readin_and_plot, for results of any number of years:
+    keeps the RH that are less than sigma standard deviations from the mean of their day
+
+    parameters
+    ----------
+    tv : numpy array
+        LSP results (year, doy, RH, ...)
+    sigma : float
+        how many standard deviations away from the daily mean you allow
+
+    returns
+    -------
+    keep : numpy array of booleans
+        RH that are kept
+    """
+    key = tv[:,0]*1000 + tv[:,1]
+    u, inv = np.unique(key, return_inverse=True)
+    n = np.bincount(inv)
+    mean = np.bincount(inv, weights=tv[:,2])/n
+    std = np.sqrt(np.bincount(inv, weights=(tv[:,2]-mean[inv])**2)/n)
+    # days with one RH have no standard deviation, and those RH were never kept
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.abs((tv[:,2]-mean[inv])/std[inv]) < sigma
+
+def rhdot_window(station, extension, mjd1, mjd2, core1, core2, grid, partfile, knots=8, spline_outlier=1.0,
+                 sigma=2.5, azim1=0, azim2=360, ampl=0, peak2noise=0, h1=0.0, h2=300.0):
+    """
+    edits the RH of one window of days, and applies the RHdot and frequency bias
+    corrections, following readin_and_plot, rhdot_correction and redo_spline.
+    the time used is the MJD rather than the day of year, so windows can cross years
+
+    parameters
+    ----------
+    station : string
+        4 character station name
+    extension : string
+        gnssir extension
+    mjd1 : integer
+        first day of the window (MJD)
+    mjd2 : integer
+        last day of the window (MJD)
+    core1 : integer
+        first day (MJD) this window is responsible for
+    core2 : integer
+        last day (MJD) this window is responsible for. the days before core1 and after
+        core2 are only there so the splines are good at the ends of core1 to core2
+    grid : numpy array of floats
+        times (MJD) at which the final spline is evaluated
+    partfile : string
+        the edited RH of core1 to core2 are written to this file, with the corrected RH and
+        the RHdot correction (see write_subdaily)
+    knots : integer, optional
+        knots per day. default is 8
+    spline_outlier : float, optional
+        outlier criterion with respect to the spline fit (m). default is 1
+    sigma : float, optional
+        daily outlier criterion, in standard deviations. default is 2.5
+    azim1, azim2, ampl, peak2noise, h1, h2 : floats, optional
+        the commandline constraints, see readin_and_plot
+
+    returns
+    -------
+    result : dictionary
+        nobs (number of RH written), rms (of the RH about the final spline, m),
+        biases (frequency: (bias, sigma, number of RH)) and spline (the final spline
+        at the grid times, nan where there are no data)
+    """
+    result = {'nobs': 0, 'rms': np.nan, 'biases': {}, 'spline': np.full(len(grid), np.nan)}
+    y1, d1 = mjd_ydoy(mjd1); y2, d2 = mjd_ydoy(mjd2)
+    print('Window ', y1, d1, ' to ', y2, d2)
+    tv, ndays = store.read_results(station, extension, int(y1), int(y2), int(d1), int(d2),
+                                   azim1=azim1, azim2=azim2, minamp=ampl, update=False)
+    tv = tv[(tv[:,2] >= h1) & (tv[:,2] <= h2) & (tv[:,13] >= peak2noise)]
+    tv = tv[daily_sigma_edit(tv, sigma)]
+    # time in days since the start of the window
+    th = mjd_days(tv[:,0], tv[:,1]) + tv[:,4]/24 - mjd1
+    if (len(th) == 0) or (th.max() - th.min() < 1):
+        print('Less than a day of RH in this window')
+        return result
+    ii = np.argsort(th, kind='stable')
+    tv = tv[ii,:]; th = th[ii]
+
+    # 3 sigma about the median, as in rhdot_correction
+    xx = tv[:,2] - np.median(tv[:,2])
+    ij = np.absolute(xx) < 3*np.std(xx)
+    tv = tv[ij,:]; th = th[ij]
+    h = tv[:,2]
+
+    tnew, ynew, gaps = fill_gaps(th, h)
+    firstKnot = 15/60/24
+    Ndays = tnew.max() - tnew.min()
+    spline, used = lsq_spline(tnew, ynew, np.linspace(tnew.min()+firstKnot, tnew.max()-firstKnot, int(knots*Ndays)),
+                              outlier=spline_outlier)
+    resid_spl = h - spline(th)
+    i = np.absolute(resid_spl) < spline_outlier
+    tv = tv[i,:]; th = th[i]; resid_spl = resid_spl[i]
+    # taking out first and last six hours as well, as rhdot_correction does. inside the
+    # series these hours are in the overlap with the next window, so only the start and
+    # end of the whole series lose RH
+    i = (th >= th[0] + 6/24) & (th <= th[-1] - 6/24)
+    tv = tv[i,:]; th = th[i]; resid_spl = resid_spl[i]
+
+    # RHdot (m/hour) from the spline (m/day), times the edot factor (hours)
+    correction = tv[:,12]*spline.derivative()(th)/24
+    correctedRH = resid_spl - correction
+    newRH = tv[:,2] - correction
+    biasCorrected_RH = newRH.copy()
+    print('RMS no RHdot correction (m)', '{0:6.3f}'.format ( np.std(resid_spl)) )
+    print('RMS w/ RHdot correction (m)', '{0:6.3f}'.format ( np.std(correctedRH))  )
+    print('Freq  Bias  Sigma   NumObs ')
+    print('       (m)   (m)       ')
+    for f in np.unique(tv[:,10]):
+        ff = (tv[:,10] == f)
+        ret = correctedRH[ff]
+        print('{0:3.0f} {1:6.2f} {2:6.2f} {3:6.0f}'.format (f, np.mean(ret), np.std(ret), len(ret) ) )
+        result['biases'][int(f)] = (np.mean(ret), np.std(ret), len(ret))
+        biasCorrected_RH[ff] = biasCorrected_RH[ff] - np.mean(ret)
+
+    # new spline fit with the corrected RH, as in redo_spline
+    tnew, ynew, gaps = fill_gaps(th, biasCorrected_RH)
+    Ndays = tnew.max() - tnew.min()
+    final, used = lsq_spline(tnew, ynew, np.linspace(tnew.min()+firstKnot, tnew.max()-firstKnot, int(knots*Ndays)))
+    result['rms'] = np.std(biasCorrected_RH - final(th))
+    print('std (m)', round(result['rms'],3))
+    result['spline'] = final(grid - mjd1)
+
+    core = (th >= core1 - mjd1) & (th < core2 + 1 - mjd1)
+    result['nobs'] = int(core.sum())
+    extraline = 'outliers removed/two new columns: corrected RH and the RHdot correction applied '
+    write_subdaily(partfile, station, tv[core,:], False, extraline, newRH=newRH[core], RHdot_corr=correction[core])
+    return result
+
+def subdaily_window(args):
+    """
+    runs rhdot_window for one window, with the screen output saved rather than printed.
+    this is what each process does in subdaily_windows
+
+    parameters
+    ----------
+    args : dictionary
+        inputs to rhdot_window
+
+    returns
+    -------
+    result : dictionary
+        what rhdot_window returns, plus ok (whether it finished without an error)
+        and screen (what it printed, and the error if there was one)
+    """
+    buf = io.StringIO()
+    result = {'nobs': 0, 'ok': True, 'spline': np.full(len(args['grid']), np.nan)}
+    with contextlib.redirect_stdout(buf):
+        try:
+            result.update(rhdot_window(**args))
+        except SystemExit:
+            result['ok'] = False
+            print('exited for this window')
+        except Exception:
+            result['ok'] = False
+            traceback.print_exc(file=buf)
+    result['screen'] = buf.getvalue()
+    return result
+
+def window_weights(grid, core1, core2, overlap, first, last):
+    """
+    weight of a window's spline in the stitched spline: one for its own days, going
+    down linearly to zero across the overlap with the window before (unless it is
+    the first) and after (unless it is the last). the weights of two neighbouring
+    windows add up to one
+    """
+    w = np.ones(len(grid))
+    if not first:
+        w = w*np.clip((grid - (core1 - overlap))/(2*overlap), 0, 1)
+    if not last:
+        w = w*np.clip(((core2 + 1 + overlap) - grid)/(2*overlap), 0, 1)
+    return w
+
+def subdaily_windows(station, year1, doy1, year2, doy2, window=30, overlap=2, par=None, extension='', plt2screen=True,
+                     knots=8, spline_outlier=1.0, sigma=2.5, azim1=0, azim2=360, ampl=0, peak2noise=0, h1=0.0, h2=300.0):
+    """
+    edits and RHdot/frequency bias corrections for a long series of RH, in windows of days.
+    each window has overlap days of the next and previous windows, so its splines are good
+    over its own days. the windows can be analyzed in parallel, and the cost and memory
+    of each one do not depend on the length of the series.
+
+    the edited RH with the RHdot correction are written to <station>_subdaily_edits.txt.withrhdot
+    and the final splines, stitched across the overlaps, to <station>_subdaily_spline.txt,
+    both in $REFL_CODE/Files. the frequency biases are estimated for each window
+
+    parameters
+    ----------
+    station : string
+        4 character station name
+    year1 : integer
+        first year
+    doy1 : integer
+        first day of year of year1
+    year2 : integer
+        last year
+    doy2 : integer
+        last day of year of year2
+    window : integer, optional
+        number of days of each window (without the overlap). default is 30
+    overlap : integer, optional
+        number of days each window has from the windows before and after. default is 2
+    par : integer, optional
+        number of processes. default is to analyze one window after the other
+    extension : string, optional
+        gnssir extension
+    plt2screen : boolean, optional
+        plot to the screen. default is True
+    knots, spline_outlier, sigma, azim1, azim2, ampl, peak2noise, h1, h2 : optional
+        as in subdaily
+    """
+    txtdir = os.environ['REFL_CODE'] + '/Files'
+    if not os.path.exists(txtdir):
+        os.makedirs(txtdir)
+    if (overlap < 1) or (2*overlap > window):
+        print('The overlap must be at least a day and at most half the window. You submitted ', overlap, window)
+        sys.exit()
+    m1 = int(mjd_days(year1, doy1))
+    # doy2 can be 366 in a year that does not have one
+    m2 = int(min(mjd_days(year2, doy2), mjd_days(year2+1, 1) - 1))
+    if m2 < m1:
+        print('The end of the time span must be after its start. Exiting')
+        sys.exit()
+
+    # the results of all the days are read once here, so the windows only read the store
+    store.sync(station, extension, year1, year2)
+
+    # final spline every 30 minutes, as in redo_spline
+    perday = 48
+    grid = m1 + np.arange((m2 + 1 - m1)*perday)/perday
+    cores = [(c1, min(c1 + window - 1, m2)) for c1 in range(m1, m2 + 1, window)]
+    # each window writes its RH to a file in a directory of this run's own,
+    # so two runs for the same station do not mix up their windows
+    partdir = tempfile.mkdtemp(prefix=station + '_windows_', dir=txtdir)
+    jobs = []
+    for k, (c1, c2) in enumerate(cores):
+        w1 = max(c1 - overlap, m1); w2 = min(c2 + overlap, m2)
+        gi = (grid >= w1) & (grid < w2 + 1)
+        jobs.append({'station': station, 'extension': extension, 'mjd1': w1, 'mjd2': w2, 'core1': c1, 'core2': c2,
+                     'grid': grid[gi], 'partfile': partdir + '/' + str(k) + '.txt',
+                     'knots': knots, 'spline_outlier': spline_outlier, 'sigma': sigma, 'azim1': azim1, 'azim2': azim2,
+                     'ampl': ampl, 'peak2noise': peak2noise, 'h1': h1, 'h2': h2})
+
+    print('Analyzing', len(jobs), 'windows of', window, 'days with', overlap, 'days of overlap')
+    if (par is None) or (par < 2) or (len(jobs) < 2):
+        results = map(subdaily_window, jobs)
+        pool = None
+    else:
+        print('Using', par, 'processes')
+        pool = multiprocessing.Pool(par)
+        results = pool.imap(subdaily_window, jobs)
+
+    num = np.zeros(len(grid)); den = np.zeros(len(grid))
+    failed = []; nobs = 0
+    fname_new = txtdir + '/' + station + '_subdaily_edits.txt.withrhdot'
+    try:
+        with open(fname_new, 'w') as fout:
+            for k, result in enumerate(results):
+                sys.stdout.write(result['screen'])
+                sys.stdout.flush()
+                job = jobs[k]
+                if not result['ok']:
+                    failed.append(k)
+                # stitch the edited RH files of the windows together, keeping one header
+                if os.path.isfile(job['partfile']):
+                    with open(job['partfile']) as f:
+                        for line in f:
+                            if (nobs == 0) or (not line.startswith('%')):
+                                fout.write(line)
+                    os.remove(job['partfile'])
+                    nobs += result['nobs']
+                # and the splines, weighted across the overlaps
+                gi = (grid >= job['mjd1']) & (grid < job['mjd2'] + 1)
+                w = window_weights(job['grid'], job['core1'], job['core2'], overlap, k == 0, k == len(jobs) - 1)
+                ok = np.isfinite(result['spline'])
+                num[gi] += np.where(ok, w*np.nan_to_num(result['spline']), 0)
+                den[gi] += np.where(ok, w, 0)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        shutil.rmtree(partdir, ignore_errors=True)
+
+    print('Windows that worked: ', len(jobs) - len(failed), ' Windows that failed: ', len(failed))
+    for k in failed:
+        y1, d1 = mjd_ydoy(jobs[k]['core1']); y2, d2 = mjd_ydoy(jobs[k]['core2'])
+        print('  failed: ', y1, d1, ' to ', y2, d2)
+    print(nobs, ' observations written to ', fname_new)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spl = num/den
+    ii = den > 0
+    years, doys = mjd_ydoy(grid[ii])
+    splinefile = txtdir + '/' + station + '_subdaily_spline.txt'
+    np.savetxt(splinefile, np.column_stack((grid[ii], years, doys, 24*(grid[ii] % 1), spl[ii])),
+               fmt='%12.6f %4.0f %3.0f %6.3f %7.3f', comments='% ',
+               header='spline fit to the RHdot and frequency bias corrected RH, stitched across windows\n'
+                      'MJD year doy hour RH(m)')
+    print('Spline written to ', splinefile)
+
+    if plt2screen and (ii.sum() > 0):
+        fig = plt.figure(figsize=(10,4))
+        dtimes = np.round((grid[ii] - 40587)*86400).astype('int64').astype('datetime64[s]')
+        plt.plot(dtimes, spl[ii], '-', color='orange', label='spline fit')
+        plt.title(station.upper() + ' RH spline fit, ' + str(window) + ' day windows')
+        plt.ylabel('meters')
+        plt.grid()
+        plt.gca().invert_yaxis()
+        fig.autofmt_xdate()
+        plotname = txtdir + '/' + station + '_subdaily_spline.png'
+        plt.savefig(plotname, dpi=300)
+        print('png file saved as: ', plotname)
+        plt.show()
+
+    return splinefile
@@ -19,7 +19,7 @@ def parse_arguments():
     # must input start and end year
     parser = argparse.ArgumentParser()
     parser.add_argument("station", help="station name", type=str)
-    parser.add_argument("year", default=None, type=int, help="for now one year at a time")
+    parser.add_argument("year", default=None, type=int, help="year (the first year, with -year_end)")
     parser.add_argument("-txtfile", default=None, type=str, help="Filename for editing") 
     parser.add_argument("-splinefile", default=None, type=str, help="Input filename for rhdot/spline fitting (optional)") 
     parser.add_argument("-csvfile", default=None, type=str, help="set to True if you prefer csv to plain txt")
@@ -39,6 +39,10 @@ def parse_arguments():
     parser.add_argument("-h2", default=None, type=float, help="max RH (m)")
     parser.add_argument("-peak2noise", default=None, type=float, help="new peak2noise constraint")
     parser.add_argument("-kplt", default=None, type=str, help="special plot for kristine")
+    parser.add_argument("-year_end", default=None, type=int, help="last year, for more than one year (windowed mode)")
+    parser.add_argument("-window", default=None, type=int, help="days per window (windowed mode, default is 30)")
+    parser.add_argument("-overlap", default=None, type=int, help="days of overlap between windows (default is 2)")
+    parser.add_argument("-par", default=None, type=int, help="number of processes, windows are analyzed in parallel")
 
     args = parser.parse_args().__dict__
 
@@ -53,7 +57,8 @@ def parse_arguments():
 def subdaily(station: str, year: int, txtfile: str = '', splinefile: str = None, csvfile: bool = False, plt: bool = True,
              spline_outlier: float = 1.0, knots: int = 8, sigma: float = 2.5, extension: str = '', rhdot: bool = False,
              doy1: int = 1, doy2: int = 366, testing: bool = False, ampl: float = 0, 
-             h1: float=0.0, h2: float=300.0, azim1: int=0, azim2: int = 360, peak2noise: float = 0, kplt: bool = False):
+             h1: float=0.0, h2: float=300.0, azim1: int=0, azim2: int = 360, peak2noise: float = 0, kplt: bool = False,
+             year_end: int = None, window: int = None, overlap: int = 2, par: int = None):
     """
         Parameters:
             ___________
@@ -117,6 +122,21 @@ def subdaily(station: str, year: int, txtfile: str = '', splinefile: str = None,
                 default is 0.
             kplt: boolean, optional
                 plot for kristine
+            year_end : integer, optional
+                last year. setting year_end or window turns on the windowed mode:
+                the days from year/doy1 to year_end/doy2 are edited and RHdot and frequency
+                bias corrected in windows of days, and the spline fits of the windows are
+                stitched together. txtfile, splinefile, csvfile and rhdot are not used.
+                default is None
+            window : integer, optional
+                days per window in the windowed mode.
+                default is 30
+            overlap : integer, optional
+                days each window shares with the windows before and after it.
+                default is 2
+            par : integer, optional
+                number of processes used to analyze the windows.
+                default is None (one window after the other)
     """
 
     # make surer environment variables are set
@@ -135,6 +155,15 @@ def subdaily(station: str, year: int, txtfile: str = '', splinefile: str = None,
         sys.exit()
     if csvfile:
         writecsv = True
+    if (year_end is not None) or (window is not None):
+        if year_end is None:
+            year_end = year
+        if window is None:
+            window = 30
+        t.subdaily_windows(station, year, doy1, year_end, doy2, window=window, overlap=overlap, par=par,
+                           extension=extension, plt2screen=plt, knots=knots, spline_outlier=spline_outlier,
+                           sigma=sigma, azim1=azim1, azim2=azim2, ampl=ampl, peak2noise=peak2noise, h1=h1, h2=h2)
+        return
     if splinefile is None:
         if txtfile == '':
             print('Will pick up and concatenate daily result files')
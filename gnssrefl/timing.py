@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+wall time and counters for the stages of a run, e.g. one station-day of gnssir.
+used by gnssir_guts, and meant to be used the same way by the other codes
+(rinex2snr, quickLook) that want to know where their time goes.
+"""
+import contextlib
+import json
+import os
+import time
+
+
+class StageStats:
+    """
+    records the wall time of named stages and named counters.
+
+    when it is not enabled, stage() returns a do-nothing context and count()
+    returns right away, so the calls can stay in the code.
+
+    Parameters
+    ----------
+    enabled : boolean
+        whether to record anything
+    labels : keyword arguments
+        written with the results, e.g. station, year and doy
+    """
+    _off = contextlib.nullcontext()
+
+    def __init__(self, enabled=False, **labels):
+        self.enabled = enabled
+        self.labels = labels
+        self.times = {}
+        self.counts = {}
+        self.t0 = time.perf_counter()
+
+    def stage(self, name):
+        """
+        context for a stage, e.g. with stats.stage('read_snr'): ...
+        the time of all the uses of the same name is added up
+        """
+        if not self.enabled:
+            return self._off
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        """
+        adds n to the counter name
+        """
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def results(self):
+        """
+        returns a dictionary with the labels, the total time, and the
+        stage times (seconds) and counters
+        """
+        return {**self.labels, 'total': round(time.perf_counter() - self.t0, 6),
+                'times': {k: round(v, 6) for k, v in self.times.items()},
+                'counts': dict(self.counts)}
+
+    def json_line(self):
+        """
+        returns the results as one line of json
+        """
+        return json.dumps(self.results())
+
+    def table(self):
+        """
+        returns the results as a table for the screen
+        """
+        r = self.results()
+        lines = [' '.join(f'{k}={v}' for k, v in self.labels.items())]
+        for k, v in r['times'].items():
+            lines.append(f'  {k:20s} {v:10.3f} s')
+        lines.append(f'  {"total":20s} {r["total"]:10.3f} s')
+        for k, v in r['counts'].items():
+            lines.append(f'  {k:20s} {v:10d}')
+        return '\n'.join(lines)
+
+    def emit(self, mode, jsonfile='logs/stats.jsonl'):
+        """
+        writes the results, if enabled
+
+        Parameters
+        ----------
+        mode : string
+            'json' appends a json line to jsonfile, 'table' prints a table
+        jsonfile : string, optional
+            file for the json lines. default is logs/stats.jsonl
+        """
+        if not self.enabled:
+            return
+        if mode == 'json':
+            d = os.path.dirname(jsonfile)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(jsonfile, 'a') as f:
+                f.write(self.json_line() + '\n')
+        else:
+            print(self.table())
+
+
+class _Stage:
+    """
+    times one use of a stage of a StageStats
+    """
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t
+        self.stats.times[self.name] = self.stats.times.get(self.name, 0) + dt
+        return False
@@ -5,13 +5,14 @@ combine multiple years of teqc multipath metrics,
 write a file, and make a plot
 """
 import argparse
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 import numpy as np
 import os
 import subprocess
 import sys
 import time
-import wget
+wget = lazy_import('wget')
 
 import gnssrefl.gps as g
 import gnssrefl.computemp1mp2 as veg
@@ -3,7 +3,8 @@ import os
 import sys
 import subprocess
 import numpy as np
-import matplotlib.pyplot as plt
+from gnssrefl.lazy import lazy_import
+plt = lazy_import('matplotlib.pyplot')
 
 from datetime import datetime
 from pathlib import Path
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+a long lived worker for gnssir, rinex2snr and quickLook jobs
+
+every gnssir, rinex2snr or quickLook command starts a new python, imports the
+package, reads the station json file, checks the refraction file and so on. when
+a pipeline runs thousands of small station-day jobs that startup is a good part
+of the time. the worker does it once: it listens on a UNIX socket and runs the
+jobs sent to it, one at a time, in the same python. the json instructions,
+the station refraction grids and the orbit products stay in memory (they are
+read again if their file changes).
+
+a job is the command line you would type, e.g.
+
+gnssir p041 2021 15 -snr 66
+
+start the worker, send it a file of jobs (one per line, - for standard input), and stop it:
+
+gnssrefl_worker serve &
+
+gnssrefl_worker submit -jobs myjobs.txt
+
+gnssrefl_worker stop
+
+gnssrefl_worker run -jobs myjobs.txt runs the jobs in this python, without a worker.
+more than one worker can be used by giving each its own -socket.
+"""
+import argparse
+import contextlib
+import getpass
+import importlib
+import io
+import json
+import os
+import shlex
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+# job name: module and function that run it (the same as the console script)
+COMMANDS = {'gnssir': ('gnssrefl.gnssir_cl', 'gnssir'),
+            'rinex2snr': ('gnssrefl.rinex2snr_cl', 'rinex2snr'),
+            'quickLook': ('gnssrefl.quickLook_cl', 'quicklook')}
+
+
+def default_socket():
+    """
+    returns the default socket name, in the temporary directory of this user
+    """
+    return os.path.join(tempfile.gettempdir(), 'gnssrefl_worker_' + getpass.getuser() + '.sock')
+
+
+def run_job(line):
+    """
+    runs one job in this python, with its screen output saved
+
+    Parameters
+    ----------
+    line : string
+        command line of the job, e.g. gnssir p041 2021 15
+
+    Returns
+    -------
+    result : dictionary
+        job (the command line), ok (boolean, whether it finished without an error),
+        seconds (wall time) and output (what the job printed, and the error if there was one)
+    """
+    t0 = time.perf_counter()
+    words = shlex.split(line)
+    if (len(words) == 0) or (words[0] not in COMMANDS):
+        return {'job': line, 'ok': False, 'seconds': 0.0,
+                'output': 'Not a job the worker knows, use one of: ' + ' '.join(COMMANDS) + '\n'}
+
+    modname, funcname = COMMANDS[words[0]]
+    mod = importlib.import_module(modname)
+    buf = io.StringIO()
+    ok = True
+    argv = sys.argv
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        try:
+            # the command line tools read their inputs from sys.argv
+            sys.argv = words
+            args = mod.parse_arguments()
+            getattr(mod, funcname)(**args)
+        except SystemExit:
+            ok = False
+            print(words[0], 'exited for this job')
+        except Exception:
+            ok = False
+            traceback.print_exc(file=buf)
+        finally:
+            sys.argv = argv
+            # plots are not shown by the worker, so do not let them pile up
+            if 'matplotlib.pyplot' in sys.modules:
+                sys.modules['matplotlib.pyplot'].close('all')
+
+    return {'job': line, 'ok': ok, 'seconds': round(time.perf_counter() - t0, 3), 'output': buf.getvalue()}
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """
+    reads json requests, one per line, and answers each one with a json line.
+    a request is either {"job": command line} or {"stop": true}
+    """
+    def handle(self):
+        for raw in self.rfile:
+            try:
+                req = json.loads(raw)
+            except ValueError:
+                continue
+            if req.get('stop'):
+                self.server.stopped = True
+                self._reply({'stop': True})
+                return
+            result = run_job(req.get('job', ''))
+            print(time.strftime('%Y-%m-%d %H:%M:%S'), 'ok' if result['ok'] else 'FAILED',
+                  '{0:8.3f}'.format(result['seconds']), result['job'], flush=True)
+            self._reply(result)
+
+    def _reply(self, d):
+        self.wfile.write((json.dumps(d) + '\n').encode())
+        self.wfile.flush()
+
+
+def serve(sockname):
+    """
+    runs jobs sent to a UNIX socket until it is asked to stop
+
+    Parameters
+    ----------
+    sockname : string
+        name of the socket file
+    """
+    if os.path.exists(sockname):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(sockname)
+            print('A worker is already listening on', sockname)
+            sys.exit()
+        except OSError:
+            # left over from a worker that did not exit cleanly
+            os.remove(sockname)
+
+    # plots are made to files, never to the screen
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    for modname, funcname in COMMANDS.values():
+        importlib.import_module(modname)
+
+    server = socketserver.UnixStreamServer(sockname, _JobHandler)
+    server.stopped = False
+    print('gnssrefl worker listening on', sockname, ' REFL_CODE', os.environ['REFL_CODE'], flush=True)
+    try:
+        while not server.stopped:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(sockname):
+            os.remove(sockname)
+    print('gnssrefl worker stopped')
+
+
+def submit_jobs(jobs, sockname):
+    """
+    sends jobs to a worker and yields the results as they come back
+
+    Parameters
+    ----------
+    jobs : list of strings
+        command lines of the jobs
+    sockname : string
+        name of the worker socket file
+
+    Yields
+    ------
+    result : dictionary
+        see run_job
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(sockname)
+        with s.makefile('rwb') as f:
+            for job in jobs:
+                f.write((json.dumps({'job': job}) + '\n').encode())
+                f.flush()
+                yield json.loads(f.readline())
+
+
+def stop_worker(sockname):
+    """
+    asks the worker listening on sockname to stop
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(sockname)
+        with s.makefile('rwb') as f:
+            f.write((json.dumps({'stop': True}) + '\n').encode())
+            f.flush()
+            f.readline()
+
+
+def read_jobs(jobfile):
+    """
+    returns the command lines in a job file (- for standard input),
+    without blank lines and lines starting with #
+    """
+    if jobfile == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(jobfile) as f:
+            lines = f.readlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", help="serve, submit, run or stop", type=str, choices=['serve', 'submit', 'run', 'stop'])
+    parser.add_argument("-socket", default=None, type=str, help="socket file of the worker, default is in the temporary directory")
+    parser.add_argument("-jobs", default=None, type=str, help="file of jobs, one command line per line (- for standard input)")
+    parser.add_argument("-quiet", default=None, type=str, help="only print one line per job (True or False)")
+
+    args = parser.parse_args().__dict__
+
+    import gnssrefl.gps as g
+    g.check_environ_variables()
+    from gnssrefl.utils import str2bool
+    # convert all expected boolean inputs from strings to booleans
+    boolean_args = ['quiet']
+    args = str2bool(args, boolean_args)
+
+    # only return a dictionary of arguments that were added from the user - all other defaults will be set in code below
+    return {key: value for key, value in args.items() if value is not None}
+
+
+def worker(mode: str, socket: str = None, jobs: str = '-', quiet: bool = False):
+    """
+    runs a worker for gnssir, rinex2snr and quickLook jobs, or sends it jobs
+
+    Parameters
+    ----------
+    mode : string
+        serve : listen for jobs on the socket, until stopped
+        submit : send the jobs to the worker on the socket and print their output
+        run : run the jobs in this python, without a worker
+        stop : stop the worker on the socket
+    socket : string, optional
+        socket file of the worker. default is gnssrefl_worker_<user>.sock in the
+        temporary directory
+    jobs : string, optional
+        file with the jobs, one command line per line, e.g. gnssir p041 2021 15.
+        default is - (standard input)
+    quiet : boolean, optional
+        only print one line per job rather than its screen output. default is False
+
+    """
+    sockname = default_socket() if socket is None else socket
+    if mode == 'serve':
+        serve(sockname)
+        return
+    if mode == 'stop':
+        stop_worker(sockname)
+        return
+
+    joblist = read_jobs(jobs)
+    if mode == 'submit':
+        results = submit_jobs(joblist, sockname)
+    else:
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+        results = (run_job(job) for job in joblist)
+
+    failed = []
+    t0 = time.perf_counter()
+    for result in results:
+        if not quiet:
+            sys.stdout.write(result['output'])
+        print('ok' if result['ok'] else 'FAILED', '{0:8.3f}'.format(result['seconds']), result['job'], flush=True)
+        if not result['ok']:
+            failed.append(result['job'])
+
+    print('Jobs that worked: ', len(joblist) - len(failed), ' Jobs that failed: ', len(failed),
+          ' Wall time (s): ', round(time.perf_counter() - t0, 1))
+    for job in failed:
+        print('  failed: ', job)
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    args = parse_arguments()
+    worker(**args)
+
+
+if __name__ == "__main__":
+    main()
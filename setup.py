@@ -69,6 +69,7 @@ setup(
             'vwc_input= gnssrefl.vwc_input:main',
             'phase= gnssrefl.quickPhase:main',
             'vwc= gnssrefl.vwc:main',
+            'gnssrefl_worker= gnssrefl.worker:main',
             ], 
         },
     install_requires=requirements,